@@ -6,14 +6,15 @@ T = TypeVar("T")
 def binary_search(l: list[T], item: T) -> int:
     """
     Utilise the binary search algorithm to find the index where a particular element would be stored.
+    Only `<` is used to compare elements, so l can be a precomputed list of keys (e.g. tuples),
+    in which case every comparison is a native one.
 
     :return: The index at which either:
-        * This item is located, or
+        * This item is located (the first such index if it appears more than once), or
         * Where this item would be inserted to preserve the ordering.
 
     :complexity:
-    Best Case Complexity: O(1), when middle index contains item.
-    Worst Case Complexity: O(log(N)), where N is the length of l.
+    Best/Worst Case Complexity: O(log(N) * comp(T)), where N is the length of l.
     """
     return _binary_search_aux(l, item, 0, len(l))
 
@@ -23,15 +24,42 @@ def _binary_search_aux(l: list[T], item: T, lo: int, hi: int) -> int:
     lo: smallest index where the return value could be.
     hi: largest index where the return value could be.
     """
-    if lo == hi:
-        return lo
-    mid = (hi + lo) // 2
-    if l[mid] > item:
-        # Item would be before mid
-        return _binary_search_aux(l, item, lo, mid)
-    elif l[mid] < item:
-        # Item would be after mid
-        return _binary_search_aux(l, item, mid+1, hi)
-    elif l[mid] == item:
-        return mid
-    raise ValueError(f"Comparison operator poorly implemented {item} and {l[mid]} cannot be compared.")
+    while lo < hi:
+        mid = (hi + lo) // 2
+        if l[mid] < item:
+            # Item would be after mid
+            lo = mid + 1
+        else:
+            # Item would be at or before mid
+            hi = mid
+    return lo
+
+def binary_search_many(sorted_list: list[T], items: list[T]) -> list[int]:
+    """
+    Find the index binary_search would return for each element of items, in one pass over sorted_list.
+
+    Since items is sorted, each search starts where the previous one ended, galloping forward
+    (1, 2, 4, ... positions) to bound the answer before binary searching inside that bound.
+
+    :pre: items is sorted.
+    :return: A list with the index for each element of items, in the same order.
+
+    :complexity:
+    Best Case Complexity: O(M * comp(T)), when consecutive items land next to each other.
+    Worst Case Complexity: O(M * log(N / M + 1) * comp(T)), where N is the length of sorted_list
+        and M is the length of items; never worse than M separate binary searches.
+    """
+    res = []
+    n = len(sorted_list)
+    lo = 0
+    for item in items:
+        # Gallop from lo to find a range [lo, hi] containing the answer.
+        step = 1
+        hi = lo
+        while hi < n and sorted_list[hi] < item:
+            lo = hi + 1
+            hi = lo + step
+            step *= 2
+        lo = _binary_search_aux(sorted_list, item, lo, min(hi, n))
+        res.append(lo)
+    return res
@@ -1,41 +1,242 @@
 from __future__ import annotations
-from typing import TypeVar
+from heapq import heapify, heappop, heapreplace
+from typing import Callable, TypeVar
 
 T = TypeVar("T")
 
-def merge(l1: list[T], l2: list[T], key=lambda x:x) -> list[T]:
+# Runs shorter than this are extended with binary insertion sort before merging.
+MIN_RUN = 32
+
+
+def merge(l1: list[T], l2: list[T], key: Callable | None = None) -> list[T]:
     """
     Merges two sorted lists into one larger sorted list,
     containing all elements from the smaller lists.
 
     The `key` kwarg allows you to define a custom sorting order.
+    Each element's key is computed exactly once.
 
     :pre: Both l1 and l2 are sorted, and contain comparable elements.
     :complexity: Best/Worst Case O(n * comp(T)), n = len(l1)+len(l2)
     :returns: The sorted list.
     """
+    if key is None:
+        return merge_keyed(l1, l1, l2, l2)[1]
+    return merge_keyed([key(x) for x in l1], l1, [key(x) for x in l2], l2)[1]
+
+
+def merge_keyed(keys1: list, l1: list[T], keys2: list, l2: list[T]) -> tuple[list, list[T]]:
+    """
+    Merges two sorted lists whose keys are already known: keys1[i] is the
+    key of l1[i], and likewise for l2. Returns the merged keys and the
+    merged list, so a caller that keeps the keys of a sorted list next to it
+    never has to compute them again. Ties keep l1 first (stable).
+
+    :pre: keys1 and keys2 are sorted, and as long as l1 and l2.
+    :complexity: Best/Worst Case O(n * comp(K)), n = len(l1)+len(l2)
+    :returns: The merged keys and the merged list.
+    """
+    new_keys = []
     new_list = []
     cur_left = 0
     cur_right = 0
-    while cur_left < len(l1) and cur_right < len(l2):
-        if key(l1[cur_left]) <= key(l2[cur_right]):
-            new_list.append(l1[cur_left])
-            cur_left += 1
-        else:
+    len_left = len(l1)
+    len_right = len(l2)
+    while cur_left < len_left and cur_right < len_right:
+        # Only take from the right when strictly smaller, so ties keep l1 first (stable).
+        if keys2[cur_right] < keys1[cur_left]:
+            new_keys.append(keys2[cur_right])
             new_list.append(l2[cur_right])
             cur_right += 1
+        else:
+            new_keys.append(keys1[cur_left])
+            new_list.append(l1[cur_left])
+            cur_left += 1
+    new_keys += keys1[cur_left:]
+    new_keys += keys2[cur_right:]
     new_list += l1[cur_left:]
     new_list += l2[cur_right:]
-    return new_list
+    return new_keys, new_list
 
-def mergesort(l: list[T]) -> list[T]:
+
+def merge_many(lists: list[list[T]], key: Callable | None = None) -> list[T]:
+    """
+    Merges any number of sorted lists into one sorted list, using a heap of the
+    current head of each list. Ties are taken from the earlier list first.
+
+    :pre: Every list in lists is sorted, and contains comparable elements.
+    :complexity: Best/Worst Case O(n * log(k) * comp(T)), n = total number of elements, k = len(lists)
+    :returns: The sorted list.
+    """
+    if key is None:
+        return merge_many_keyed(lists, lists)[1]
+    return merge_many_keyed([[key(x) for x in l] for l in lists], lists)[1]
+
+
+def merge_many_keyed(key_lists: list[list], lists: list[list[T]]) -> tuple[list, list[T]]:
     """
-    Sort a list using the mergesort operation.
-    :complexity: Best/Worst Case O(NlogN * comp(T))
+    Merges any number of sorted lists whose keys are already known, see
+    merge_keyed(): key_lists[i][j] is the key of lists[i][j]. Ties are taken
+    from the earlier list first.
+
+    :pre: Every list in key_lists is sorted, and as long as the matching list in lists.
+    :complexity: Best/Worst Case O(n * log(k) * comp(K)), n = total number of elements, k = len(lists)
+    :returns: The merged keys and the merged list.
     """
-    if len(l) <= 1:
-        return l
-    break_index = (len(l)+1) // 2
-    l1 = mergesort(l[:break_index])
-    l2 = mergesort(l[break_index:])
-    return merge(l1, l2)
+    heap = [(keys[0], i, 0) for i, keys in enumerate(key_lists) if len(keys) > 0]
+    heapify(heap)
+    new_keys = []
+    new_list = []
+    while len(heap) > 1:
+        head, i, pos = heap[0]
+        new_keys.append(head)
+        new_list.append(lists[i][pos])
+        pos += 1
+        if pos < len(lists[i]):
+            heapreplace(heap, (key_lists[i][pos], i, pos))
+        else:
+            heappop(heap)
+    if heap:
+        # Only one list left, the rest of it can be copied across.
+        _, i, pos = heap[0]
+        new_keys += key_lists[i][pos:]
+        new_list += lists[i][pos:]
+    return new_keys, new_list
+
+
+def mergesort(l: list[T], key: Callable | None = None) -> list[T]:
+    """
+    Sort a list using a bottom-up, run-detecting mergesort.
+
+    The input is scanned once for natural runs (non-decreasing, or strictly
+    decreasing which are reversed in place); short runs are extended to
+    MIN_RUN with binary insertion sort. Runs are then merged pairwise,
+    ping-ponging between the working list and a single scratch buffer.
+
+    If `key` is given it is evaluated once per element, and the keys are
+    sorted alongside the items. The sort is stable, and `l` is not modified.
+
+    :complexity: Best Case O(N * comp(T)) when l is already made of a few runs.
+                 Worst Case O(NlogN * comp(T))
+    """
+    n = len(l)
+    if n <= 1:
+        return l[:]
+    items = l[:]
+    keys = items if key is None else [key(x) for x in items]
+
+    # Find the runs.
+    bounds = [0]
+    start = 0
+    while start < n:
+        end = _find_run(items, keys, start, n)
+        if end - start < MIN_RUN:
+            forced = min(start + MIN_RUN, n)
+            _binary_insertion_sort(items, keys, start, end, forced)
+            end = forced
+        bounds.append(end)
+        start = end
+
+    if len(bounds) == 2:
+        return items
+
+    # Merge runs pairwise until only one is left.
+    src_items, src_keys = items, keys
+    dst_items = [None] * n
+    dst_keys = dst_items if key is None else [None] * n
+    while len(bounds) > 2:
+        new_bounds = [0]
+        for i in range(0, len(bounds) - 1, 2):
+            lo = bounds[i]
+            mid = bounds[i + 1]
+            hi = bounds[i + 2] if i + 2 < len(bounds) else mid
+            _merge_into(src_items, src_keys, dst_items, dst_keys, lo, mid, hi, key is None)
+            new_bounds.append(hi)
+        bounds = new_bounds
+        src_items, dst_items = dst_items, src_items
+        src_keys, dst_keys = dst_keys, src_keys
+    return src_items
+
+
+def _find_run(items: list, keys: list, start: int, n: int) -> int:
+    """
+    Return the end of the natural run starting at `start`.
+    A strictly decreasing run is reversed in place, which keeps the sort stable.
+
+    :complexity: O(R * comp(T)) where R is the length of the run.
+    """
+    end = start + 1
+    if end == n:
+        return end
+    if keys[end] < keys[start]:
+        while end < n and keys[end] < keys[end - 1]:
+            end += 1
+        items[start:end] = items[start:end][::-1]
+        if keys is not items:
+            keys[start:end] = keys[start:end][::-1]
+    else:
+        while end < n and not keys[end] < keys[end - 1]:
+            end += 1
+    return end
+
+
+def _binary_insertion_sort(items: list, keys: list, lo: int, start: int, hi: int) -> None:
+    """
+    Sort items[lo:hi] in place, given that items[lo:start] is already sorted.
+
+    :complexity: O((hi - start) * (log(hi - lo) * comp(T) + (hi - lo)))
+    """
+    same = keys is items
+    for i in range(start, hi):
+        item = items[i]
+        k = keys[i]
+        left, right = lo, i
+        while left < right:
+            mid = (left + right) // 2
+            if k < keys[mid]:
+                right = mid
+            else:
+                left = mid + 1
+        if left != i:
+            items[left + 1:i + 1] = items[left:i]
+            items[left] = item
+            if not same:
+                keys[left + 1:i + 1] = keys[left:i]
+                keys[left] = k
+
+
+def _merge_into(src_items: list, src_keys: list, dst_items: list, dst_keys: list,
+                lo: int, mid: int, hi: int, same: bool) -> None:
+    """
+    Merge the sorted runs src[lo:mid] and src[mid:hi] into dst[lo:hi].
+    When `same` is True the keys are the items themselves.
+
+    :complexity: O((hi - lo) * comp(T))
+    """
+    if mid == hi or not src_keys[mid] < src_keys[mid - 1]:
+        # Already in order (or a lone trailing run), just copy across.
+        dst_items[lo:hi] = src_items[lo:hi]
+        if not same:
+            dst_keys[lo:hi] = src_keys[lo:hi]
+        return
+    left, right, out = lo, mid, lo
+    while left < mid and right < hi:
+        if src_keys[right] < src_keys[left]:
+            dst_items[out] = src_items[right]
+            if not same:
+                dst_keys[out] = src_keys[right]
+            right += 1
+        else:
+            dst_items[out] = src_items[left]
+            if not same:
+                dst_keys[out] = src_keys[left]
+            left += 1
+        out += 1
+    if left < mid:
+        dst_items[out:hi] = src_items[left:mid]
+        if not same:
+            dst_keys[out:hi] = src_keys[left:mid]
+    else:
+        dst_items[out:hi] = src_items[right:hi]
+        if not same:
+            dst_keys[out:hi] = src_keys[right:hi]
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class BackgroundTask:
+    """
+    A job submitted to a BackgroundWorker: its label, the last progress message it reported, and the callbacks to run
+    with its result or with the exception it raised.
+    """
+
+    def __init__(self, label: str, on_done: Callable[[Any], None] | None,
+                 on_error: Callable[[Exception], None] | None = None) -> None:
+        self.label = label
+        self.progress = ""
+        self.on_done = on_done
+        self.on_error = on_error
+        self.future: Future | None = None
+
+    def status(self) -> str:
+        return f"{self.label}: {self.progress}" if self.progress else f"{self.label}..."
+
+
+class BackgroundWorker:
+    """
+    BackgroundWorker runs slow jobs on one worker thread, so that the window keeps drawing while they run.
+
+    A job is called with a report function, which it may call with a progress message at any time. Nothing a job does
+    is seen by the window until poll(), called from on_update(): it records the progress reported since the last call,
+    and calls on_done with the result of every finished job (or on_error with the exception of every failed one), on
+    the window's thread. Jobs run one at a time, in the order they were submitted.
+
+    A job must only use objects the window will not change while it runs: a fresh object, a trail version from a
+    TrailHistory, or a MountainManager.snapshot().
+    """
+
+    def __init__(self) -> None:
+        """
+         Explain:
+           - Start with no jobs. self.updates carries (task, message) pairs from the worker thread to poll().
+
+         Complexity: O(1)
+        """
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+        self.updates = queue.SimpleQueue()
+        self.tasks: list[BackgroundTask] = []
+
+    def submit(self, label: str, job: Callable[[Callable[[str], None]], Any],
+               on_done: Callable[[Any], None] | None = None,
+               on_error: Callable[[Exception], None] | None = None) -> BackgroundTask:
+        """
+         Explain:
+           - Run job(report) on the worker thread, after any job submitted before it.
+
+         Args:
+           - label: name of the job, shown by status()
+           - job: the work to do
+           - on_done: called with the return value of job, by the poll() after it finishes
+           - on_error: called instead with the exception, if job raises one
+
+         Complexity: O(1)
+        """
+        task = BackgroundTask(label, on_done, on_error)
+        task.future = self.executor.submit(job, lambda message: self.updates.put((task, message)))
+        self.tasks.append(task)
+        return task
+
+    def busy(self, label: str | None = None) -> bool:
+        """
+         Explain:
+           - Whether any job (or any job with the given label) has not been handled by poll() yet.
+
+         Complexity: O(T), where T is the number of such jobs.
+        """
+        return any(label is None or task.label == label for task in self.tasks)
+
+    def status(self) -> str:
+        """
+         Explain:
+           - One line describing the jobs not handled yet, with their latest progress. Empty if there are none.
+
+         Complexity: O(T), where T is the number of such jobs.
+        """
+        return "; ".join(task.status() for task in self.tasks)
+
+    def poll(self) -> None:
+        """
+         Explain:
+           - Record the progress reported since the last call, then call on_done for every job that finished, or
+             on_error for every job that raised an exception, in the order they were submitted.
+
+         Raises:
+           - Any exception raised by a job without on_error, as if the job had run here.
+
+         Complexity: O(U + T), where U is the number of progress reports and T the number of jobs not handled yet,
+                     plus the cost of the callbacks.
+        """
+        while True:
+            try:
+                task, message = self.updates.get_nowait()
+            except queue.Empty:
+                break
+            task.progress = message
+        finished, running = [], []
+        for task in self.tasks:
+            (finished if task.future.done() else running).append(task)
+        self.tasks = running
+        for task in finished:
+            error = task.future.exception()
+            if error is not None and task.on_error is not None:
+                task.on_error(error)
+                continue
+            result = task.future.result()
+            if task.on_done is not None:
+                task.on_done(result)
+
+    def shutdown(self) -> None:
+        """
+         Explain:
+           - Cancel the jobs that have not started. A running job is left to finish.
+
+         Complexity: O(T), where T is the number of jobs not handled yet.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
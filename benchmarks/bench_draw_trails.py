@@ -0,0 +1,121 @@
+"""
+Measure the cost of laying out a trail, hit testing it and how many draw
+calls it makes, without an arcade window, over generated trails of
+increasing depth (splits nested in splits) and branching (splits in a row),
+and over random trails from trail_generator.
+
+Run from the repository root:
+    python -m benchmarks.bench_draw_trails [HITS]
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from constants import DrawMode
+from draw_trails import HeadlessTrailDraw
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_generator import generate_trail, trail_stats
+
+WIDTH = 700
+HEIGHT = 700
+# (depth, branching, mountains per series)
+SHAPES = [
+    (1, 1, 4),
+    (2, 2, 4),
+    (3, 3, 4),
+    (4, 3, 4),
+    (5, 3, 4),
+    (4, 5, 4),
+    (1, 1, 2000),
+]
+# Mountains in the trails made by trail_generator.
+GENERATED = [1000, 10000, 100000]
+
+
+def make_series(mountains: int, following: Trail, counter: list[int]) -> Trail:
+    trail = following
+    for _ in range(mountains):
+        trail = Trail(TrailSeries(Mountain(f"m{counter[0]}", counter[0] % 10 + 1, counter[0] % 100 + 1), trail))
+        counter[0] += 1
+    return trail
+
+
+def make_trail(depth: int, branching: int, mountains: int, counter: list[int] | None = None) -> Trail:
+    """
+    A series of mountains followed by branching splits in a row, each of
+    whose paths is a trail of depth - 1. Depth 0 is a plain series.
+    """
+    if counter is None:
+        counter = [0]
+    trail = Trail(None)
+    if depth > 0:
+        for _ in range(branching):
+            trail = Trail(TrailSplit(
+                make_trail(depth - 1, branching, mountains, counter),
+                make_trail(depth - 1, branching, mountains, counter),
+                trail,
+            ))
+    return make_series(mountains, trail, counter)
+
+
+def bench(hits: int) -> None:
+    rng = random.Random(0)
+    print("layout in milliseconds, hit test in microseconds per point, draw calls per frame")
+    print("full: drawn at its required size, so every mountain is drawn; "
+          f"panel: squeezed into {WIDTH}x{HEIGHT}, so dense sub trails are summarised")
+    print(f"{'depth':>6}{'branch':>7}{'mountains':>10}{'full':>8}{'again':>8}{'panel':>8}{'hit':>7}"
+          f"{'lines':>7}{'sprites':>8}{'curves':>7}{'summary':>8}")
+    for depth, branching, mountains in SHAPES:
+        counter = [0]
+        trail = make_trail(depth, branching, mountains, counter)
+        draw = HeadlessTrailDraw(trail)
+        width, height = draw.required_width(), draw.required_height()
+
+        start = time.perf_counter()
+        draw.draw_in_box(height, width, 0, 0)
+        full = time.perf_counter() - start
+        calls = draw.calls
+
+        # Sizes and branch curves are cached from the first layout.
+        start = time.perf_counter()
+        draw.draw_in_box(height, width, 0, 0)
+        again = time.perf_counter() - start
+
+        points = [(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(hits)]
+        start = time.perf_counter()
+        for point in points:
+            draw.box_and_action(point, DrawMode.ADD_MOUNTAIN)
+        hit = time.perf_counter() - start
+
+        start = time.perf_counter()
+        draw.draw_in_box(HEIGHT, WIDTH, 0, 0)
+        panel = time.perf_counter() - start
+
+        print(f"{depth:>6}{branching:>7}{counter[0]:>10}{full * 1e3:>8.1f}{again * 1e3:>8.1f}{panel * 1e3:>8.1f}"
+              f"{hit / hits * 1e6:>7.1f}{calls['line']:>7}{calls['mountain']:>8}{calls['branch']:>7}"
+              f"{draw.calls['summary']:>8}")
+
+
+def bench_generated() -> None:
+    print("generated trails, layout in milliseconds at required size and in the panel")
+    print(f"{'mountains':>10}{'splits':>8}{'nesting':>8}{'full':>9}{'panel':>8}")
+    for n in GENERATED:
+        trail = generate_trail(n, seed=n)
+        stats = trail_stats(trail)
+        draw = HeadlessTrailDraw(trail)
+        start = time.perf_counter()
+        draw.draw_in_box(draw.required_height(), draw.required_width(), 0, 0)
+        full = time.perf_counter() - start
+        start = time.perf_counter()
+        draw.draw_in_box(HEIGHT, WIDTH, 0, 0)
+        panel = time.perf_counter() - start
+        print(f"{n:>10}{stats['splits']:>8}{stats['nesting']:>8}{full * 1e3:>9.1f}{panel * 1e3:>8.1f}")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
+    print()
+    bench_generated()
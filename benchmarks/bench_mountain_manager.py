@@ -0,0 +1,112 @@
+"""
+Measure the write overhead of the MountainManager secondary indexes, and
+the cost of importing and clearing mountains one at a time or in a batch,
+and of forking a manager by copying every mountain or with snapshot().
+
+Run from the repository root:
+    python -m benchmarks.bench_mountain_manager [N]
+"""
+from __future__ import annotations
+
+import random
+import sys
+import time
+from contextlib import nullcontext
+
+from mountain import Mountain
+from mountain_manager import MountainManager
+
+CONFIGS = [
+    ("no index", {}),
+    ("name index", {"name_index": True}),
+    ("length index", {"length_index": True}),
+    ("both", {"name_index": True, "length_index": True}),
+]
+
+
+def make_mountains(n: int, seed: int = 0) -> list[Mountain]:
+    rng = random.Random(seed)
+    return [Mountain(f"m{i}", rng.randint(1, 10), rng.randint(1, 1000)) for i in range(n)]
+
+
+def bench(n: int) -> None:
+    mountains = make_mountains(n)
+    print(f"{n} mountains, microseconds per operation")
+    print(f"{'config':<14}{'add':>8}{'edit':>8}{'remove':>8}")
+    for label, options in CONFIGS:
+        mm = MountainManager(**options)
+
+        start = time.perf_counter()
+        for m in mountains:
+            mm.add_mountain(m)
+        add = time.perf_counter() - start
+
+        edited = [Mountain(m.name, m.difficulty_level, m.length + 1) for m in mountains]
+        start = time.perf_counter()
+        for old, new in zip(mountains, edited):
+            mm.edit_mountain(old, new)
+        edit = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for m in edited:
+            mm.remove_mountain(m)
+        remove = time.perf_counter() - start
+
+        print(f"{label:<14}{add / n * 1e6:>8.1f}{edit / n * 1e6:>8.1f}{remove / n * 1e6:>8.1f}")
+
+
+def bench_batch(n: int) -> None:
+    mountains = make_mountains(n)
+    print(f"{n} mountains, milliseconds to import and to clear")
+    print(f"{'mode':<14}{'import':>8}{'clear':>8}")
+    for label, batched in [("one by one", False), ("batch", True)]:
+        mm = MountainManager()
+
+        start = time.perf_counter()
+        with mm.batch() if batched else nullcontext():
+            for m in mountains:
+                mm.add_mountain(m)
+        add = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with mm.batch() if batched else nullcontext():
+            for m in mountains:
+                mm.remove_mountain(m)
+        remove = time.perf_counter() - start
+
+        print(f"{label:<14}{add * 1e3:>8.1f}{remove * 1e3:>8.1f}")
+
+
+def full_copy(mm: MountainManager) -> MountainManager:
+    # copy.deepcopy cannot copy the ctypes arrays behind ArrayR, so copy mountain by mountain.
+    copied = MountainManager()
+    with copied.batch():
+        for group in mm.group_by_difficulty():
+            for m in group:
+                copied.add_mountain(Mountain(m.name, m.difficulty_level, m.length))
+    return copied
+
+
+def bench_snapshot(n: int, forks: int = 20) -> None:
+    mountains = make_mountains(n)
+    mm = MountainManager()
+    with mm.batch():
+        for m in mountains:
+            mm.add_mountain(m)
+    print(f"{n} mountains, {forks} forks each editing one mountain, milliseconds")
+    for label, fork in [("full copy", full_copy), ("snapshot", MountainManager.snapshot)]:
+        start = time.perf_counter()
+        for i in range(forks):
+            variant = fork(mm)
+            m = mountains[i]
+            variant.edit_mountain(m, Mountain(m.name, m.difficulty_level, m.length + 1))
+        print(f"{label:<14}{(time.perf_counter() - start) * 1e3:>8.1f}")
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    bench(size)
+    print()
+    bench_batch(size)
+    print()
+    bench_snapshot(size)
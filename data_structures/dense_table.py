@@ -0,0 +1,218 @@
+""" Dense Table
+
+Defines a table keyed by integers, stored directly in an array indexed by
+the key (offset by the smallest key the array covers), so no hashing or
+probing is needed and keys come out in increasing order. The array covers
+a bounded range of keys; keys outside it are kept in a dict instead.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left, insort
+from typing import Generic, TypeVar
+from data_structures.referential_array import ArrayR
+
+V = TypeVar('V')
+
+
+class DenseTable(Generic[V]):
+    """
+    Dense Table.
+
+    Type Arguments:
+        - V:    Value Type.
+
+    Keys must be integers. The array grows to cover the range of keys
+    (largest - smallest), but never beyond MAX_RANGE keys: keys outside the
+    range it covers are stored in self.sparse, a dict, and their sorted list
+    self.sparse_keys. So memory use is proportional to the range of keys
+    when they are close together (e.g. difficulty levels), and to the number
+    of keys otherwise.
+
+    Unless stated otherwise, all methods have O(1) complexity for keys in
+    the range of the array. For other keys, lookups are O(1) on average,
+    and adding or deleting a key is O(S), where S is the number of them.
+    """
+
+    INITIAL_SIZE = 8
+    MAX_RANGE = 1024
+
+    def __init__(self) -> None:
+        """
+        Initialise the Dense Table.
+        """
+        self.array: ArrayR[V] = ArrayR(self.INITIAL_SIZE)
+        # Key stored at self.array[0].
+        self.low = 0
+        self.count = 0
+        self.sparse: dict[int, V] = {}
+        self.sparse_keys: list[int] = []
+
+    @property
+    def table_size(self) -> int:
+        return len(self.array)
+
+    def __len__(self) -> int:
+        """
+        Returns number of elements in the table
+        """
+        return self.count
+
+    def is_empty(self) -> bool:
+        return self.count == 0
+
+    def __contains__(self, key: int) -> bool:
+        """
+        Checks to see if the given key is in the table
+        """
+        position = key - self.low
+        if 0 <= position < self.table_size:
+            return self.array[position] is not None
+        return key in self.sparse
+
+    def __getitem__(self, key: int) -> V:
+        """
+        Get the value at a certain key
+
+        :raises KeyError: when the key doesn't exist.
+        """
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: int, default: V | None = None) -> V | None:
+        """
+        Get the value at a certain key, or default if the key doesn't exist.
+        """
+        position = key - self.low
+        if 0 <= position < self.table_size:
+            value = self.array[position]
+            return default if value is None else value
+        return self.sparse.get(key, default)
+
+    def __setitem__(self, key: int, data: V) -> None:
+        """
+        Set an (key, value) pair in our table.
+
+        :complexity best: O(1) key is within the range already covered.
+        :complexity worst: O(K + S) array has to grow, where K is the new
+            range of keys, or O(S) the key is stored in self.sparse.
+        :pre: data is not None.
+        """
+        if self.count == 0:
+            # Nothing to keep, so just re-centre the array on the new key.
+            self.low = key - key % self.table_size if key >= 0 else key
+        if key < self.low or key >= self.low + self.table_size:
+            if max(self.low + self.table_size, key + 1) - min(self.low, key) > self.MAX_RANGE:
+                if key not in self.sparse:
+                    insort(self.sparse_keys, key)
+                    self.count += 1
+                self.sparse[key] = data
+                return
+            self._resize(key)
+        position = key - self.low
+        if self.array[position] is None:
+            self.count += 1
+        self.array[position] = data
+
+    def __delitem__(self, key: int) -> None:
+        """
+        Deletes a (key, value) pair in our table.
+
+        :complexity: O(1) for a key in the range of the array, O(S) otherwise.
+        :raises KeyError: when the key doesn't exist.
+        """
+        position = key - self.low
+        if 0 <= position < self.table_size:
+            if self.array[position] is None:
+                raise KeyError(key)
+            self.array[position] = None
+        else:
+            del self.sparse[key]
+            self.sparse_keys.pop(bisect_left(self.sparse_keys, key))
+        self.count -= 1
+
+    def copy(self) -> DenseTable[V]:
+        """
+        Returns a new table with the same (key, value) pairs. Values are
+        shared, not copied.
+
+        :complexity: O(N + S) where N is self.table_size, at most MAX_RANGE.
+        """
+        copied = DenseTable()
+        copied.array = self.array.copy()
+        copied.low = self.low
+        copied.count = self.count
+        copied.sparse = self.sparse.copy()
+        copied.sparse_keys = self.sparse_keys.copy()
+        return copied
+
+    def _resize(self, key: int) -> None:
+        """
+        Grow the array so that it also covers key, at least doubling its size
+        (up to MAX_RANGE) so that repeatedly extending the range stays
+        amortised O(1). Keys in self.sparse that the array now covers are
+        moved into it.
+
+        :complexity: O(K + S) where K is the new size of the array.
+        :pre: the new range of keys is at most MAX_RANGE.
+        """
+        low = min(self.low, key)
+        high = max(self.low + self.table_size, key + 1)
+        size = max(high - low, min(2 * self.table_size, self.MAX_RANGE))
+        if key < self.low:
+            # Growing to the left, leave the spare room on that side.
+            low = high - size
+        old_array = self.array
+        old_low = self.low
+        self.array = ArrayR(size)
+        self.low = low
+        for position in range(len(old_array)):
+            if old_array[position] is not None:
+                self.array[old_low + position - low] = old_array[position]
+        outside = []
+        for sparse_key in self.sparse_keys:
+            if low <= sparse_key < low + size:
+                self.array[sparse_key - low] = self.sparse.pop(sparse_key)
+            else:
+                outside.append(sparse_key)
+        self.sparse_keys = outside
+
+    def keys(self) -> list[int]:
+        """
+        Returns all keys in the table, in increasing order.
+
+        :complexity: O(N + S) where N is self.table_size.
+        """
+        # Keys in self.sparse lie outside the range of the array, so those below self.low come first.
+        split = bisect_left(self.sparse_keys, self.low)
+        res = self.sparse_keys[:split]
+        for position in range(self.table_size):
+            if self.array[position] is not None:
+                res.append(self.low + position)
+        res.extend(self.sparse_keys[split:])
+        return res
+
+    def values(self) -> list[V]:
+        """
+        Returns all values in the table, in increasing order of their keys.
+
+        :complexity: O(N + S) where N is self.table_size.
+        """
+        split = bisect_left(self.sparse_keys, self.low)
+        res = [self.sparse[key] for key in self.sparse_keys[:split]]
+        for position in range(self.table_size):
+            if self.array[position] is not None:
+                res.append(self.array[position])
+        res.extend(self.sparse[key] for key in self.sparse_keys[split:])
+        return res
+
+    def __str__(self) -> str:
+        """
+        Returns all they key/value pairs in our table, in increasing order of key.
+        :complexity: O(N * (str(key) + str(value))) where N is the table size
+        """
+        result = ""
+        for key, value in zip(self.keys(), self.values()):
+            result += "(" + str(key) + "," + str(value) + ")\n"
+        return result
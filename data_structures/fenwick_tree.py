@@ -0,0 +1,54 @@
+""" Fenwick Tree
+
+Defines a Fenwick (binary indexed) tree over a fixed number of integer
+counts, with point updates and prefix sums.
+"""
+from __future__ import annotations
+
+
+class FenwickTree:
+    """
+    Fenwick Tree.
+
+    Holds size counts, all 0 at first. Position i of self.tree (1-based)
+    holds the sum of the counts i - lowbit(i) + 1 .. i, so every update and
+    prefix sum only visits O(log(N)) positions.
+
+    Unless stated otherwise, all methods have O(log(N)) complexity, where N
+    is the size.
+    """
+
+    def __init__(self, size: int) -> None:
+        """
+        Initialise size counts of 0.
+        :complexity: O(N)
+        """
+        self.tree = [0] * (size + 1)
+
+    def __len__(self) -> int:
+        """
+        Returns the number of counts
+        :complexity: O(1)
+        """
+        return len(self.tree) - 1
+
+    def add(self, index: int, delta: int) -> None:
+        """
+        Add delta to the count at index (0-based).
+        :pre: 0 <= index < len(self)
+        """
+        index += 1
+        while index < len(self.tree):
+            self.tree[index] += delta
+            index += index & -index
+
+    def prefix_sum(self, end: int) -> int:
+        """
+        Returns the sum of the counts before end, i.e. at indices 0 .. end - 1.
+        :pre: 0 <= end <= len(self)
+        """
+        total = 0
+        while end > 0:
+            total += self.tree[end]
+            end -= end & -end
+        return total
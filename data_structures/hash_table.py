@@ -185,22 +185,64 @@ class LinearProbeTable(Generic[K, V]):
             self.array[newpos] = (key2, value)
             position = (position + 1) % self.table_size
 
+    def replace(self, key: K, data: V) -> V:
+        """
+        Overwrite the value of a key already in the table, keeping its
+        position, and return the value it replaces. Unlike __setitem__,
+        it never inserts, so the count and table size stay the same.
+
+        :complexity: See linear probe.
+        :raises KeyError: when the key doesn't exist.
+        """
+        position = self._linear_probe(key, False)
+        old = self.array[position][1]
+        self.array[position] = (key, data)
+        return old
+
     def is_empty(self) -> bool:
         return self.count == 0
 
     def is_full(self) -> bool:
         return self.count == self.table_size
 
-    def _rehash(self) -> None:
+    def copy(self) -> LinearProbeTable[K, V]:
+        """
+        Returns a new table with the same (key, value) pairs in the same
+        positions, so no key has to be hashed again. Keys and values
+        themselves are shared, not copied.
+
+        :complexity: O(N) where N is self.table_size.
+        """
+        copied = LinearProbeTable.__new__(type(self))
+        copied.__dict__.update(self.__dict__)
+        copied.array = self.array.copy()
+        return copied
+
+    def reserve(self, count: int) -> None:
+        """
+        Resize the table once, so that it can hold count items without
+        rehashing again along the way.
+
+        :complexity best: O(1) table is already big enough.
+        :complexity worst: See rehash.
+        """
+        size_index = self.size_index
+        while size_index < len(self.TABLE_SIZES) - 1 and count > self.TABLE_SIZES[size_index] / 2:
+            size_index += 1
+        if size_index > self.size_index:
+            self._rehash(size_index)
+
+    def _rehash(self, size_index: int | None = None) -> None:
         """
         Need to resize table and reinsert all values
+        size_index: position in TABLE_SIZES to resize to, by default the next one.
 
         :complexity best: O(N*hash(K)) No probing.
         :complexity worst: O(N*hash(K) + N^2*comp(K)) Lots of probing.
         Where N is len(self)
         """
         old_array = self.array
-        self.size_index += 1
+        self.size_index = self.size_index + 1 if size_index is None else size_index
         if self.size_index == len(self.TABLE_SIZES):
             # Cannot be resized further.
             return
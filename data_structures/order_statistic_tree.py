@@ -0,0 +1,283 @@
+""" Order Statistic Tree
+
+Defines a balanced (AVL) binary search tree where every node also knows the
+size of its subtree, so items can be found by rank as well as by value.
+"""
+from __future__ import annotations
+
+from typing import Callable, Generic, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+class _Node(Generic[T]):
+    """ Node of an OrderStatisticTree. """
+
+    __slots__ = ("item", "key", "left", "right", "height", "size")
+
+    def __init__(self, item: T, key) -> None:
+        """ Object initializer. """
+        self.item = item
+        self.key = key
+        self.left: _Node[T] | None = None
+        self.right: _Node[T] | None = None
+        self.height = 1
+        self.size = 1
+
+
+class OrderStatisticTree(Generic[T]):
+    """
+    Order Statistic Tree.
+
+    Items are ordered by `key(item)` (the item itself if no key is given), which
+    is computed once when the item is inserted. Items with equal keys are kept
+    in insertion order.
+
+    Unless stated otherwise, all methods have O(log(N) * comp(K)) complexity,
+    where N is len(self) and comp(K) is the cost of comparing two keys.
+    """
+
+    def __init__(self, key: Callable | None = None) -> None:
+        """
+        Initialise an empty tree.
+        :complexity: O(1)
+        """
+        self.root: _Node[T] | None = None
+        self.key = key
+
+    def __len__(self) -> int:
+        """
+        Returns the number of items in the tree.
+        :complexity: O(1)
+        """
+        return _size(self.root)
+
+    def _key(self, item: T):
+        return item if self.key is None else self.key(item)
+
+    def insert(self, item: T) -> None:
+        """
+        Add an item to the tree, after any items with an equal key.
+        """
+        self.root = _insert(self.root, item, self._key(item))
+
+    def remove(self, item: T) -> None:
+        """
+        Remove an item whose key is equal to the key of item.
+        :raises KeyError: when no such item exists.
+        """
+        self.root = _remove(self.root, self._key(item))
+
+    def pop(self, index: int) -> T:
+        """
+        Remove and return the item with the given rank.
+        :raises IndexError: when index is out of range.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        self.root, item = _pop(self.root, index)
+        return item
+
+    def bisect_left(self, item: T) -> int:
+        """
+        Returns the number of items whose key is strictly less than the key of item,
+        i.e. the rank item has, or would have if inserted before any equal items.
+        """
+        return self.bisect_left_key(self._key(item))
+
+    def bisect_left_key(self, key) -> int:
+        """
+        Same as bisect_left, but given a key rather than an item.
+        """
+        node = self.root
+        rank = 0
+        while node is not None:
+            if node.key < key:
+                rank += _size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return rank
+
+    def bisect_right(self, item: T) -> int:
+        """
+        Returns the number of items whose key is less than or equal to the key of item.
+        """
+        key = self._key(item)
+        node = self.root
+        rank = 0
+        while node is not None:
+            if key < node.key:
+                node = node.left
+            else:
+                rank += _size(node.left) + 1
+                node = node.right
+        return rank
+
+    def __getitem__(self, index: int) -> T:
+        """
+        Returns the item with the given rank.
+        :complexity: O(log(N))
+        :raises IndexError: when index is out of range.
+        """
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        node = self.root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.item
+            else:
+                index -= left + 1
+                node = node.right
+
+    def __iter__(self) -> Iterator[T]:
+        """
+        Iterate over all items in order.
+        :complexity: O(N) for the whole iteration.
+        """
+        return self.iter_range(0, len(self))
+
+    def iter_range(self, lo: int, hi: int) -> Iterator[T]:
+        """
+        Iterate over the items with rank lo (inclusive) to hi (exclusive), in order.
+        :complexity: O(log(N) + hi - lo) for the whole iteration.
+        """
+        lo = max(lo, 0)
+        remaining = min(hi, len(self)) - lo
+        if remaining <= 0:
+            return
+        # Walk down to the item of rank lo, remembering the nodes still to visit.
+        stack = []
+        node = self.root
+        index = lo
+        while node is not None:
+            left = _size(node.left)
+            if index < left:
+                stack.append(node)
+                node = node.left
+            elif index == left:
+                stack.append(node)
+                break
+            else:
+                index -= left + 1
+                node = node.right
+        while remaining > 0:
+            node = stack.pop()
+            yield node.item
+            remaining -= 1
+            node = node.right
+            while node is not None:
+                stack.append(node)
+                node = node.left
+
+
+def _size(node: _Node | None) -> int:
+    return 0 if node is None else node.size
+
+
+def _height(node: _Node | None) -> int:
+    return 0 if node is None else node.height
+
+
+def _update(node: _Node) -> None:
+    node.height = max(_height(node.left), _height(node.right)) + 1
+    node.size = _size(node.left) + _size(node.right) + 1
+
+
+def _rotate_right(node: _Node) -> _Node:
+    pivot = node.left
+    node.left = pivot.right
+    pivot.right = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rotate_left(node: _Node) -> _Node:
+    pivot = node.right
+    node.right = pivot.left
+    pivot.left = node
+    _update(node)
+    _update(pivot)
+    return pivot
+
+
+def _rebalance(node: _Node) -> _Node:
+    """
+    Restore the AVL property at node, given both subtrees are balanced.
+    :complexity: O(1)
+    """
+    _update(node)
+    balance = _height(node.left) - _height(node.right)
+    if balance > 1:
+        if _height(node.left.left) < _height(node.left.right):
+            node.left = _rotate_left(node.left)
+        return _rotate_right(node)
+    if balance < -1:
+        if _height(node.right.right) < _height(node.right.left):
+            node.right = _rotate_right(node.right)
+        return _rotate_left(node)
+    return node
+
+
+def _insert(node: _Node | None, item, key) -> _Node:
+    if node is None:
+        return _Node(item, key)
+    if key < node.key:
+        node.left = _insert(node.left, item, key)
+    else:
+        node.right = _insert(node.right, item, key)
+    return _rebalance(node)
+
+
+def _remove_min(node: _Node) -> tuple[_Node | None, _Node]:
+    """ Detach the leftmost node of this subtree, returning (new subtree, detached node). """
+    if node.left is None:
+        return node.right, node
+    node.left, smallest = _remove_min(node.left)
+    return _rebalance(node), smallest
+
+
+def _remove(node: _Node | None, key) -> _Node | None:
+    if node is None:
+        raise KeyError(key)
+    if node.key < key:
+        node.right = _remove(node.right, key)
+    elif key < node.key:
+        node.left = _remove(node.left, key)
+    else:
+        if node.left is None:
+            return node.right
+        if node.right is None:
+            return node.left
+        node.right, successor = _remove_min(node.right)
+        successor.left = node.left
+        successor.right = node.right
+        return _rebalance(successor)
+    return _rebalance(node)
+
+
+def _pop(node: _Node, index: int) -> tuple[_Node | None, object]:
+    left = _size(node.left)
+    if index < left:
+        node.left, item = _pop(node.left, index)
+    elif index > left:
+        node.right, item = _pop(node.right, index - left - 1)
+    else:
+        item = node.item
+        if node.left is None:
+            return node.right, item
+        if node.right is None:
+            return node.left, item
+        node.right, successor = _remove_min(node.right)
+        successor.left = node.left
+        successor.right = node.right
+        return _rebalance(successor), item
+    return _rebalance(node), item
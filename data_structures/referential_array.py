@@ -53,3 +53,12 @@ class ArrayR(Generic[T]):
         """
         self.array[index] = value
 
+
+    def copy(self) -> 'ArrayR[T]':
+        """ Returns a new array holding the same references (a shallow copy)
+        :complexity: O(length) for best/worst case
+        """
+        copied = ArrayR.__new__(ArrayR)
+        copied.array = (len(self.array) * py_object)()
+        copied.array[:] = self.array[:]
+        return copied
@@ -0,0 +1,74 @@
+""" Spatial Grid
+
+Defines a uniform grid over the plane for finding the rectangles that
+contain a point, without checking every rectangle.
+"""
+from __future__ import annotations
+
+import math
+from typing import Generic, TypeVar
+
+T = TypeVar('T')
+
+
+class SpatialGrid(Generic[T]):
+    """
+    Spatial Grid.
+
+    Type Arguments:
+        - T:    Item Type.
+
+    The plane is cut into square cells of side cell_size. Each item is
+    stored with its rectangle in every cell the rectangle overlaps, so a
+    point query only has to check the items of one cell. Rectangles are
+    closed: points on their edges are inside.
+
+    Works best when rectangles are about the size of a cell; a rectangle
+    much larger than a cell is stored in many cells.
+    """
+
+    def __init__(self, cell_size: float) -> None:
+        """
+        Initialise an empty grid.
+        :pre: cell_size > 0
+        """
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[tuple[float, float, float, float, T]]] = {}
+        self.count = 0
+
+    def __len__(self) -> int:
+        """
+        Returns number of items in the grid
+        """
+        return self.count
+
+    def insert(self, x0: float, y0: float, x1: float, y1: float, item: T) -> None:
+        """
+        Add an item covering the rectangle [x0, x1] x [y0, y1].
+        Empty rectangles (x1 < x0 or y1 < y0) are ignored.
+
+        :complexity: O(C) where C is the number of cells the rectangle overlaps.
+        """
+        if x1 < x0 or y1 < y0:
+            return
+        entry = (x0, y0, x1, y1, item)
+        for cx in range(math.floor(x0 / self.cell_size), math.floor(x1 / self.cell_size) + 1):
+            for cy in range(math.floor(y0 / self.cell_size), math.floor(y1 / self.cell_size) + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is None:
+                    self.cells[cx, cy] = [entry]
+                else:
+                    cell.append(entry)
+        self.count += 1
+
+    def query(self, x: float, y: float) -> list[T]:
+        """
+        Returns the items whose rectangle contains the point (x, y), in the
+        order they were inserted.
+
+        :complexity: O(K) where K is the number of items stored in the cell of the point.
+        """
+        cell = self.cells.get((math.floor(x / self.cell_size), math.floor(y / self.cell_size)))
+        if cell is None:
+            return []
+        return [item for x0, y0, x1, y1, item in cell if x0 <= x <= x1 and y0 <= y <= y1]
@@ -7,9 +7,12 @@ A bit of a mess, you 100% don't need to look at this for your assignment!
 from __future__ import annotations
 from dataclasses import dataclass, field
 from mountain import Mountain
-from utils import av, bezier
+from utils import av, bezier_points
 from constants import DrawMode
-from trail import Trail, TrailSeries, TrailSplit
+from data_structures.spatial_grid import SpatialGrid
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+from trail_history import TrailHistory
+from trail_index import TrailIndex
 
 @dataclass
 class Box:
@@ -46,6 +49,23 @@ class TrailBox(Trail):
 
     trail_box: Box = field(default_factory=Box)
 
+@dataclass
+class HitRecord:
+    """
+    A box that box_and_action can return, recorded by draw_in_box.
+    rank orders records the way the recursive walk in box_and_action would
+    check them, so the first one found is kept when boxes overlap.
+    path is linked: a (parent path, attribute) pair, or None at the root.
+    """
+
+    rank: int
+    kind: str
+    box: Box
+    ref_trail: Trail
+    node: TrailSeries|TrailSplit|None
+    parent_sets: tuple[object, str]|None
+    path: tuple|None
+
 class TrailDraw:
 
     ### Visual constants
@@ -60,110 +80,261 @@ class TrailDraw:
     BRANCH_WIDTH = 30
     MIN_BRANCH_CONTENT_WIDTH = 20
     MAX_MOUNTAIN_WIDTH = 120
+    # Sub trails drawn at less than this many pixels per mountain are drawn as one summary glyph.
+    LOD_MOUNTAIN_WIDTH = 4
+    SUMMARY_COLOUR = (150, 150, 150)
 
     ### Click constants
     LINE_VERTICAL_BOX = MOUNTAIN_HEIGHT / 2
+    HIT_CELL_SIZE = 32
+    # Points per tessellated branch curve.
+    BRANCH_SAMPLES = 101
+    HIT_MODES = {
+        "empty": [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH],
+        "before": [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH],
+        "mountain": [DrawMode.REMOVE, DrawMode.EDIT],
+        "after": [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH],
+        "branch_start": [DrawMode.REMOVE],
+        "branch_end": [DrawMode.REMOVE],
+    }
 
-    def __init__(self, trail: TrailBox) -> None:
+    def __init__(self, trail: TrailBox, index: TrailIndex|None=None, history: TrailHistory|None=None) -> None:
         self.trail = trail
+        # Optional reverse index of the trail, kept in sync by the actions from box_and_action.
+        self.index = index
+        # Optional undo history. If given, actions from box_and_action make a new version of the trail
+        # instead of changing it in place.
+        self.history = history
+        # Boxes recorded by the last draw_in_box, for hit testing in box_and_action.
+        self.hit_grid: SpatialGrid[HitRecord]|None = None
+        self.hit_rank = 0
+        # Visible area. Sub trails entirely outside it are not drawn, and cannot be clicked.
+        self.viewport: Box|None = None
+        # Tessellated branch curves by geometry, for this frame and the previous one.
+        self.branch_cache = {}
+        self.old_branch_cache = {}
+        # Required (width, height) of each store, see _cached_size.
+        self.sizes = {}
+        self.old_sizes = {}
+
+    def set_trail(self, trail: TrailBox) -> None:
+        if self.index is not None:
+            self.index.set_trail(self, "trail", trail)
+        else:
+            self.trail = trail
+        self.changed()
+
+    def set_viewport(self, viewport: Box|None) -> None:
+        # Only draw what lies inside viewport from now on (everything if None).
+        self.viewport = viewport
+        self.changed()
+
+    def changed(self) -> None:
+        # Called whenever the trail (or a mountain in it) was changed. The recorded boxes are
+        # out of date until the next draw_in_box, so nothing can be hit until then.
+        self.hit_grid = SpatialGrid(self.HIT_CELL_SIZE)
+
+    def undo(self) -> None:
+        self.set_trail(self.history.undo())
+
+    def redo(self) -> None:
+        self.set_trail(self.history.redo())
 
     # VISUAL CALCULATIONS
 
     def required_height(self, cur_trail: TrailBox|None=None) -> int:
-        if cur_trail is None:
-            cur_trail = self.trail.store
-        else:
-            cur_trail = cur_trail.store
-        if cur_trail is None:
-            return self.EMPTY_HEIGHT
-        elif isinstance(cur_trail, TrailSeries):
-            return max(self.MOUNTAIN_HEIGHT, self.required_height(cur_trail.following))
-        else:
-            return max(
-                self.required_height(cur_trail.path_top) + self.BRANCH_SEPARATION + self.required_height(cur_trail.path_bottom),
-                self.required_height(cur_trail.path_follow)
-            )
+        return self._size(self.trail if cur_trail is None else cur_trail)[1]
 
     def required_width(self, cur_trail: TrailBox|None=None) -> int:
-        if cur_trail is None:
-            cur_trail = self.trail.store
-        else:
-            cur_trail = cur_trail.store
-        if cur_trail is None:
-            return 0
-        elif isinstance(cur_trail, TrailSeries):
-            return self.TOTAL_MOUNTAIN_WIDTH + self.required_width(cur_trail.following)
-        else:
-            return 2 * self.BRANCH_WIDTH + max(
-                self.required_width(cur_trail.path_top),
-                self.required_width(cur_trail.path_bottom),
-                self.MIN_BRANCH_CONTENT_WIDTH,
-            ) + self.required_width(cur_trail.path_follow)
+        return self._size(self.trail if cur_trail is None else cur_trail)[0]
+
+    def _cached_size(self, store: TrailStore) -> tuple[int, int]|None:
+        # Sizes are kept by the identity of each store, for this frame and the previous one.
+        # Stores are not changed in place by persistent edits, so a size stays valid for as long
+        # as its store is in the trail; in place edits call _forget_sizes.
+        entry = self.sizes.get(id(store))
+        if entry is None:
+            entry = self.old_sizes.get(id(store))
+            if entry is None or entry[0] is not store:
+                return None
+            self.sizes[id(store)] = entry
+        return entry[1], entry[2]
+
+    def _size(self, trail: TrailBox) -> tuple[int, int]:
+        # (required width, required height) of a trail. Only stores without a cached size are
+        # visited, children first, with an explicit stack so long trails do not hit the recursion limit.
+        if trail.store is None:
+            return 0, self.EMPTY_HEIGHT
+        size = self._cached_size(trail.store)
+        if size is not None:
+            return size
+        stack = [(trail.store, False)]
+        while stack:
+            store, children_done = stack.pop()
+            if not children_done:
+                stack.append((store, True))
+                for child in self._child_trails(store):
+                    if child.store is not None and self._cached_size(child.store) is None:
+                        stack.append((child.store, False))
+            elif isinstance(store, TrailSeries):
+                fw, fh = self._child_size(store.following)
+                self.sizes[id(store)] = (store, self.TOTAL_MOUNTAIN_WIDTH + fw, max(self.MOUNTAIN_HEIGHT, fh))
+            else:
+                tw, th = self._child_size(store.path_top)
+                bw, bh = self._child_size(store.path_bottom)
+                fw, fh = self._child_size(store.path_follow)
+                self.sizes[id(store)] = (
+                    store,
+                    2 * self.BRANCH_WIDTH + max(tw, bw, self.MIN_BRANCH_CONTENT_WIDTH) + fw,
+                    max(th + self.BRANCH_SEPARATION + bh, fh),
+                )
+        return self._cached_size(trail.store)
+
+    def _child_size(self, trail: TrailBox) -> tuple[int, int]:
+        if trail.store is None:
+            return 0, self.EMPTY_HEIGHT
+        return self._cached_size(trail.store)
+
+    @staticmethod
+    def _child_trails(store: TrailStore) -> list[TrailBox]:
+        if isinstance(store, TrailSeries):
+            return [store.following]
+        return [store.path_top, store.path_bottom, store.path_follow]
+
+    def _forget_sizes(self, path: tuple[str, ...]) -> None:
+        # Before an in place edit at path, forget the sizes of the stores enclosing it.
+        trail = self.trail
+        for attribute in path:
+            self.sizes.pop(id(trail.store), None)
+            self.old_sizes.pop(id(trail.store), None)
+            trail = getattr(trail.store, attribute)
+        self.sizes.pop(id(trail.store), None)
+        self.old_sizes.pop(id(trail.store), None)
 
     def draw_in_box(self, height, width, minx, miny, cur_trail: TrailBox|None=None) -> None:
+        # Lays out and draws the trail (or the sub trail cur_trail), recording the boxes for box_and_action.
+        # Iterative, so trails of any length can be drawn. Each pending sub trail is a frame of
+        # (height, width, minx, miny, trail, parent_sets, path, clip), where path is a linked
+        # (parent path, attribute) pair and clip the intersection of the trail boxes of all enclosing trails.
+        # Frames are visited in the order the recursive walk in box_and_action checks them, so the
+        # records can be ranked by a counter.
         if cur_trail is None:
-            ref_trail = self.trail
-            cur_trail = self.trail.store
+            self.hit_grid = SpatialGrid(self.HIT_CELL_SIZE)
+            self.hit_rank = 0
+            # Keep only what was used last frame, so the caches do not grow as the trail changes.
+            self.old_branch_cache, self.branch_cache = self.branch_cache, {}
+            self.old_sizes, self.sizes = self.sizes, {}
+            frames = [(height, width, minx, miny, self.trail, (self, "trail"), None, None)]
         else:
-            ref_trail = cur_trail
-            cur_trail = cur_trail.store
-        if cur_trail is None:
-            self.draw_line(minx, miny + height/2, minx + width, miny + height/2)
-            ref_trail.trail_box = Box(minx, miny + height/2-self.LINE_VERTICAL_BOX, width, 2*self.LINE_VERTICAL_BOX)
-        elif isinstance(cur_trail, TrailSeries):
-            ref_trail.trail_box = Box(minx, miny, width, height)
-            p1 = self.TOTAL_MOUNTAIN_WIDTH
-            p2 = self.required_width(cur_trail.following)
-            total = p1 + p2
-            # Draw mountain
-            p1_total_dist = (p1 / total) * width
-            start_mountain_trail_x = minx
-            mountain_width = (self.MIN_MOUNTAIN_WIDTH / self.TOTAL_MOUNTAIN_WIDTH) * p1_total_dist
-            mountain_width = max(mountain_width, self.MIN_MOUNTAIN_WIDTH)
-            mountain_width = min(mountain_width, self.MAX_MOUNTAIN_WIDTH)
-            start_mountain_x = minx + p1_total_dist/2 - mountain_width/2
-            end_mountain_x = start_mountain_x + mountain_width
-            end_mountain_trail_x = minx + p1_total_dist
-            mid = miny + height/2
-            self.draw_mountain(av(start_mountain_x, end_mountain_x), mid, (end_mountain_x - start_mountain_x) / self.MIN_MOUNTAIN_WIDTH, cur_trail.mountain)
-            self.draw_line(start_mountain_trail_x, mid, start_mountain_x, mid)
-            self.draw_line(end_mountain_x, mid, end_mountain_trail_x, mid)
-            mountain_actual_height = self.MOUNTAIN_HEIGHT * (end_mountain_x - start_mountain_x) / self.MIN_MOUNTAIN_WIDTH
-            cur_trail.before_box = Box(start_mountain_trail_x, mid - mountain_actual_height/2, start_mountain_x - start_mountain_trail_x, mountain_actual_height)
-            cur_trail.mountain_box = Box(start_mountain_x, mid - mountain_actual_height/2, end_mountain_x - start_mountain_x, mountain_actual_height)
-            cur_trail.after_box = Box(end_mountain_x, mid - mountain_actual_height/2, end_mountain_trail_x - end_mountain_x, mountain_actual_height)
-            # Draw rest
-            self.draw_in_box(height, p2/total*width, minx+p1_total_dist, miny, cur_trail.following)
-        else:
-            ref_trail.trail_box = Box(minx, miny, width, height)
-            b1 = self.required_width(cur_trail.path_top)
-            b2 = self.required_width(cur_trail.path_bottom)
-            b3 = self.required_width(cur_trail.path_follow)
-            total = b3 + max(b1, b2)
-            mid = miny + height/2
-            pth = self.required_height(cur_trail.path_top)
-            pbh = self.required_height(cur_trail.path_bottom)
-            total_height = pth + pbh
-            top_section = pth / total_height * (height - self.BRANCH_SEPARATION)
-            bot_section = pbh / total_height * (height - self.BRANCH_SEPARATION)
-            if total > 0:
-                branch_dist = max(
-                    max(b1, b2)/total*(width - 2*self.BRANCH_WIDTH),
-                    self.MIN_BRANCH_CONTENT_WIDTH
-                )
+            frames = [(height, width, minx, miny, cur_trail, None, None, None)]
+        while frames:
+            height, width, minx, miny, ref_trail, parent_sets, path, clip = frames.pop()
+            cur_trail = ref_trail.store
+            if self.viewport is not None and not self._visible(minx, miny, width, height):
+                continue
+            if cur_trail is not None and width < self.LOD_MOUNTAIN_WIDTH / self.TOTAL_MOUNTAIN_WIDTH * self.required_width(ref_trail):
+                # Too dense to tell the mountains apart.
+                ref_trail.trail_box = Box(minx, miny, width, height)
+                self.draw_summary(minx, miny, width, height)
+                continue
+            if cur_trail is None:
+                self.draw_line(minx, miny + height/2, minx + width, miny + height/2)
+                ref_trail.trail_box = Box(minx, miny + height/2-self.LINE_VERTICAL_BOX, width, 2*self.LINE_VERTICAL_BOX)
+                clip = self._clip(clip, ref_trail.trail_box)
+                self._record("empty", ref_trail.trail_box, ref_trail, None, parent_sets, path, clip)
+            elif isinstance(cur_trail, TrailSeries):
+                ref_trail.trail_box = Box(minx, miny, width, height)
+                clip = self._clip(clip, ref_trail.trail_box)
+                p1 = self.TOTAL_MOUNTAIN_WIDTH
+                p2 = self.required_width(cur_trail.following)
+                total = p1 + p2
+                # Draw mountain
+                p1_total_dist = (p1 / total) * width
+                start_mountain_trail_x = minx
+                mountain_width = (self.MIN_MOUNTAIN_WIDTH / self.TOTAL_MOUNTAIN_WIDTH) * p1_total_dist
+                mountain_width = max(mountain_width, self.MIN_MOUNTAIN_WIDTH)
+                mountain_width = min(mountain_width, self.MAX_MOUNTAIN_WIDTH)
+                start_mountain_x = minx + p1_total_dist/2 - mountain_width/2
+                end_mountain_x = start_mountain_x + mountain_width
+                end_mountain_trail_x = minx + p1_total_dist
+                mid = miny + height/2
+                self.draw_mountain(av(start_mountain_x, end_mountain_x), mid, (end_mountain_x - start_mountain_x) / self.MIN_MOUNTAIN_WIDTH, cur_trail.mountain)
+                self.draw_line(start_mountain_trail_x, mid, start_mountain_x, mid)
+                self.draw_line(end_mountain_x, mid, end_mountain_trail_x, mid)
+                mountain_actual_height = self.MOUNTAIN_HEIGHT * (end_mountain_x - start_mountain_x) / self.MIN_MOUNTAIN_WIDTH
+                cur_trail.before_box = Box(start_mountain_trail_x, mid - mountain_actual_height/2, start_mountain_x - start_mountain_trail_x, mountain_actual_height)
+                cur_trail.mountain_box = Box(start_mountain_x, mid - mountain_actual_height/2, end_mountain_x - start_mountain_x, mountain_actual_height)
+                cur_trail.after_box = Box(end_mountain_x, mid - mountain_actual_height/2, end_mountain_trail_x - end_mountain_x, mountain_actual_height)
+                self._record("before", cur_trail.before_box, ref_trail, cur_trail, parent_sets, path, clip)
+                self._record("mountain", cur_trail.mountain_box, ref_trail, cur_trail, parent_sets, path, clip)
+                self._record("after", cur_trail.after_box, ref_trail, cur_trail, parent_sets, path, clip)
+                # Draw rest
+                frames.append((height, p2/total*width, minx+p1_total_dist, miny, cur_trail.following, (cur_trail, 'following'), (path, 'following'), clip))
             else:
-                branch_dist = self.MIN_BRANCH_CONTENT_WIDTH
-            b3_dist = (width - 2*self.BRANCH_WIDTH) - branch_dist
-            # Draw branches
-            self.draw_branch(minx, mid, minx+self.BRANCH_WIDTH, miny + bot_section + self.BRANCH_SEPARATION + top_section / 2, miny + bot_section / 2)
-            self.draw_branch(minx + width - b3_dist, mid, minx + width - self.BRANCH_WIDTH - b3_dist, miny + bot_section + self.BRANCH_SEPARATION + top_section / 2, miny + bot_section / 2)
-            cur_trail.branch_start_box = Box(minx, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION)
-            cur_trail.branch_end_box = Box(minx+width-b3_dist-self.BRANCH_WIDTH, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION)
-            # Draw top & bottom
-            self.draw_in_box(top_section, branch_dist, minx+self.BRANCH_WIDTH, miny+bot_section+self.BRANCH_SEPARATION, cur_trail.path_top)
-            self.draw_in_box(bot_section, branch_dist, minx+self.BRANCH_WIDTH, miny, cur_trail.path_bottom)
-            # Draw following
-            self.draw_in_box(height, b3_dist, minx + width - b3_dist, miny, cur_trail.path_follow)
+                ref_trail.trail_box = Box(minx, miny, width, height)
+                clip = self._clip(clip, ref_trail.trail_box)
+                b1 = self.required_width(cur_trail.path_top)
+                b2 = self.required_width(cur_trail.path_bottom)
+                b3 = self.required_width(cur_trail.path_follow)
+                total = b3 + max(b1, b2)
+                mid = miny + height/2
+                pth = self.required_height(cur_trail.path_top)
+                pbh = self.required_height(cur_trail.path_bottom)
+                total_height = pth + pbh
+                top_section = pth / total_height * (height - self.BRANCH_SEPARATION)
+                bot_section = pbh / total_height * (height - self.BRANCH_SEPARATION)
+                if total > 0:
+                    branch_dist = max(
+                        max(b1, b2)/total*(width - 2*self.BRANCH_WIDTH),
+                        self.MIN_BRANCH_CONTENT_WIDTH
+                    )
+                else:
+                    branch_dist = self.MIN_BRANCH_CONTENT_WIDTH
+                b3_dist = (width - 2*self.BRANCH_WIDTH) - branch_dist
+                # Draw branches
+                self.draw_branch(minx, mid, minx+self.BRANCH_WIDTH, miny + bot_section + self.BRANCH_SEPARATION + top_section / 2, miny + bot_section / 2)
+                self.draw_branch(minx + width - b3_dist, mid, minx + width - self.BRANCH_WIDTH - b3_dist, miny + bot_section + self.BRANCH_SEPARATION + top_section / 2, miny + bot_section / 2)
+                cur_trail.branch_start_box = Box(minx, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION)
+                cur_trail.branch_end_box = Box(minx+width-b3_dist-self.BRANCH_WIDTH, mid - self.BRANCH_SEPARATION/2 - top_section/2, self.BRANCH_WIDTH, bot_section/2 + top_section/2 + self.BRANCH_SEPARATION)
+                self._record("branch_start", cur_trail.branch_start_box, ref_trail, cur_trail, parent_sets, path, clip)
+                self._record("branch_end", cur_trail.branch_end_box, ref_trail, cur_trail, parent_sets, path, clip)
+                # Draw following, top & bottom; pushed in reverse so bottom is visited first, like box_and_action.
+                frames.append((height, b3_dist, minx + width - b3_dist, miny, cur_trail.path_follow, (cur_trail, 'path_follow'), (path, 'path_follow'), clip))
+                frames.append((top_section, branch_dist, minx+self.BRANCH_WIDTH, miny+bot_section+self.BRANCH_SEPARATION, cur_trail.path_top, (cur_trail, 'path_top'), (path, 'path_top'), clip))
+                frames.append((bot_section, branch_dist, minx+self.BRANCH_WIDTH, miny, cur_trail.path_bottom, (cur_trail, 'path_bottom'), (path, 'path_bottom'), clip))
+
+    def _visible(self, minx, miny, width, height) -> bool:
+        # Whether the box overlaps the viewport. Mountains may be drawn wider than their box (up to
+        # MIN_MOUNTAIN_WIDTH), so allow that much margin.
+        view = self.viewport
+        margin = self.MIN_MOUNTAIN_WIDTH
+        return (
+            minx - margin <= view.x + view.w and view.x <= minx + width + margin
+            and miny - margin <= view.y + view.h and view.y <= miny + height + margin
+        )
+
+    @staticmethod
+    def _clip(clip: tuple[float, float, float, float]|None, box: Box) -> tuple[float, float, float, float]:
+        if clip is None:
+            return box.x, box.y, box.x + box.w, box.y + box.h
+        return max(clip[0], box.x), max(clip[1], box.y), min(clip[2], box.x + box.w), min(clip[3], box.y + box.h)
+
+    def _record(self, kind: str, box: Box, ref_trail: TrailBox, node: TrailStore, parent_sets, path, clip) -> None:
+        # box_and_action only finds a box inside the trail boxes of all enclosing trails, so store the clipped box.
+        if self.hit_grid is None:
+            return
+        x0, y0, x1, y1 = self._clip(clip, box)
+        self.hit_grid.insert(x0, y0, x1, y1, HitRecord(self.hit_rank, kind, box, ref_trail, node, parent_sets, path))
+        self.hit_rank += 1
+
+    @staticmethod
+    def _path_tuple(path) -> tuple[str, ...]:
+        # Turn a linked (parent path, attribute) path into a tuple of attributes from the root.
+        attributes = []
+        while path is not None:
+            path, attribute = path
+            attributes.append(attribute)
+        return tuple(reversed(attributes))
 
     def draw_line(self, sx, sy, ex, ey):
         import arcade
@@ -199,21 +370,90 @@ class TrailDraw:
         )
 
 
+    def draw_summary(self, minx, miny, width, height):
+        import arcade
+        arcade.draw_rectangle_filled(minx + width/2, miny + height/2, max(width, 1), min(height, self.MOUNTAIN_HEIGHT), self.SUMMARY_COLOUR)
+
+    def branch_curves(self, sx, sy, ex, ety, eby) -> tuple[list, list]:
+        # The top and bottom curves of a branch, tessellated once per geometry.
+        key = (sx, sy, ex, ety, eby)
+        curves = self.branch_cache.get(key)
+        if curves is None:
+            curves = self.old_branch_cache.get(key)
+            if curves is None:
+                curves = (
+                    bezier_points(((sx, sy), (av(sx, ex), sy), (av(sx, ex), ety), (ex, ety)), self.BRANCH_SAMPLES).tolist(),
+                    bezier_points(((sx, sy), (av(sx, ex), sy), (av(sx, ex), eby), (ex, eby)), self.BRANCH_SAMPLES).tolist(),
+                )
+            self.branch_cache[key] = curves
+        return curves
+
     def draw_branch(self, sx, sy, ex, ety, eby):
         import arcade
-        bez_top = bezier((sx, sy), (av(sx, ex), sy), (av(sx, ex), ety), (ex, ety))
-        arcade.draw_line_strip([
-            bez_top(t/100)
-            for t in range(101)
-        ], (0, 0, 0), 1)
-        bez_bot = bezier((sx, sy), (av(sx, ex), sy), (av(sx, ex), eby), (ex, eby))
-        arcade.draw_line_strip([
-            bez_bot(t/100)
-            for t in range(101)
-        ], (0, 0, 0), 1)
-
-    def box_and_action(self, mouse_pos: tuple[float, float], mode=DrawMode, cur_trail: Trail|None=None, parent_sets: tuple[Trail, str]|None=None) -> tuple[Box|None, function|None, Trail|None]:
+        bez_top, bez_bot = self.branch_curves(sx, sy, ex, ety, eby)
+        arcade.draw_line_strip(bez_top, (0, 0, 0), 1)
+        arcade.draw_line_strip(bez_bot, (0, 0, 0), 1)
+
+    def _store_action(self, ref: Trail, cur_method, path: tuple[str, ...]) -> function:
+        # Action setting ref.store to the result of cur_method.
+        def func(*m):
+            if self.history is not None:
+                self.set_trail(self.history.apply(path, cur_method.__name__, *m))
+            else:
+                self._forget_sizes(path)
+                if self.index is not None:
+                    self.index.set_store(ref, cur_method(*m))
+                else:
+                    ref.store = cur_method(*m)
+            self.changed()
+        return func
+
+    def _trail_action(self, parent_set: tuple[object, str], cur_method, path: tuple[str, ...]) -> function:
+        # Action replacing the Trail at parent_set with the result of cur_method.
+        parent, attribute = parent_set
+        def func(*m):
+            if self.history is not None:
+                self.set_trail(self.history.apply(path, cur_method.__name__, *m))
+            else:
+                self._forget_sizes(path)
+                if self.index is not None:
+                    self.index.set_trail(parent, attribute, cur_method(*m))
+                else:
+                    setattr(parent, attribute, cur_method(*m))
+            self.changed()
+        return func
+
+    def hit_test(self, mouse_pos: tuple[float, float], mode=DrawMode) -> tuple[Box|None, function|None, Trail|None]:
+        """
+        Same result as box_and_action, using the boxes recorded by the last draw_in_box:
+        only the records in the grid cell of mouse_pos are checked, and the action is only
+        built for the record that is hit. Returns nothing after an action ran, until the
+        trail is drawn again.
+        """
+        best = None
+        for record in self.hit_grid.query(*mouse_pos):
+            if mode in self.HIT_MODES[record.kind] and (best is None or record.rank < best.rank):
+                best = record
+        if best is None:
+            return None, None, None
+        node, ref_trail = best.node, best.ref_trail
+        if best.kind == "empty":
+            method = ref_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else ref_trail.add_empty_branch_before
+            return best.box, self._trail_action(best.parent_sets, method, self._path_tuple(best.path)), None
+        if best.kind == "before":
+            method = node.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else node.add_empty_branch_before
+        elif best.kind == "after":
+            method = node.add_mountain_after if mode == DrawMode.ADD_MOUNTAIN else node.add_empty_branch_after
+        elif best.kind == "mountain":
+            method = node.replace_mountain if mode == DrawMode.EDIT else node.remove_mountain
+        else:
+            method = node.remove_branch
+        return best.box, self._store_action(ref_trail, method, self._path_tuple(best.path)), node
+
+    def box_and_action(self, mouse_pos: tuple[float, float], mode=DrawMode, cur_trail: Trail|None=None, parent_sets: tuple[Trail, str]|None=None, path: tuple[str, ...]=()) -> tuple[Box|None, function|None, Trail|None]:
         if cur_trail is None:
+            if self.hit_grid is not None:
+                return self.hit_test(mouse_pos, mode)
             ref_trail = self.trail
             cur_trail = self.trail.store
             parent_sets = (self, "trail")
@@ -222,15 +462,8 @@ class TrailDraw:
             cur_trail = cur_trail.store
         if mouse_pos not in ref_trail.trail_box:
             return None, None, None
-        def set_m(ref, cur_method):
-            def func(*m):
-                ref.store = cur_method(*m)
-            return func
-        def set_parent(parent_set, cur_method):
-            parent, attribute = parent_set
-            def func(*m):
-                setattr(parent, attribute, cur_method(*m))
-            return func
+        set_m = lambda ref, cur_method: self._store_action(ref, cur_method, path)
+        set_parent = lambda parent_set, cur_method: self._trail_action(parent_set, cur_method, path)
         if cur_trail is None:
             if mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
                 return ref_trail.trail_box, set_parent(parent_sets, ref_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else ref_trail.add_empty_branch_before), cur_trail
@@ -238,18 +471,137 @@ class TrailDraw:
             if mouse_pos in cur_trail.before_box and mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
                 return cur_trail.before_box, set_m(ref_trail, cur_trail.add_mountain_before if mode == DrawMode.ADD_MOUNTAIN else cur_trail.add_empty_branch_before), cur_trail
             if mouse_pos in cur_trail.mountain_box and mode in [DrawMode.REMOVE, DrawMode.EDIT]:
-                return cur_trail.mountain_box, (set_m(ref_trail, cur_trail.remove_mountain) if mode == DrawMode.REMOVE else lambda: cur_trail.mountain), cur_trail
+                return cur_trail.mountain_box, set_m(ref_trail, cur_trail.remove_mountain if mode == DrawMode.REMOVE else cur_trail.replace_mountain), cur_trail
             if mouse_pos in cur_trail.after_box and mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH]:
                 return cur_trail.after_box, set_m(ref_trail, cur_trail.add_mountain_after if mode == DrawMode.ADD_MOUNTAIN else cur_trail.add_empty_branch_after), cur_trail
-            return self.box_and_action(mouse_pos, mode, cur_trail.following, (cur_trail, 'following'))
+            return self.box_and_action(mouse_pos, mode, cur_trail.following, (cur_trail, 'following'), path + ('following',))
         else:
             if mouse_pos in cur_trail.branch_start_box and mode == DrawMode.REMOVE:
                 return cur_trail.branch_start_box, set_m(ref_trail, cur_trail.remove_branch), cur_trail
             if mouse_pos in cur_trail.branch_end_box and mode == DrawMode.REMOVE:
                 return cur_trail.branch_end_box, set_m(ref_trail, cur_trail.remove_branch), cur_trail
             if mouse_pos in cur_trail.path_bottom.trail_box:
-                return self.box_and_action(mouse_pos, mode, cur_trail.path_bottom, (cur_trail, 'path_bottom'))
+                return self.box_and_action(mouse_pos, mode, cur_trail.path_bottom, (cur_trail, 'path_bottom'), path + ('path_bottom',))
             if mouse_pos in cur_trail.path_top.trail_box:
-                return self.box_and_action(mouse_pos, mode, cur_trail.path_top, (cur_trail, 'path_top'))
-            return self.box_and_action(mouse_pos, mode, cur_trail.path_follow, (cur_trail, 'path_follow'))
+                return self.box_and_action(mouse_pos, mode, cur_trail.path_top, (cur_trail, 'path_top'), path + ('path_top',))
+            return self.box_and_action(mouse_pos, mode, cur_trail.path_follow, (cur_trail, 'path_follow'), path + ('path_follow',))
         return None, None, None
+
+
+class RetainedTrailDraw(TrailDraw):
+    """
+    TrailDraw that records the trail into arcade shape and sprite lists and a pyglet batch
+    of labels once, and then draws those every frame, instead of laying out the trail and issuing an immediate-mode
+    call per line, curve, sprite and label on every frame.
+
+    The recording is rebuilt by render() only after changed() was called (every edit made
+    through box_and_action, set_trail, undo and redo does this), or when the area to draw
+    in changes. Mountains edited in place must be followed by a call to changed().
+    """
+
+    def __init__(self, trail: TrailBox, index: TrailIndex|None=None, history: TrailHistory|None=None) -> None:
+        super().__init__(trail, index, history)
+        self.dirty = True
+        self.layout = None
+        self.shapes = None
+        self.sprites = None
+        self.labels = []
+        self.label_batch = None
+
+    def changed(self) -> None:
+        super().changed()
+        self.dirty = True
+
+    def render(self, height, width, minx, miny) -> None:
+        """
+        Draw the trail in the given area, rebuilding the recording first if needed.
+        """
+        layout = (height, width, minx, miny)
+        if self.dirty or layout != self.layout:
+            self.begin_batch()
+            self.draw_in_box(height, width, minx, miny)
+            self.layout = layout
+            self.dirty = False
+        self.draw_batch()
+
+    def begin_batch(self) -> None:
+        import arcade
+        import pyglet
+        self.shapes = arcade.ShapeElementList()
+        self.sprites = arcade.SpriteList()
+        # The labels are kept alive in self.labels, and drawn together through their batch.
+        self.labels = []
+        self.label_batch = pyglet.graphics.Batch()
+
+    def draw_batch(self) -> None:
+        import arcade
+        self.shapes.draw()
+        self.sprites.draw()
+        # One draw for all the labels, in the state arcade sets up for drawing with pyglet.
+        with arcade.get_window().ctx.pyglet_rendering():
+            self.label_batch.draw()
+
+    def draw_line(self, sx, sy, ex, ey):
+        import arcade
+        self.shapes.append(arcade.create_line(sx, sy, ex, ey, (0, 0, 0), 1))
+
+    def draw_mountain(self, x, y, scale, obj: Mountain):
+        import arcade
+        import pyglet
+        mountain = arcade.Sprite("img/hike.png", scale=self.MIN_MOUNTAIN_WIDTH/512 * scale)
+        mountain.center_x = x
+        mountain.center_y = y
+        self.sprites.append(mountain)
+        for text, dx, color in [(obj.difficulty_level, -1, (237, 17, 68)), (obj.length, 1, (17, 127, 245))]:
+            # A pyglet Label, since arcade.Text (in arcade 2.6) cannot be put in a batch.
+            self.labels.append(pyglet.text.Label(
+                str(text),
+                x=x + dx * self.MIN_MOUNTAIN_WIDTH * scale / 2,
+                y=y + self.MOUNTAIN_HEIGHT * scale / 2,
+                color=(*color, 255),
+                font_size=24,
+                font_name=("Montserrat", "calibri", "arial"),
+                anchor_x="center",
+                anchor_y="center",
+                batch=self.label_batch,
+            ))
+
+    def draw_summary(self, minx, miny, width, height):
+        import arcade
+        self.shapes.append(arcade.create_rectangle_filled(minx + width/2, miny + height/2, max(width, 1), min(height, self.MOUNTAIN_HEIGHT), self.SUMMARY_COLOUR))
+
+    def draw_branch(self, sx, sy, ex, ety, eby):
+        import arcade
+        bez_top, bez_bot = self.branch_curves(sx, sy, ex, ety, eby)
+        self.shapes.append(arcade.create_line_strip(bez_top, (0, 0, 0), 1))
+        self.shapes.append(arcade.create_line_strip(bez_bot, (0, 0, 0), 1))
+
+
+class HeadlessTrailDraw(TrailDraw):
+    """
+    TrailDraw that needs no arcade window: layout, hit boxes and branch tessellation are done as usual,
+    but draw calls are only counted, by primitive, in self.calls. The counts are reset by each draw of
+    the whole trail.
+    """
+
+    def __init__(self, trail: TrailBox, index: TrailIndex|None=None, history: TrailHistory|None=None) -> None:
+        super().__init__(trail, index, history)
+        self.calls = {"line": 0, "mountain": 0, "branch": 0, "summary": 0}
+
+    def draw_in_box(self, height, width, minx, miny, cur_trail: TrailBox|None=None) -> None:
+        if cur_trail is None:
+            self.calls = dict.fromkeys(self.calls, 0)
+        super().draw_in_box(height, width, minx, miny, cur_trail)
+
+    def draw_line(self, sx, sy, ex, ey):
+        self.calls["line"] += 1
+
+    def draw_mountain(self, x, y, scale, obj: Mountain):
+        self.calls["mountain"] += 1
+
+    def draw_branch(self, sx, sy, ex, ety, eby):
+        self.branch_curves(sx, sy, ex, ety, eby)
+        self.calls["branch"] += 1
+
+    def draw_summary(self, minx, miny, width, height):
+        self.calls["summary"] += 1
@@ -3,21 +3,25 @@ File for creating the GUI.
 Requires no student import, but will use your implemented classes as part of it's process!
 """
 
+import time
+START_TIME = time.perf_counter()
+
+import argparse
 import arcade
-import arcade.gui as gui
-import json
 import sys
 import secrets
-from copy import copy
 
 from constants import DrawMode
 from mountain import Mountain
 from mountain_manager import MountainManager
 from trail import Trail, TrailSeries, TrailSplit
-from draw_trails import TrailDraw
-from mountain_organiser import MountainOrganiser
-from double_key_table import DoubleKeyTable
-from serialize import serialize, deserialize
+from draw_trails import Box, RetainedTrailDraw
+from trail_history import TrailHistory
+from mountain_organiser import rank_evolution
+from serialize import read_store, write_store
+from background import BackgroundWorker
+
+IMPORT_TIME = time.perf_counter()
 
 class MyWindow(arcade.Window):
     """ Painter Window """
@@ -51,15 +55,45 @@ class MyWindow(arcade.Window):
     LABEL_WIDTH = 70
     GRAPH_HEIGHT = 300
 
-    def __init__(self) -> None:
+    # Each step of the mouse wheel zooms the trail in or out by this factor, around the mouse.
+    ZOOM_STEP = 1.25
+    # Pixels the trail moves for each press of the left or right arrow key, or step of a sideways scroll.
+    SCROLL_STEP = 100
+    # Seconds a message from show_message stays on screen.
+    MESSAGE_TIME = 5
+
+    def __init__(self, store="basic.json", profile_startup=False) -> None:
         """Initialise visual and logic variables."""
+        self.profile_startup = profile_startup
+        self.mark("imports", IMPORT_TIME)
         super().__init__(self.SCREEN_WIDTH, self.SCREEN_HEIGHT, self.SCREEN_TITLE)
         arcade.set_background_color(self.BG)
-        self.init_manager()
-        self.init_file_dialog()
-        self.init_graph()
+        self.cur_filename = store
+        # The dialogs are built the first time they are opened, see ensure_dialog.
+        self.manager = None
+        self.file_manager = None
+        self.graph = None
+        # Each entry in graph data follows this format:
+        # [color, start_index, name, [position1, position2, ...]]
+        self.graph_data = []
+        self.first_frame = True
+        self.message = ""
+        self.message_until = 0
+        self.mark("window created")
+
+    def mark(self, event, at=None):
+        """With --profile-startup, report how long after startup event happened."""
+        if self.profile_startup:
+            at = time.perf_counter() if at is None else at
+            print(f"{event}: {(at - START_TIME) * 1000:.1f} ms", file=sys.stderr)
+
+    def ensure_dialog(self, attribute, init):
+        """Build a dialog with init, unless its UIManager (self.<attribute>) already exists."""
+        if getattr(self, attribute) is None:
+            init()
 
     def init_manager(self):
+        import arcade.gui as gui
         self.manager = gui.UIManager()
         editor_width = 350
         self.label_mountain_name = gui.UILabel(
@@ -148,6 +182,7 @@ class MyWindow(arcade.Window):
         ))
 
     def init_file_dialog(self):
+        import arcade.gui as gui
         self.file_manager = gui.UIManager()
         editor_width = 350
         self.label_file_name = gui.UILabel(
@@ -210,6 +245,7 @@ class MyWindow(arcade.Window):
         ))
 
     def init_graph(self):
+        import arcade.gui as gui
         self.graph = gui.UIManager()
         self.graph.enable()
         self.graph.add(gui.UIAnchorWidget(
@@ -223,9 +259,6 @@ class MyWindow(arcade.Window):
             align_x=self.SCREEN_WIDTH // 2 - (self.GRAPH_WIDTH + self.LABEL_WIDTH)//2,
             child=gui.UISpace(width=self.GRAPH_WIDTH, height=self.GRAPH_HEIGHT, color=(0, 0, 0, 220))
         ))
-        # Each entry in graph data follows this format:
-        # [color, start_index, name, [position1, position2, ...]]
-        self.graph_data = []
 
     def draw_graph_elems(self):
         total_y_points = len(self.graph_data)
@@ -247,9 +280,11 @@ class MyWindow(arcade.Window):
         """Reset the screen."""
         self.timestamp = 0
         self.is_editing = False
-        self.manager.disable()
+        if self.manager is not None:
+            self.manager.disable()
         self.is_saving = False
-        self.file_manager.disable()
+        if self.file_manager is not None:
+            self.file_manager.disable()
 
         # Visual calculations
         self.DRAW_PANEL = self.SCREEN_WIDTH - self.SIDEBAR_WIDTH
@@ -276,23 +311,79 @@ class MyWindow(arcade.Window):
     def setup(self) -> None:
         """Set up the game and initialize the variables."""
         self.reset()
-        self.mountain_manager = MountainManager()
-        self.cur_filename = sys.argv[1] if len(sys.argv) > 1 else "basic.json"
-        with open(f"stores/{self.cur_filename}", "r") as f:
-            t = deserialize(json.loads(f.read()))
+        # Slow work (loading, saving, the graph) runs here, so the window keeps drawing meanwhile.
+        self.worker = BackgroundWorker()
+        # The store is loaded in two steps: first the trail, which is then drawn, then the mountain manager.
+        # Until both are done, the trail cannot be changed.
+        self.loading = True
+        self.set_trail(Trail(None), MountainManager())
+        path = f"stores/{self.cur_filename}"
+        self.worker.submit("Loading", lambda report: self.load_trail(path, report), self.on_trail_loaded, self.on_load_failed)
+        self.mark("setup")
+
+    @staticmethod
+    def load_trail(path, report):
+        """Read the trail in a store file. Runs on the worker thread."""
+        report("reading")
+        with open(path, "r") as f:
+            return read_store(f)
+
+    def on_trail_loaded(self, t):
+        self.set_trail(t, self.mountain_manager)
+        self.mark("trail loaded")
+        # A version from the history, which edits never change.
+        t = self.mountain.trail
+        self.worker.submit("Indexing mountains", lambda report: self.build_manager(t), self.on_manager_built, self.on_load_failed)
+
+    @staticmethod
+    def build_manager(t):
+        """A mountain manager holding every mountain in the trail. Runs on the worker thread."""
+        mountain_manager = MountainManager()
         try:
             # Try to add all existing mountains
-            for mountain in t.collect_all_mountains():
-                self.mountain_manager.add_mountain(mountain)
+            with mountain_manager.batch():
+                for mountain in t.collect_all_mountains():
+                    mountain_manager.add_mountain(mountain)
         except NotImplementedError:
             pass
-        self.mountain = TrailDraw(t)
+        return mountain_manager
+
+    def on_manager_built(self, mountain_manager):
+        self.mountain_manager = mountain_manager
+        self.loading = False
+        self.mark("mountains indexed")
+
+    def on_load_failed(self, error):
+        """Keep whatever trail is shown (empty if the store could not be read), and let it be edited."""
+        self.loading = False
+        self.show_message(f"Could not load {self.cur_filename}: {error!r}")
+
+    def show_message(self, message):
+        """Show a message at the top of the window for MESSAGE_TIME seconds."""
+        self.message = message
+        self.message_until = self.timestamp + self.MESSAGE_TIME
+
+    def set_trail(self, t, mountain_manager):
+        self.mountain_manager = mountain_manager
+        self.mountain = RetainedTrailDraw(t, history=TrailHistory(t))
+        # The trail is laid out zoom times as wide as the panel and moved scroll pixels to the left, so only the
+        # sub trails inside the panel (the viewport) are drawn.
+        self.zoom = 1
+        self.scroll = 0
+        self.mountain.set_viewport(Box(0, 0, self.DRAW_PANEL, self.SCREEN_HEIGHT))
         self.draw_box = None
+        self.box_action = None
+        self.cur_trail = None
 
     def on_draw(self) -> None:
         """Draw everything"""
         self.clear()
-        self.mountain.draw_in_box(self.SCREEN_HEIGHT, self.DRAW_PANEL, 0, 0)
+        self.mountain.render(self.SCREEN_HEIGHT, self.DRAW_PANEL * self.zoom, -self.scroll, 0)
+        # Cover whatever of the zoomed trail reaches into the sidebar.
+        arcade.draw_lrtb_rectangle_filled(self.DRAW_PANEL, self.SCREEN_WIDTH, self.SCREEN_HEIGHT, 0, self.BG)
+        if self.first_frame:
+            self.first_frame = False
+            self.mark("first frame")
         if self.draw_box is not None and not (self.showing_graph or self.is_editing or self.is_saving):
             arcade.draw_rectangle_filled(self.draw_box.x + self.draw_box.w/2, self.draw_box.y + self.draw_box.h/2, self.draw_box.w, self.draw_box.h, (0, 255, 0, 100))
         # UI - Draw Modes / Action buttons
@@ -308,10 +399,15 @@ class MyWindow(arcade.Window):
             self.draw_graph_elems()
         elif self.is_saving:
             self.file_manager.draw()
+        status = self.worker.status()
+        if status:
+            arcade.draw_text(status, 10, self.SCREEN_HEIGHT - 20, (0, 0, 0), anchor_y="center")
+        if self.timestamp < self.message_until:
+            arcade.draw_text(self.message, 10, self.SCREEN_HEIGHT - 40, (237, 17, 68), anchor_y="center")
 
     def on_mouse_press(self, x: int, y: int, button: int, modifiers: int) -> None:
         """Called when the mouse buttons are pressed."""
-        if button == 1:
+        if button == 1 and not self.loading:
             if self.showing_graph:
                 self.showing_graph = False
                 return
@@ -352,7 +448,10 @@ class MyWindow(arcade.Window):
                                 pass
                         self.box_action()
                     elif self.cur_draw_mode == DrawMode.EDIT:
-                        self.cur_editing_mountain = self.box_action()
+                        # Saving the dialog calls the action with the edited mountain, see on_save_clicked.
+                        self.cur_editing_mountain = self.cur_trail.mountain
+                        self.edit_action = self.box_action
+                        self.ensure_dialog("manager", self.init_manager)
                         self.input_mountain_name.text = self.cur_editing_mountain.name
                         self.input_difficulty_level.text = str(self.cur_editing_mountain.difficulty_level)
                         self.input_length.text = str(self.cur_editing_mountain.length)
@@ -367,11 +466,56 @@ class MyWindow(arcade.Window):
 
     def on_mouse_motion(self, x, y, dx, dy) -> None:
         """Called when the mouse moves."""
+        if x > self.DRAW_PANEL:
+            self.draw_box, self.box_action, self.cur_trail = None, None, None
+            return
         self.draw_box, self.box_action, self.cur_trail = self.mountain.box_and_action((x, y), self.cur_draw_mode)
 
+    def on_mouse_scroll(self, x: int, y: int, scroll_x: int, scroll_y: int) -> None:
+        """Zoom the trail around the mouse, or move it sideways."""
+        if self.is_editing or self.is_saving or self.showing_graph or x > self.DRAW_PANEL:
+            return
+        # Zooming in further than the width the trail needs to draw every mountain shows nothing new.
+        max_zoom = max(1, self.mountain.required_width() / self.DRAW_PANEL)
+        zoom = min(max(self.zoom * self.ZOOM_STEP ** scroll_y, 1), max_zoom)
+        # Keep the point of the trail under the mouse where it is.
+        scroll = (x + self.scroll) * zoom / self.zoom - x
+        self.set_view(zoom, scroll - scroll_x * self.SCROLL_STEP)
+
+    def set_view(self, zoom, scroll):
+        """Zoom and move the trail, keeping the panel inside it."""
+        self.zoom = zoom
+        self.scroll = min(max(scroll, 0), self.DRAW_PANEL * (zoom - 1))
+        # The trail is laid out again by the next on_draw, so the boxes found so far are out of date.
+        self.draw_box, self.box_action, self.cur_trail = None, None, None
+
     def on_key_press(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is pressed."""
-        pass
+        if symbol in (arcade.key.LEFT, arcade.key.RIGHT) and not (self.is_editing or self.is_saving):
+            step = self.SCROLL_STEP if symbol == arcade.key.RIGHT else -self.SCROLL_STEP
+            self.set_view(self.zoom, self.scroll + step)
+            return
+        if self.loading or self.is_editing or self.is_saving or not modifiers & arcade.key.MOD_CTRL:
+            return
+        history = self.mountain.history
+        if symbol == arcade.key.Z and history.can_undo():
+            self.mountain.undo()
+        elif symbol == arcade.key.Y and history.can_redo():
+            self.mountain.redo()
+        else:
+            return
+        self.sync_manager()
+        self.draw_box, self.box_action, self.cur_trail = None, None, None
+
+    def sync_manager(self):
+        """Rebuild the mountain manager from the current trail, after moving through the undo history."""
+        self.mountain_manager = MountainManager()
+        try:
+            with self.mountain_manager.batch():
+                for mountain in self.mountain.trail.collect_all_mountains():
+                    self.mountain_manager.add_mountain(mountain)
+        except NotImplementedError:
+            pass
 
     def on_key_release(self, symbol: int, modifiers: int) -> None:
         """Called when a keyboard key is released."""
@@ -380,39 +524,46 @@ class MyWindow(arcade.Window):
     def on_update(self, delta_time) -> None:
         """Movement and game logic."""
         self.timestamp += delta_time
+        self.worker.poll()
 
     def on_graph_clicked(self):
-        self.showing_graph = True
+        if self.worker.busy("Graph"):
+            return
+        # The snapshot is cheap, and unaffected by later edits to the manager.
+        snapshot = self.mountain_manager.snapshot()
+        self.worker.submit(
+            "Graph",
+            lambda report: self.build_graph_data(snapshot, report),
+            self.on_graph_ready,
+            lambda error: self.show_message(f"Could not draw the graph: {error!r}"),
+        )
+
+    @staticmethod
+    def build_graph_data(mountain_manager, report):
+        """Compute graph_data from a mountain manager. Runs on the worker thread."""
         import colorsys
         def get_col(index, total):
             return [
                 int(255*x)
                 for x in colorsys.hls_to_rgb(index/total, 0.6, 0.6)
             ]
-        groups = self.mountain_manager.group_by_difficulty()
-        to = MountainOrganiser()
-        positions = DoubleKeyTable()
-        positions.hash1 = lambda k: (k % positions.table_size)
-        all_mountains = []
-        for i, group in enumerate(groups):
-            to.add_mountains(group)
-            for mountain in group:
-                positions[mountain.difficulty_level, mountain.name] = []
-            all_mountains.extend(group)
-            for mountain in all_mountains:
-                positions[mountain.difficulty_level, mountain.name].append(to.cur_position(mountain))
-        self.graph_data = [
-            [
-                get_col(i, len(all_mountains)),
-                len(groups) - len(positions[mountain.difficulty_level, mountain.name]),
-                mountain.name,
-                positions[mountain.difficulty_level, mountain.name]
-            ]
-            for i, mountain in enumerate(all_mountains)
+        report("grouping")
+        groups = mountain_manager.group_by_difficulty()
+        report("ranking")
+        evolution = rank_evolution(groups)
+        return [
+            [get_col(i, len(evolution)), start_index, mountain.name, positions]
+            for i, (mountain, start_index, positions) in enumerate(evolution)
         ]
 
+    def on_graph_ready(self, graph_data):
+        self.ensure_dialog("graph", self.init_graph)
+        self.graph_data = graph_data
+        self.showing_graph = bool(graph_data)
+
     def on_save_file_clicked(self):
         self.is_saving = True
+        self.ensure_dialog("file_manager", self.init_file_dialog)
         self.file_manager.enable()
         self.input_file_name.text = self.cur_filename
 
@@ -445,12 +596,17 @@ class MyWindow(arcade.Window):
         self.edit_mode = False
 
     def on_save_clicked(self, event):
-        old_mountain = copy(self.cur_editing_mountain)
-        self.cur_editing_mountain.name = self.input_mountain_name.text
-        self.cur_editing_mountain.difficulty_level = int(self.input_difficulty_level.text)
-        self.cur_editing_mountain.length = int(self.input_length.text)
+        # Mountains are shared by trail versions and background jobs, so the edit is a new Mountain, swapped into
+        # a new version of the trail that can be undone.
+        old_mountain = self.cur_editing_mountain
+        new_mountain = Mountain(
+            self.input_mountain_name.text,
+            int(self.input_difficulty_level.text),
+            int(self.input_length.text),
+        )
+        self.edit_action(new_mountain)
         try:
-            self.mountain_manager.edit_mountain(old_mountain, self.cur_editing_mountain)
+            self.mountain_manager.edit_mountain(old_mountain, new_mountain)
         except NotImplementedError:
             pass
         # Close the window.
@@ -460,21 +616,42 @@ class MyWindow(arcade.Window):
         self.is_editing = False
         self.manager.disable()
         self.cur_editing_mountain = None
+        self.edit_action = None
 
     def on_file_save_clicked(self, event):
         new_path = str(self.input_file_name.text)
-        with open(f"stores/{new_path}", "w") as f:
-            f.write(serialize(self.mountain.trail))
+        # Trail versions from the history are never changed, so the worker can write this one while editing goes on.
+        t = self.mountain.trail
+        self.worker.submit(
+            "Saving",
+            lambda report: self.save_store(f"stores/{new_path}", t, report),
+            lambda result: self.show_message(f"Saved {new_path}"),
+            lambda error: self.show_message(f"Could not save {new_path}: {error!r}"),
+        )
         # Close the window.
         self.on_file_close_clicked(event)
 
+    @staticmethod
+    def save_store(path, t, report):
+        """Write a trail to a store file. Runs on the worker thread."""
+        with open(path, "w") as f:
+            write_store(t, f, lambda written: report(f"{written} nodes"))
+
     def on_file_close_clicked(self, event):
         self.is_saving = False
         self.file_manager.disable()
 
 def main():
     """ Main function """
-    window = MyWindow()
+    p = argparse.ArgumentParser()
+    p.add_argument("store", nargs="?", default="basic.json", help="Store file to open, in stores/.")
+    p.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Report how long the imports, the window, the first frame and loading the store take.",
+    )
+    args = p.parse_args()
+    window = MyWindow(args.store, args.profile_startup)
     window.setup()
     arcade.run()
 
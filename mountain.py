@@ -1,5 +1,6 @@
 from __future__ import annotations
 from dataclasses import dataclass
+from operator import attrgetter
 
 @dataclass
 class Mountain:
@@ -8,8 +9,13 @@ class Mountain:
         - String name
         - Integer difficulty_level
         - Integer length
+
+        The class uses __slots__, so instances have no __dict__. This roughly halves the memory used per mountain,
+        and makes every attribute access (and so every comparison) cheaper.
     """
 
+    __slots__ = ("name", "difficulty_level", "length")
+
     name: str
     difficulty_level: int
     length: int
@@ -106,3 +112,9 @@ class Mountain:
             return self.name >= other.name
         else:
             return self.length > other.length
+
+
+# Returns the (length, name) tuple that mountains are ordered by, for use as `key=` when sorting or searching.
+# The tuple is built in C, once per mountain, and every comparison between keys is then a native tuple comparison
+# rather than a call to the comparison methods above.
+mountain_key = attrgetter("length", "name")
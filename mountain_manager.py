@@ -1,28 +1,269 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterator
+
 from algorithms.mergesort import mergesort
-from double_key_table import DoubleKeyTable
-from mountain import Mountain
+from data_structures.dense_table import DenseTable
+from data_structures.hash_table import LinearProbeTable
+from infinite_hash_table import InfiniteHashTable
+from mountain import Mountain, mountain_key
+from mountain_organiser import MountainOrganiser
 
 
 class MountainManager:
     """
     MountainManager acts as a store for mountains, and provides methods to add, remove and edit mountains.
 
-    Mountains are stored in a double key hash table, with the difficulty level as the first key and the mountain name
-    as the second key. This allows for efficient lookup of mountains by difficulty level and name.
-    The property of double key table means that our implementation automatically groups mountains by difficulty level
-    (key1), and allows for efficient lookup of mountains by name (key2).
+    Mountains are stored in two levels. The top level is a dense table indexed directly by the integer difficulty
+    level, so finding the group for a difficulty needs no hashing, and groups come out in numeric order. Each group
+    is a linear probe table keyed by mountain name, which allows for efficient lookup of mountains by name.
+    The dense table only covers up to DenseTable.MAX_RANGE difficulty levels directly, and keeps any difficulty level
+    outside that range in a dict, so an outlying difficulty (or any integer the edit dialog accepts) costs no more
+    than one extra group. Below, D is the size of the dense tables: the range of difficulty levels they cover
+    directly, at most DenseTable.MAX_RANGE, plus the number of difficulty levels outside it.
+
+    group_by_difficulty() is maintained incrementally: every change to a group stamps it with a new version, and the
+    sorted list returned for each group is cached together with the version it was built from. Only groups that
+    changed since the last call are rebuilt.
+
+    Two optional secondary indexes can be enabled per manager. They are kept in sync by every add, remove and edit,
+    at the cost of slower writes (see benchmarks/bench_mountain_manager.py):
+        - name_index: an InfiniteHashTable from name to the list of mountains with that name, used by
+          mountain_with_name(). A name may be used at several difficulty levels, so the list usually has one mountain
+          but may have more.
+        - length_index: a tree-backed MountainOrganiser, used by mountains_with_length().
+
+    Inside `with manager.batch():`, adds, removes and edits are buffered instead of applied, and an add followed by a
+    remove of the same mountain cancels out. At exit, each group that changed is resized once and updated in one pass,
+    and its cached view is invalidated once.
    """
 
-    def __init__(self) -> None:
+    def __init__(self, name_index: bool = False, length_index: bool = False) -> None:
         """
          Explain:
-           - Initialise a Double Key Hash Table self.organisers, which stores a list of tuple ('difficulty', Mountain)
+           - Initialise a Dense Table self.organisers, which maps each difficulty level to a Linear Probe Table of
+             (name, Mountain) pairs.
+           - Initialise the state behind the group_by_difficulty() view:
+             - self.change_count: number of changes made so far, used to stamp versions.
+             - self.group_versions: maps each difficulty level to the change_count of its last change.
+             - self.group_cache: maps each difficulty level to a (version, sorted list of mountains) pair.
+             - self.difficulties: sorted list of difficulty levels, or None when a group was created or dropped.
+           - self.pending: the changes buffered by batch(), or None outside of a batch.
+           - self.owned: the difficulty levels whose group this manager may modify in place, i.e. groups that are
+             not shared with a snapshot. See snapshot().
+           - self.tables_shared: whether self.organisers, self.group_versions and self.group_cache may be shared
+             with a snapshot, and so must be copied before they are changed.
+           - Initialise the secondary indexes that are enabled; the others are None. self.indexes_stale is True
+             when they still have to be built from the groups, see snapshot().
+
+         Args:
+           - name_index: whether to keep an index from name to mountains.
+           - length_index: whether to keep mountains sorted by length in an index.
 
          Complexity:
          - Worst case: O(1), assignment is O(1) (constant time)
          - Best case: O(1), assignment is O(1) (constant time)
         """
-        self.organisers = DoubleKeyTable()
+        self.organisers = DenseTable()
+        self.change_count = 0
+        self.group_versions = DenseTable()
+        self.group_cache = DenseTable()
+        self.difficulties = []
+        self.pending = None
+        self.owned = DenseTable()
+        self.tables_shared = False
+        self.indexes_stale = False
+        self.name_index = InfiniteHashTable() if name_index else None
+        self.length_index = MountainOrganiser(MountainOrganiser.TREE_BACKEND) if length_index else None
+
+    def snapshot(self) -> MountainManager:
+        """
+          Explain:
+            - Return a new manager holding the same mountains, which can then be changed independently of this one.
+            - Nothing is copied: both managers share the dense tables and every group table, and give up ownership
+              of all of them. The first change to a group in either manager copies the dense tables (once) and that
+              group only (copy-on-write), so a fork costs memory in proportion to the difficulty levels it modifies.
+            - The cached group_by_difficulty() lists are shared too; they are never modified, only replaced.
+            - The snapshot has the same secondary indexes enabled, but they are only built (in O(NlogN)) the first
+              time the snapshot is changed or queried through them.
+            - Changes buffered by an open batch are not included.
+
+          Complexity: O(1), everything is shared. Best case and worst case are the same.
+        """
+        clone = MountainManager(self.name_index is not None, self.length_index is not None)
+        clone.organisers = self.organisers
+        clone.change_count = self.change_count
+        clone.group_versions = self.group_versions
+        clone.group_cache = self.group_cache
+        clone.difficulties = self.difficulties
+        clone.indexes_stale = clone.name_index is not None or clone.length_index is not None
+        clone.tables_shared = self.tables_shared = True
+        self.owned = DenseTable()
+        return clone
+
+    def _writable_tables(self) -> None:
+        """
+          Explain:
+            - Copy the dense tables if they may be shared with a snapshot, so that this manager can change them.
+
+          Complexity:
+          - Worst case: O(D), copying the dense tables, where D is their size.
+          - Best case: O(1), when they are not shared.
+        """
+        if self.tables_shared:
+            self.organisers = self.organisers.copy()
+            self.group_versions = self.group_versions.copy()
+            self.group_cache = self.group_cache.copy()
+            self.tables_shared = False
+
+    def _writable_group(self, difficulty: int) -> LinearProbeTable:
+        """
+          Arg:
+          - difficulty: difficulty level of an existing group
+
+          Explain:
+            - Return the group of this difficulty, copying it first if it may be shared with a snapshot.
+
+          Raises:
+           - KeyError: if there is no group with this difficulty.
+
+          Complexity:
+          - Worst case: O(D + M), copying the dense tables and the group, where M is its table size.
+          - Best case: O(1), when the group is already owned by this manager.
+        """
+        group = self.organisers[difficulty]
+        if difficulty not in self.owned:
+            self._writable_tables()
+            group = group.copy()
+            self.organisers[difficulty] = group
+            self.owned[difficulty] = True
+        return group
+
+    def _new_group(self, difficulty: int, size: int = 0) -> LinearProbeTable:
+        """
+          Arg:
+          - difficulty: difficulty level of the group
+          - size: number of mountains the group should have room for
+
+          Explain:
+            - Create an empty group owned by this manager, replacing any existing group of this difficulty.
+
+          Complexity:
+          - Worst case: O(D + S), when the dense tables have to grow, D is the size of the dense tables and S the
+                        table size needed for size mountains.
+          - Best case: O(1), when no room has to be reserved.
+        """
+        group = LinearProbeTable()
+        group.reserve(size)
+        self._writable_tables()
+        self.organisers[difficulty] = group
+        self.owned[difficulty] = True
+        return group
+
+    def _drop_group(self, difficulty: int) -> None:
+        """
+          Arg:
+          - difficulty: difficulty level of an existing group
+
+          Explain:
+            - Forget the group of this difficulty.
+
+          Complexity: O(1), dense table deletes are constant time, plus O(_writable_tables()).
+        """
+        self._writable_tables()
+        del self.organisers[difficulty]
+        if difficulty in self.owned:
+            del self.owned[difficulty]
+
+    def _build_indexes(self) -> None:
+        """
+          Explain:
+            - Fill the enabled secondary indexes of a snapshot with every mountain in its groups.
+
+          Complexity: O(N * (len(name) + logN)), where N is the number of mountains. Best case and worst case are
+                      the same.
+        """
+        self.indexes_stale = False
+        for group in self.organisers.values():
+            for mountain in group.values():
+                self._index(mountain)
+
+    def _index(self, mountain: Mountain) -> None:
+        """
+          Arg:
+          - mountain: Mountain that was just stored
+
+          Explain:
+            - Add the mountain to the enabled secondary indexes.
+
+          Complexity:
+          - Worst case: O(len(name)) + O(logN), InfiniteHashTable lookup and setitem() and inserting into the length
+                        index, where N is the number of mountains.
+          - Best case: O(1), when no secondary index is enabled.
+        """
+        if self.name_index is not None:
+            if mountain.name in self.name_index:
+                self.name_index[mountain.name].append(mountain)
+            else:
+                self.name_index[mountain.name] = [mountain]
+        if self.length_index is not None:
+            self.length_index.add_mountains([mountain])
+
+    def _unindex(self, mountain: Mountain, stored: Mountain) -> None:
+        """
+          Arg:
+          - mountain: Mountain with the name and length that stored had when it was indexed
+          - stored: the Mountain object that is being removed from the manager
+
+          Explain:
+            - Remove the mountain from the enabled secondary indexes. The two arguments differ when a mountain was
+              edited in place before edit_mountain() was called with a copy of its old values.
+            - Only this very object is taken out of the list of mountains with its name; the name is forgotten when
+              no mountain has it any more.
+
+          Complexity:
+          - Worst case: O(len(name) + K) + O(logN), InfiniteHashTable lookup and delete, where K is the number of
+                        mountains with this name, and removing from the length index, where N is the number of
+                        mountains.
+          - Best case: O(1), when no secondary index is enabled.
+        """
+        if self.name_index is not None and mountain.name in self.name_index:
+            named = self.name_index[mountain.name]
+            for i, item in enumerate(named):
+                if item is stored:
+                    named.pop(i)
+                    break
+            if not named:
+                del self.name_index[mountain.name]
+        if self.length_index is not None:
+            self.length_index.remove_mountain(mountain, stored)
+
+    def _touch(self, difficulty: int) -> None:
+        """
+          Arg:
+          - difficulty: difficulty level of the group that changed
+
+          Explain:
+            - Stamp the group with a new version, so that its cached list is rebuilt by the next group_by_difficulty().
+            - If the group no longer exists, forget its version and cached list, and invalidate self.difficulties.
+            The counter is shared by all groups, so a group that is dropped and created again never reuses a version.
+
+          Complexity:
+          - Worst case: O(D), when the dense tables have to grow, D is the size of the dense tables.
+          - Best case: O(1), assignments and dense table lookups are constant time.
+        """
+        self.change_count += 1
+        self._writable_tables()
+        if difficulty in self.organisers:
+            if difficulty not in self.group_versions:
+                self.difficulties = None
+            self.group_versions[difficulty] = self.change_count
+        elif difficulty in self.group_versions:
+            del self.group_versions[difficulty]
+            if difficulty in self.group_cache:
+                del self.group_cache[difficulty]
+            self.difficulties = None
 
     def add_mountain(self, mountain: Mountain):
         """
@@ -30,80 +271,285 @@ class MountainManager:
           - mountain: Mountain to be added to the MountainManager
 
           Explain:
-            - add the mountain into the hash table according to their difficulty_level as the key.
+            - add the mountain into the table of its difficulty_level, creating that table if this is the first
+              mountain with this difficulty.
 
           Complexity:
-          - Worst case: O(DoubleKeyTable(setitem))(worst) = O((O(len(key1)) + N*comp(K)) * (O(len(key2)) + M*comp(K))
-                        + hash2(key2) + P * comp(K) + R * (O(len(key1)) + N*comp(K)) * (O(len(key2)) + M*comp(K)))
-
-                        - In this function just add the mountain into the hash table by using the setitem function of
-                          DoubleKeyTable.
-                        - The worst case time complexity of _linear_probe() is
-                          O((O(len(key1)) + N*comp(K)) * (O(len(key2)) + M*comp(K))) where N is the table size of the
-                          top level table, M is the table size of the bottom level table.
-                        - The worst case time complexity of bottom_level_table.setitem() is
-                          O(hash(key) + P*comp(K)) where P is the table size.
-                        - The worst case time  complexity of _rehash() function is
-                          O(R* _linear_probe()) where R is len(self)
+          - Worst case: O(D) + O(LinearProbeTable(setitem))(worst) = O(D + hash(name) + M*comp(K) + rehash)
+                        - D is the size of the dense tables, when the dense table has to grow to fit a new
+                          difficulty level.
+                        - The worst case time complexity of LinearProbeTable.setitem() is O(hash(key) + M*comp(K)),
+                          where M is the table size of the bottom level table, plus O(rehash) if it is resized.
                         - Comp(K) is the complexity of comparing two keys.
 
-          - Best case:  O(DoubleKeyTable(setitem))(best) = O(hash1(key1) + hash2(key2) + hash2(key2))
-
-                        - The best case time complexity of _linear_probe() is O(hash1(key1) + hash2(key2)).
-                        - The best case time complexity of bottom_level_table.setitem() is O(hash2(key2)).
-                        - All assignments are O(1) and for best case when len(self) <= self,table_size /2, so without
-                          entering the if statement.
+          - Best case: O(hash(name))
+                        - Looking up the difficulty level in the dense table is O(1).
+                        - The best case time complexity of LinearProbeTable.setitem() is O(hash(name)).
         """
-        self.organisers[str(mountain.difficulty_level), mountain.name] = mountain
+        if self.pending is not None:
+            self._buffer_add(mountain)
+            return
+        if self.indexes_stale:
+            self._build_indexes()
+        if mountain.difficulty_level not in self.organisers:
+            group = self._new_group(mountain.difficulty_level)
+        else:
+            group = self._writable_group(mountain.difficulty_level)
+            if (self.name_index is not None or self.length_index is not None) and mountain.name in group:
+                replaced = group[mountain.name]
+                self._unindex(replaced, replaced)
+        group[mountain.name] = mountain
+        self._index(mountain)
+        self._touch(mountain.difficulty_level)
 
     def remove_mountain(self, mountain: Mountain):
         """
           Arg:
-          - mountain: Mountain to be removed from the Hash Table
+          - mountain: Mountain to be removed from the MountainManager
 
           Explain:
-           - delete the mountain in the hash table by finding their correct position
+           - delete the mountain from the table of its difficulty_level, and drop that table if it is now empty.
 
-          Complexity:
-          - Worst case: O(DoubleKeyTable(delitem))(worst) =
-                        O(O(len(key1)) + N*comp(K)) * (O(len(key2)) + M*comp(K)) + O(hash2(key2) + M*comp(K)) + O(N))
+          Raises:
+           - KeyError: if the mountain is not in the MountainManager.
 
-                        - Let N be the table size of the top level table, M the table size of the bottom level table.
+          Complexity:
+          - Worst case: O(LinearProbeTable(delitem))(worst) = O(M*hash(name) + M^2*comp(K))
+                        - Let M be the table size of the bottom level table.
                         - Comp(K) is the complexity of comparing two keys.
-                        - The worst case time complexity of _linear_probe() is
-                          O((O(len(key1)) + N*comp(K)) * (O(len(key2)) + M*comp(K))).
-                        - The worst case time complexity of setitem of the bottom level table is O(hash2(key2) + M*comp(K))
-                        - The time complexity of the while loop is O(N) where N is the size of top level table.
-                        - All assignments, numerical operations and if statement are constant time.
+                        - Looking up and deleting the difficulty level in the dense table is O(1).
+                        - The worst case of LinearProbeTable.delitem() is when the deleted item is midway through a
+                          large cluster, which has to be reinserted.
 
-          - Best case: O(DoubleKeyTable(delitem))(best) = O(O(hash1(key1) + hash2(key2)) + O(hash2(key2)))
-
-                        - When self.top_level_table[top_pos][1] is not empty
-                        - The best case time complexity of _linear_probe() is O(hash1(key1) + hash2(key2)).
-                        - The best case time complexity of setitem of the bottom level table is O(hash2(key2))
-                        - All assignments and if statement are constant time.
+          - Best case: O(LinearProbeTable(delitem))(best) = O(hash(name))
+                        - When the deleted item is not followed by a cluster.
+                        - Looking up and deleting the difficulty level in the dense table is O(1).
         """
-        del self.organisers[str(mountain.difficulty_level), mountain.name]
+        if self.pending is not None:
+            self._buffer_remove(mountain)
+            return
+        if self.indexes_stale:
+            self._build_indexes()
+        group = self._writable_group(mountain.difficulty_level)
+        stored = group[mountain.name]
+        del group[mountain.name]
+        self._unindex(mountain, stored)
+        if group.is_empty():
+            self._drop_group(mountain.difficulty_level)
+        self._touch(mountain.difficulty_level)
 
     def edit_mountain(self, old: Mountain, new: Mountain):
         """
           Arg:
-          - old: Mountain to be removed from the hash table
-          - new: Mountain to be added to the hash table
+          - old: Mountain to be replaced
+          - new: Mountain to replace it with
 
           Explain:
             - Essentially, this function rewrites the detail (diff, length) of a mountain.
-            Gets the mountain from hash table by comparing the keys; if it exists, remove it and update the new mountain
-            based on their difficulty_level and name.
+            - If difficulty_level and name are unchanged, the (name, mountain) pair is overwritten in place in its
+            group, so the group is not probed for a delete or reinserted into.
+            - If only the name changed, the mountain is deleted and added again within the same group; the group is
+            never dropped in between. As with add_mountain(), a mountain already stored under the new name is
+            replaced.
+            - If the difficulty changed, the mountain is moved from its old group to its new one. No other group is
+            touched.
+            - Inside a batch, the edit is buffered as a remove and an add.
+
+          Raises:
+           - KeyError: if old is not in the MountainManager.
+
           Complexity:
-          - Worst case: O(add_mountain)(worst) + O(remove_mountain)(worst)
-                        - Since this function just call the add_mountain and remove_mountain to update the new mountain.
+          - Worst case: O(remove_mountain)(worst) + O(add_mountain)(worst)
+                        - When the name or difficulty changed, the mountain has to be removed and added again.
+
+          - Best case: O(hash(name))
+                        - When only the length changed, finding the old mountain in its group with linear probing,
+                          then overwriting it, which is O(1).
+        """
+        if self.pending is not None or old.difficulty_level != new.difficulty_level:
+            self.remove_mountain(old)
+            self.add_mountain(new)
+            return
+        if self.indexes_stale:
+            self._build_indexes()
+        group = self._writable_group(old.difficulty_level)
+        if old.name == new.name:
+            self._unindex(old, group.replace(old.name, new))
+        else:
+            self._unindex(old, group[old.name])
+            del group[old.name]
+            if new.name in group:
+                replaced = group[new.name]
+                self._unindex(replaced, replaced)
+            group[new.name] = new
+        self._index(new)
+        self._touch(new.difficulty_level)
+
+    @contextmanager
+    def batch(self) -> Iterator[MountainManager]:
+        """
+          Explain:
+            - Context manager that buffers every add, remove and edit made inside it, and applies them together at
+              exit with _apply_batch(). Queries inside the batch do not see the buffered changes.
+            - A remove is checked against the manager when it is made, and raises KeyError straight away.
+            - If the block raises, the buffered changes are discarded.
+            - A batch inside a batch joins the outer one.
+
+          Complexity: O(_apply_batch()) at exit, see _buffer_add() and _buffer_remove() for each change.
+        """
+        if self.pending is not None:
+            yield self
+            return
+        self.pending = {}
+        try:
+            yield self
+        except BaseException:
+            self.pending = None
+            raise
+        pending, self.pending = self.pending, None
+        self._apply_batch(pending)
+
+    def _buffer_add(self, mountain: Mountain) -> None:
+        """
+          Arg:
+          - mountain: Mountain to be added at the end of the batch
+
+          Explain:
+            - self.pending maps (difficulty_level, name) to a [new, old] pair: new is the mountain to store under that
+              key at the end of the batch (None to leave it empty), old is the stored mountain to take out first
+              (None if there is none).
+            - Adding replaces whatever was going to be stored under the key.
+
+          Complexity: O(len(name)), hashing the key. Best case and worst case are the same.
+        """
+        key = (mountain.difficulty_level, mountain.name)
+        entry = self.pending.get(key)
+        if entry is None:
+            self.pending[key] = [mountain, None]
+        else:
+            entry[0] = mountain
+
+    def _buffer_remove(self, mountain: Mountain) -> None:
+        """
+          Arg:
+          - mountain: Mountain to be removed at the end of the batch
+
+          Explain:
+            - If nothing is buffered for the key, the mountain must be in the manager; it is marked for removal.
+            - If an add is buffered for the key, it is cancelled. If the add would have replaced a stored mountain,
+              that stored mountain is marked for removal instead.
+
+          Raises:
+           - KeyError: if the mountain is not in the manager, taking the buffered changes into account.
+
+          Complexity:
+          - Worst case: O(hash(name) + M*comp(K)), where M is the table size of the group, when the group has to be
+                        checked for the name.
+          - Best case: O(len(name)), when a buffered add is simply updated.
+        """
+        key = (mountain.difficulty_level, mountain.name)
+        entry = self.pending.get(key)
+        if entry is None:
+            self.organisers[mountain.difficulty_level][mountain.name]
+            self.pending[key] = [None, mountain]
+        elif entry[0] is None:
+            raise KeyError(mountain.name)
+        elif entry[1] is not None:
+            entry[0] = None
+        else:
+            group = self.organisers.get(mountain.difficulty_level)
+            if group is not None and mountain.name in group:
+                entry[0] = None
+                entry[1] = group[mountain.name]
+            else:
+                del self.pending[key]
 
-          - Best case: O(add_mountain)(best) + O(remove_mountain)(best)
-                        - Since this function just call the add_mountain and remove_mountain to update the new mountain.
+    def _apply_batch(self, pending: dict[tuple[int, str], list[Mountain | None]]) -> None:
         """
-        self.remove_mountain(old)
-        self.add_mountain(new)
+          Arg:
+          - pending: the changes buffered by a batch, see _buffer_add()
+
+          Explain:
+            - First take every mountain that goes (old, or replaced by a new one) out of the secondary indexes,
+              across all groups. Only then split the changes by difficulty level and apply each group's changes with
+              _apply_group(), which indexes the new mountains. A mountain moved to another difficulty keeps its
+              (length, name), so unindexing it after its new copy was indexed could take the wrong one out.
+
+          Complexity: O(C * (len(name) + logN)) + the sum of O(_apply_group()) over all changed groups, where C is
+                      the number of changes.
+        """
+        if self.indexes_stale:
+            self._build_indexes()
+        if self.name_index is not None or self.length_index is not None:
+            for (difficulty, name), (new, old) in pending.items():
+                group = self.organisers.get(difficulty)
+                if old is not None:
+                    self._unindex(old, group[old.name])
+                elif group is not None and name in group:
+                    replaced = group[name]
+                    self._unindex(replaced, replaced)
+        changes = DenseTable()
+        for (difficulty, _), entry in pending.items():
+            group_changes = changes.get(difficulty)
+            if group_changes is None:
+                group_changes = []
+                changes[difficulty] = group_changes
+            group_changes.append(entry)
+        for difficulty in changes.keys():
+            self._apply_group(difficulty, changes[difficulty])
+
+    def _apply_group(self, difficulty: int, entries: list[list[Mountain | None]]) -> None:
+        """
+          Arg:
+          - difficulty: difficulty level of the group
+          - entries: the [new, old] pairs buffered for this group
+
+          Explain:
+            - Take the old mountains out of the group (_apply_batch() already took them out of the indexes). If at
+              least a quarter of the group goes, the group is rebuilt from the mountains that stay, instead of
+              repairing a cluster after every delete.
+            - Resize the group once for everything that is added, then add the new mountains.
+            - Drop the group if it is now empty, and stamp it with a new version once.
+
+          Complexity:
+          - Worst case: O(M*hash(name) + M^2*comp(K)), where M is the table size of the group after the batch, when
+                        the group is rebuilt or resized with lots of probing.
+          - Best case: O(C*hash(name)), where C is the number of changes, when nothing is probed and no resize is
+                        needed.
+        """
+        group = self.organisers.get(difficulty)
+        indexed = self.name_index is not None or self.length_index is not None
+        dropped = set()
+        added = []
+        for new, old in entries:
+            if old is not None:
+                dropped.add(old.name)
+            elif indexed and group is not None and new.name in group:
+                dropped.add(new.name)
+            if new is not None:
+                added.append(new)
+
+        if dropped and 4 * len(dropped) >= len(group):
+            kept = [item for item in group.array if item is not None and item[0] not in dropped]
+            group = self._new_group(difficulty, len(kept) + len(added))
+            for name, mountain in kept:
+                group[name] = mountain
+        elif group is not None:
+            group = self._writable_group(difficulty)
+            for name in dropped:
+                del group[name]
+
+        if added:
+            if group is None:
+                group = self._new_group(difficulty, len(added))
+            else:
+                group.reserve(len(group) + len(added))
+            for mountain in added:
+                group[mountain.name] = mountain
+                self._index(mountain)
+        if group is not None and group.is_empty():
+            self._drop_group(difficulty)
+        self._touch(difficulty)
 
     def mountains_with_difficulty(self, diff: int):
         """
@@ -111,42 +557,108 @@ class MountainManager:
           - diff: Difficulty of mountains. Given this, return all mountains with this difficulty as a list.
 
           Explain:
-            - Get the mountains with difficulty = diff from self.organisers by calling the values() function;
+            - Get the table of mountains with difficulty = diff from self.organisers, and return all of its values.
+            - If there is no mountain with this difficulty, return an empty list.
 
           Complexity:
-          - Worst case: O(DoubleKeyTable.values())(worst) = O(N*M)
-                        - When key is none, where N is the number of items in the top level table
-                        - and M is the (average) number of items in the bottom level table.
-                        - All assignments, if statements, return statement are constant time.
+          - Worst case: O(LinearProbeTable.values()) = O(M)
+                        - Where M is the table size of the bottom level table for diff.
+                        - Looking up diff in the dense table is O(1).
 
-          - Best case: O(DoubleKeyTable.values())(best) = O(hash1(key) * hash2(key) * N)
-                        - when key is the first element of the first table, and that second position of the second
-                          table is empty (best case for linear probing).
-                        - N is the number of items in the table.
+          - Best case: O(1)
+                        - When there is no mountain with this difficulty.
         """
-        return self.organisers.values(str(diff))
+        group = self.organisers.get(diff)
+        if group is None:
+            return []
+        return group.values()
+
+    def mountain_with_name(self, name: str) -> Mountain:
+        """
+          Arg:
+          - name: Name of the mountain to find, whatever its difficulty.
+
+          Explain:
+            - With the name index, look the name up in it.
+            - Without it, check the group of every difficulty for this name.
+            - If several mountains have the name, either way returns the one with the lowest difficulty level.
+
+          Raises:
+           - KeyError: if no mountain has this name.
+
+          Complexity:
+          - Worst case: O(G * (hash(name) + M*comp(K))) without the name index, where G is the number of groups
+                        and M the largest table size of a group. O(len(name) + K) with the name index, where K is
+                        the number of mountains with this name.
+          - Best case: O(len(name)), with the name index, or when the first group checked has the name.
+        """
+        if self.indexes_stale:
+            self._build_indexes()
+        if self.name_index is not None:
+            return min(self.name_index[name], key=lambda mountain: mountain.difficulty_level)
+        for group in self.organisers.values():
+            if name in group:
+                return group[name]
+        raise KeyError(name)
+
+    def mountains_with_length(self, low: int, high: int) -> list[Mountain]:
+        """
+          Arg:
+          - low: smallest length to return
+          - high: largest length to return
+
+          Explain:
+            - Return all mountains with low <= length <= high, sorted by length/name.
+            - With the length index, this is MountainOrganiser.length_range(). Without it, every mountain is checked
+              and the matches are sorted.
+
+          Complexity:
+          - Worst case: O(N + KlogK) without the length index, where N is the total table size of all groups and K
+                        the number of mountains returned. O(K + logN) with the length index.
+          - Best case: O(logN), with the length index and no mountain in the range.
+        """
+        if self.indexes_stale:
+            self._build_indexes()
+        if self.length_index is not None:
+            return self.length_index.length_range(low, high)
+        found = []
+        for group in self.organisers.values():
+            for mountain in group.values():
+                if low <= mountain.length <= high:
+                    found.append(mountain)
+        return mergesort(found, key=mountain_key)
 
     def group_by_difficulty(self):
         """
           Explain:
             - Return a list of lists sorted by difficulty. Each list contains the group of all mountains with the
-            same difficulty; we also rely upon the fact that each group is also already sorted by length/order
+            same difficulty, sorted by length/name.
+            - The sorted list of difficulties is only rebuilt (from the dense table, which is already in order) after
+            a group was created or dropped.
+            - A group's list is only rebuilt if the group changed since it was cached; otherwise the cached list is
+            returned as is. The returned lists are shared with the cache, so they must not be modified.
 
           Complexity:
-          - Worst case: O(DoubleKeyTable.keys())(worst) +  O(NlogN * comp(tuple)) +O(N)
-                        - where N is the length of self.organisers.
-                        - for loop - O(N), where N is the length of self.organisers.
-                            - append, accessing mountain_lst - O(1)
+          - Worst case: O(D + N + NlogN)
+                        - where D is the size of the dense tables, and N is the number of mountains.
+                        - DenseTable.keys() - O(D), when a group was created or dropped.
+                        - for loop - O(G), where G is the number of groups.
+                            - rebuilding a group: LinearProbeTable.values() - O(M), mergesort - O(MlogM),
+                              for a group of M mountains; when every group changed.
+                            - append - O(1)
                         - return statement - O(1)
 
-          - Worst case: O(DoubleKeyTable.keys())(best) +  O(NlogN * comp(tuple)) +O(N)
-                        - where N is the length of self.organisers.
-                        - for loop - O(N), where N is the length of self.organisers.
-                            - append, accessing mountain_lst - O(1)
-                        - return statement - O(1)
+          - Best case: O(G), where G is the number of groups, when nothing changed since the last call.
         """
+        if self.difficulties is None:
+            self.difficulties = self.organisers.keys()
         diff_groups = []
-        keys = mergesort(self.organisers.keys())
-        for difficulty in keys:
-            diff_groups.append(self.organisers.values(difficulty))
+        for difficulty in self.difficulties:
+            version = self.group_versions[difficulty]
+            cached = self.group_cache.get(difficulty)
+            if cached is None or cached[0] != version:
+                cached = (version, mergesort(self.organisers[difficulty].values(), key=mountain_key))
+                self._writable_tables()
+                self.group_cache[difficulty] = cached
+            diff_groups.append(cached[1])
         return diff_groups
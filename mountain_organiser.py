@@ -1,70 +1,355 @@
 from __future__ import annotations
 
-from algorithms.binary_search import binary_search
-from algorithms.mergesort import mergesort
-from mountain import Mountain
+from algorithms.binary_search import binary_search, binary_search_many
+from algorithms.mergesort import merge_keyed, merge_many_keyed, mergesort
+from data_structures.fenwick_tree import FenwickTree
+from data_structures.order_statistic_tree import OrderStatisticTree
+from mountain import Mountain, mountain_key
 
 
 class MountainOrganiser:
     """
-      MountainOrganiser is a simple 1-dimensional data structure that stores mountains in a list. It maintains
-        the order of the mountains in the list through mergesort.
+      MountainOrganiser is a simple 1-dimensional data structure that stores mountains in sorted order.
+
+      Two backends are available, chosen at construction:
+        - LIST_BACKEND (default): mountains are kept in the list self.mountain_lst. Each incoming batch is sorted and
+          merged into the list. Cheapest when mountains are added in a few large batches.
+        - TREE_BACKEND: mountains are kept in the order statistic tree self.mountain_tree. Every insert, remove and
+          rank is O(logN). Cheapest when adds, removes and rank queries are interleaved.
+
+      Searches never call the Mountain comparison methods: the list backend keeps self.key_lst, the mountain_key()
+      of every mountain in self.mountain_lst, and the tree stores the same key in each node.
      """
 
-    def __init__(self) -> None:
+    LIST_BACKEND = "list"
+    TREE_BACKEND = "tree"
+
+    def __init__(self, backend: str = LIST_BACKEND) -> None:
         """
          Explain:
-           - Initialise a list self.mountain_lst, which stores a list of Mountain objects
+           - Initialise the storage for the chosen backend: a list self.mountain_lst (and its keys self.key_lst), or
+             an order statistic tree self.mountain_tree, which stores the Mountain objects.
+
+         Args:
+           - backend: LIST_BACKEND or TREE_BACKEND
+
+         Raises:
+           - ValueError: If backend is not one of the above.
 
          Complexity:
          - Worst case: O(1), assignment is O(1) (constant time)
          - Best case: O(1), assignment is O(1) (constant time)
         """
-        self.mountain_lst = []
+        if backend == self.LIST_BACKEND:
+            self.mountain_lst = []
+            self.key_lst = []
+        elif backend == self.TREE_BACKEND:
+            self.mountain_tree = OrderStatisticTree(key=mountain_key)
+        else:
+            raise ValueError(f"Unknown backend {backend}")
+        self.backend = backend
+
+    def __len__(self) -> int:
+        """
+           Explain:
+           - Returns the number of mountains in the organiser.
+
+           Complexity: O(1), best case and worst case are the same.
+        """
+        if self.backend == self.TREE_BACKEND:
+            return len(self.mountain_tree)
+        return len(self.mountain_lst)
 
     def cur_position(self, mountain: Mountain) -> int:
         """
            Explain:
-           - Given a mountain, return the index (sorted position) of the mountain in self.mountain_lst
+           - Given a mountain, return the index (sorted position) of the mountain in the organiser
 
            Args:
            - mountain: Mountain that is currently being searched for
 
            Raises:
-             - KeyError: If the mountain does not exist in self.mountain_lst
+             - KeyError: If the mountain does not exist in the organiser
 
            Returns:
-           - index: Index of the mountain in self.mountain_lst
+           - index: Index of the mountain in the organiser
 
-           Complexity:
-           - Worst case: O(logN), where N is the length of self.mountain_lst. This occurs when the mountain is
-              located in the leftmost/rightmost, and we have to perform binary search on the entire list.
-                    - binary_search() - O(logN)
-                    - comparison statement - O(1)
-                    - return statement - O(1)
-           - Best case: O(1), when the mountain is located in the middle of the list, and we can return the index
-                immediately.
-                    - binary_search() - O(1)
-                    - comparison statement - O(1)
+           Complexity: O(logN), where N is the number of mountains. Best case and worst case are the same, as the
+           search always narrows down to the first matching key.
+                    - mountain_key() - O(1)
+                    - binary_search() on self.key_lst / bisect_left() on the tree - O(logN), comparing tuples
+                    - comparison statement - O(1) (O(logN) to find the mountain in the tree)
                     - return statement - O(1)
         """
-        index = binary_search(self.mountain_lst, mountain)
-        if self.mountain_lst[index] != mountain:
-            raise KeyError()
+        if self.backend == self.TREE_BACKEND:
+            index = self.mountain_tree.bisect_left(mountain)
+            if index == len(self.mountain_tree) or self.mountain_tree[index] != mountain:
+                raise KeyError(mountain)
+            return index
+        index = binary_search(self.key_lst, mountain_key(mountain))
+        if index == len(self.mountain_lst) or self.mountain_lst[index] != mountain:
+            raise KeyError(mountain)
         return index
 
     def add_mountains(self, mountains: list[Mountain]) -> None:
         """
            Explain:
-           - Given a list of mountains, add them to self.mountain_lst and sort the list using mergesort, maintaining
-                the order of the mountains in the list.
+           - Given a list of mountains, sort them using mergesort, then merge them into self.mountain_lst,
+                maintaining the order of the mountains in the list.
+           - Only the new mountains' keys are computed. The merge compares them with self.key_lst and builds the
+                new self.key_lst in the same pass.
+           - For the tree backend, insert each mountain into self.mountain_tree.
+
+           Args:
+           - mountains: List of mountains to be added to the organiser
+
+           Complexity:
+           - Worst case: O(MlogM + N), where M is the length of mountains and N is the length of self.mountain_lst.
+                - mergesort() - O(MlogM)
+                - merge_keyed() - O(N + M)
+                For the tree backend, O(Mlog(N + M)), inserting M mountains.
+           - Best case: O(N + M), when mountains is already sorted.
+                - mergesort() - O(M)
+                - merge_keyed() - O(N + M)
+                For the tree backend, O(Mlog(N + M)), inserting M mountains.
+        """
+        if self.backend == self.TREE_BACKEND:
+            for mountain in mountains:
+                self.mountain_tree.insert(mountain)
+            return
+        mountains = mergesort(mountains, key=mountain_key)
+        self.key_lst, self.mountain_lst = merge_keyed(
+            self.key_lst, self.mountain_lst, [mountain_key(mountain) for mountain in mountains], mountains
+        )
+
+    def add_many_batches(self, batches: list[list[Mountain]]) -> None:
+        """
+           Explain:
+           - Given several lists of mountains, sort each of them, then merge all of them and self.mountain_lst
+                together in a single k-way merge. Cheaper than calling add_mountains once per batch, which merges
+                self.mountain_lst again for every batch.
+           - As in add_mountains, keys are only computed for the new mountains, and self.key_lst is built by the
+                same merge.
+           - For the tree backend, insert each mountain into self.mountain_tree.
 
            Args:
-           - mountains: List of mountains to be added to self.mountain_lst
+           - batches: List of lists of mountains to be added to the organiser
 
-           Complexity: O(NlogN), where N is the length of self.mountain_lst. Best case and worst case are the same.
-                - appending to self.mountain_lst - O(1)
-                - mergesort() - O(NlogN)
+           Complexity:
+           - Worst case: O(MlogM + (N + M)logG), where M is the total number of mountains in batches, N is the length
+                of self.mountain_lst and G is the number of batches.
+                - mergesort() on every batch - O(MlogM)
+                - merge_many_keyed() - O((N + M)logG)
+                For the tree backend, O(Mlog(N + M)), inserting M mountains.
+           - Best case: O((N + M)logG), when every batch is already sorted.
+                - mergesort() on every batch - O(M)
+                - merge_many_keyed() - O((N + M)logG)
+                For the tree backend, O(Mlog(N + M)), inserting M mountains.
         """
-        self.mountain_lst += mountains
-        self.mountain_lst = mergesort(self.mountain_lst)
+        if self.backend == self.TREE_BACKEND:
+            for batch in batches:
+                self.add_mountains(batch)
+            return
+        key_lists, lists = [self.key_lst], [self.mountain_lst]
+        for batch in batches:
+            batch = mergesort(batch, key=mountain_key)
+            key_lists.append([mountain_key(mountain) for mountain in batch])
+            lists.append(batch)
+        self.key_lst, self.mountain_lst = merge_many_keyed(key_lists, lists)
+
+    def remove_mountain(self, mountain: Mountain, stored: Mountain | None = None) -> None:
+        """
+           Explain:
+           - Given a mountain, remove it from the organiser.
+           - Of the mountains with the same key, the one that is this very object is removed, or else the first one
+                equal to it. Mountains with equal keys but different difficulties are therefore told apart.
+           - If the mountain was edited in place after it was added, pass a copy with its old length and name as
+                mountain (so it can be found) and the edited object itself as stored.
+
+           Args:
+           - mountain: Mountain to be removed, or a copy of its values when it was added
+           - stored: the Mountain object to remove, if not mountain itself
+
+           Raises:
+             - KeyError: If the mountain does not exist in the organiser
+
+           Complexity:
+           - Worst case: O(N) for the list backend, where N is the length of self.mountain_lst, as every mountain
+                after it has to be shifted down. O(logN + E) for the tree backend, where E is the number of mountains
+                with the same key.
+                - binary_search() / bisect_left_key() - O(logN)
+                - scanning the mountains with the same key - O(E)
+                - del from list - O(N)
+           - Best case: O(logN), when the mountain is the last one in self.mountain_lst, or for the tree backend.
+        """
+        target = mountain if stored is None else stored
+        key = mountain_key(mountain)
+        if self.backend == self.TREE_BACKEND:
+            lo = self.mountain_tree.bisect_left_key(key)
+            candidates = self.mountain_tree.iter_range(lo, self.mountain_tree.bisect_right(mountain))
+        else:
+            lo = binary_search(self.key_lst, key)
+            hi = lo
+            while hi < len(self.key_lst) and self.key_lst[hi] == key:
+                hi += 1
+            candidates = self.mountain_lst[lo:hi]
+        candidates = list(candidates)
+        index = next((i for i, item in enumerate(candidates) if item is target), None)
+        if index is None:
+            index = next((i for i, item in enumerate(candidates) if item == target), None)
+        if index is None:
+            raise KeyError(mountain)
+        if self.backend == self.TREE_BACKEND:
+            self.mountain_tree.pop(lo + index)
+        else:
+            del self.mountain_lst[lo + index]
+            del self.key_lst[lo + index]
+
+    def cur_positions(self, mountains: list[Mountain]) -> list[int]:
+        """
+           Explain:
+           - Given a list of mountains, return the index (sorted position) of each of them, in the same order.
+           - The mountains are sorted first, so that the list backend can locate all of them in one pass of
+                binary_search_many() over self.key_lst.
+
+           Args:
+           - mountains: List of mountains that are currently being searched for
+
+           Raises:
+             - KeyError: If any of the mountains does not exist in the organiser
+
+           Returns:
+           - positions: Index of each mountain in the organiser
+
+           Complexity:
+           - Worst case: O(MlogM + Mlog(N/M + 1)), where M is the length of mountains and N is the number of
+                mountains in the organiser.
+                - mergesort() - O(MlogM)
+                - binary_search_many() - O(Mlog(N/M + 1))
+                For the tree backend, O(MlogN), as each mountain is searched for separately.
+           - Best case: O(M), when mountains is already sorted, and they are next to each other in the organiser.
+        """
+        if self.backend == self.TREE_BACKEND:
+            return [self.cur_position(mountain) for mountain in mountains]
+        order = mergesort(list(range(len(mountains))), key=lambda i: mountain_key(mountains[i]))
+        found = binary_search_many(self.key_lst, [mountain_key(mountains[i]) for i in order])
+        positions = [0] * len(mountains)
+        for i, index in zip(order, found):
+            if index == len(self.mountain_lst) or self.mountain_lst[index] != mountains[i]:
+                raise KeyError(mountains[i])
+            positions[i] = index
+        return positions
+
+    def rank_range(self, lo: int, hi: int) -> list[Mountain]:
+        """
+           Explain:
+           - Return the mountains whose index (sorted position) is between lo (inclusive) and hi (exclusive),
+                in order. Indices outside of the organiser are ignored, like slicing a list.
+           - Only the requested mountains are copied, never the whole organiser.
+
+           Args:
+           - lo: smallest index to return
+           - hi: one past the largest index to return
+
+           Returns:
+           - mountains: List of mountains in that range
+
+           Complexity:
+           - Worst case: O(K + logN), where K = hi - lo and N is the number of mountains.
+                - list slice - O(K)
+                - iter_range() on the tree - O(K + logN)
+           - Best case: O(1) when the range is empty.
+        """
+        if self.backend == self.TREE_BACKEND:
+            return list(self.mountain_tree.iter_range(lo, hi))
+        return self.mountain_lst[max(lo, 0):max(hi, 0)]
+
+    def length_range(self, a: int, b: int) -> list[Mountain]:
+        """
+           Explain:
+           - Return the mountains whose length is between a and b (both inclusive), in order.
+           - Mountains are ordered by length first, so these form a contiguous range of indices. Both ends are found
+                by bisection, searching for the keys (a,) and (b + 1,) which sort before every mountain of that length.
+
+           Args:
+           - a: smallest length to return
+           - b: largest length to return
+
+           Returns:
+           - mountains: List of mountains with length in [a, b]
+
+           Complexity:
+           - Worst case: O(K + logN), where K is the number of mountains returned, N is the number of mountains.
+                - binary_search() / bisect_left_key() twice - O(logN)
+                - rank_range() - O(K + logN)
+           - Best case: O(logN), when no mountain is in the range.
+        """
+        if self.backend == self.TREE_BACKEND:
+            lo = self.mountain_tree.bisect_left_key((a,))
+            hi = self.mountain_tree.bisect_left_key((b + 1,))
+        else:
+            lo = binary_search(self.key_lst, (a,))
+            hi = binary_search(self.key_lst, (b + 1,))
+        return self.rank_range(lo, hi)
+
+    def top_k(self, k: int) -> list[Mountain]:
+        """
+           Explain:
+           - Return the k mountains at the top of the ranking, i.e. the mountains at index 0 to k-1, in order.
+                Returns every mountain if there are fewer than k.
+
+           Args:
+           - k: number of mountains to return
+
+           Returns:
+           - mountains: List of the first k mountains
+
+           Complexity:
+           - Worst case: O(k + logN), see rank_range().
+           - Best case: O(1), when k is 0.
+        """
+        return self.rank_range(0, k)
+
+
+def rank_evolution(groups: list[list[Mountain]]) -> list[tuple[Mountain, int, list[int]]]:
+    """
+       Explain:
+       - Replay adding each group of mountains, in order, to an empty MountainOrganiser, and find the position every
+            mountain added so far would have after each step, i.e. MountainOrganiser.cur_position() after each
+            add_mountains(), without building the organiser.
+       - Every mountain is given the slot of its key among all the distinct keys, sorted once. A FenwickTree counts
+            the mountains added to each slot, so the position of a mountain (the number of mountains with a smaller
+            key) is a prefix sum.
+
+       Args:
+       - groups: List of groups of mountains, added in this order
+
+       Returns:
+       - evolution: A (mountain, first step, positions) tuple for every mountain, in the order they are added, where
+            positions holds the position of the mountain after each step from the one that added it (first step)
+            to the last.
+
+       Complexity: O(NlogN + PlogN), where N is the number of mountains and P the number of positions returned.
+       Best case and worst case are the same.
+            - mergesort() of the keys - O(NlogN)
+            - FenwickTree.add() for each mountain - O(logN)
+            - FenwickTree.prefix_sum() for each position - O(logN)
+    """
+    mountains = [mountain for group in groups for mountain in group]
+    keys = mergesort(list(map(mountain_key, mountains)))
+    slot = {}
+    for key in keys:
+        if key not in slot:
+            slot[key] = len(slot)
+    slots = [slot[mountain_key(mountain)] for mountain in mountains]
+
+    counts = FenwickTree(len(slot))
+    positions = [[] for _ in mountains]
+    added = 0
+    for group in groups:
+        for i in range(added, added + len(group)):
+            counts.add(slots[i], 1)
+        added += len(group)
+        for i in range(added):
+            positions[i].append(counts.prefix_sum(slots[i]))
+    return [(mountain, len(groups) - len(positions[i]), positions[i]) for i, mountain in enumerate(mountains)]
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import numpy as np
+
+from mountain import Mountain
+from mountain_manager import MountainManager
+from trail import Trail
+
+
+class MountainRegistry:
+    """
+    MountainRegistry is a read-only, column-oriented copy of a set of mountains, for reporting.
+
+    Names, difficulties and lengths are stored as parallel NumPy arrays (one row per mountain), with a dictionary from
+    name to row. Aggregations, histograms and filters then run as vectorised NumPy operations over whole columns,
+    instead of visiting each Mountain object in Python.
+
+    The registry is a snapshot: later changes to the mountains it was built from are not reflected.
+    """
+
+    def __init__(self, mountains: list[Mountain]) -> None:
+        """
+         Explain:
+           - Build the columns from a list of mountains, and index each row by mountain name. If two mountains share a
+             name, the index points at the last one.
+
+         Args:
+           - mountains: Mountains to store, one row each, in the given order.
+
+         Complexity:
+         - Worst case: O(N), where N is the length of mountains; each mountain is read once per column.
+         - Best case: O(N), same as worst case.
+        """
+        self.mountains = np.empty(len(mountains), dtype=object)
+        self.mountains[:] = mountains
+        self.names = np.array([m.name for m in mountains], dtype=object)
+        self.difficulties = np.fromiter((m.difficulty_level for m in mountains), dtype=np.int64, count=len(mountains))
+        self.lengths = np.fromiter((m.length for m in mountains), dtype=np.int64, count=len(mountains))
+        self.rows = {name: row for row, name in enumerate(self.names)}
+
+    @classmethod
+    def from_manager(cls, manager: MountainManager) -> MountainRegistry:
+        """
+         Explain:
+           - Build a registry of every mountain stored in a MountainManager, grouped by difficulty.
+
+         Complexity: O(MountainManager.group_by_difficulty()) + O(N), where N is the number of mountains.
+        """
+        return cls([m for group in manager.group_by_difficulty() for m in group])
+
+    @classmethod
+    def from_trail(cls, trail: Trail) -> MountainRegistry:
+        """
+         Explain:
+           - Build a registry of every mountain reachable from a trail.
+
+         Complexity: O(Trail.collect_all_mountains()) + O(N), where N is the number of mountains.
+        """
+        return cls(trail.collect_all_mountains())
+
+    def __len__(self) -> int:
+        """
+         Explain:
+           - Returns the number of rows (mountains) in the registry.
+
+         Complexity: O(1)
+        """
+        return len(self.names)
+
+    def __getitem__(self, name: str) -> Mountain:
+        """
+         Explain:
+           - Returns the mountain with the given name.
+
+         Raises:
+           - KeyError: If no mountain has this name.
+
+         Complexity: O(len(name)), hashing the name.
+        """
+        return self.mountains[self.rows[name]]
+
+    def __contains__(self, name: str) -> bool:
+        """
+         Explain:
+           - Checks whether a mountain with the given name is in the registry.
+
+         Complexity: O(len(name)), hashing the name.
+        """
+        return name in self.rows
+
+    def group_by_difficulty(self) -> tuple[np.ndarray, list[np.ndarray]]:
+        """
+         Explain:
+           - Group the rows by difficulty. Rows are stably sorted by difficulty once, then split where the
+             difficulty changes.
+
+         Returns:
+           - levels: The distinct difficulties, in increasing order.
+           - groups: For each level, an array of the row numbers with that difficulty, in registry order.
+
+         Complexity: O(NlogN), where N is the number of rows, for the sort. Best case and worst case are the same.
+        """
+        order = np.argsort(self.difficulties, kind="stable")
+        levels, starts = np.unique(self.difficulties[order], return_index=True)
+        if len(levels) == 0:
+            return levels, []
+        return levels, np.split(order, starts[1:])
+
+    def length_by_difficulty(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+         Explain:
+           - Aggregate the lengths for each difficulty.
+
+         Returns:
+           - levels: The distinct difficulties, in increasing order.
+           - counts: Number of mountains with each difficulty.
+           - totals: Sum of the lengths of the mountains with each difficulty.
+
+         Complexity: O(NlogN), where N is the number of rows, for finding the distinct difficulties.
+        """
+        levels, inverse, counts = np.unique(self.difficulties, return_inverse=True, return_counts=True)
+        totals = np.bincount(inverse, weights=self.lengths, minlength=len(levels)).astype(np.int64)
+        return levels, counts, totals
+
+    def length_histogram(self, bins: int | np.ndarray = 10) -> tuple[np.ndarray, np.ndarray]:
+        """
+         Explain:
+           - Histogram of the lengths, see numpy.histogram.
+
+         Args:
+           - bins: Number of equal-width bins, or the bin edges.
+
+         Returns:
+           - counts: Number of mountains in each bin.
+           - edges: The bin edges, one more than the number of bins.
+
+         Complexity: O(N + B), where N is the number of rows and B the number of bins.
+        """
+        return np.histogram(self.lengths, bins=bins)
+
+    def difficulty_histogram(self) -> tuple[np.ndarray, np.ndarray]:
+        """
+         Explain:
+           - Number of mountains with each difficulty from the smallest to the largest, including difficulties
+             with no mountains.
+
+         Returns:
+           - levels: Every difficulty from the smallest to the largest.
+           - counts: Number of mountains with each difficulty.
+
+         Complexity: O(N + D), where N is the number of rows and D the range of difficulties.
+        """
+        if len(self) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        low = self.difficulties.min()
+        counts = np.bincount(self.difficulties - low)
+        return np.arange(low, low + len(counts)), counts
+
+    def mask(self, min_length: int | None = None, max_length: int | None = None,
+             min_difficulty: int | None = None, max_difficulty: int | None = None) -> np.ndarray:
+        """
+         Explain:
+           - Boolean mask of the rows matching every given bound (all bounds are inclusive, None means unbounded).
+
+         Complexity: O(N), where N is the number of rows. Best case and worst case are the same.
+        """
+        result = np.ones(len(self), dtype=bool)
+        if min_length is not None:
+            result &= self.lengths >= min_length
+        if max_length is not None:
+            result &= self.lengths <= max_length
+        if min_difficulty is not None:
+            result &= self.difficulties >= min_difficulty
+        if max_difficulty is not None:
+            result &= self.difficulties <= max_difficulty
+        return result
+
+    def filter(self, min_length: int | None = None, max_length: int | None = None,
+               min_difficulty: int | None = None, max_difficulty: int | None = None) -> list[Mountain]:
+        """
+         Explain:
+           - Return the mountains matching every given bound, in registry order. See mask().
+
+         Complexity: O(N), where N is the number of rows. Best case and worst case are the same.
+        """
+        return list(self.mountains[self.mask(min_length, max_length, min_difficulty, max_difficulty)])
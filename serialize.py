@@ -1,4 +1,5 @@
-import dataclasses, json
+import dataclasses, json, re
+from typing import Any, Callable, TextIO
 
 from trail import Trail, TrailSplit, TrailSeries
 from mountain import Mountain
@@ -26,18 +27,153 @@ class EnhancedJSONEncoder(json.JSONEncoder):
 def serialize(trail):
     return json.dumps(trail, cls=EnhancedJSONEncoder)
 
-def deserialize(obj):
-    if obj["store"] is None:
-        return Trail(None)
-    if "mountain" in obj["store"]:
-        inside = TrailSeries(
-            Mountain(**obj["store"]["mountain"]),
-            deserialize(obj["store"]["following"])
-        )
-    else:
-        inside = TrailSplit(
-            deserialize(obj["store"]["path_top"]),
-            deserialize(obj["store"]["path_bottom"]),
-            deserialize(obj["store"]["path_follow"])
-        )
-    return Trail(inside)
+# Nodes written between calls to the progress callback of write_store.
+PROGRESS_NODES = 10000
+
+def write_store(trail: Trail, file: TextIO, progress: Callable[[int], None] | None = None) -> None:
+    """
+     Explain:
+       - Write the trail to file as JSON, exactly as serialize() would, but without recursion, so that trails of any
+         length can be written.
+       - If given, progress is called with the number of nodes written so far, every PROGRESS_NODES nodes.
+
+     Complexity: O(N), where N is the number of nodes in the trail. Best case and worst case are the same.
+    """
+    # Each item is either a Trail still to be written, or text to write once everything pushed after it is written.
+    stack = [trail]
+    written = 0
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            file.write(item)
+            continue
+        written += 1
+        if progress is not None and written % PROGRESS_NODES == 0:
+            progress(written)
+        if item.store is None:
+            file.write('{"store": null}')
+        elif isinstance(item.store, TrailSeries):
+            file.write('{"store": {"mountain": ' + json.dumps({
+                "name": item.store.mountain.name,
+                "difficulty_level": item.store.mountain.difficulty_level,
+                "length": item.store.mountain.length,
+            }) + ', "following": ')
+            stack.append("}}")
+            stack.append(item.store.following)
+        else:
+            file.write('{"store": {"path_top": ')
+            stack.append("}}")
+            stack.append(item.store.path_follow)
+            stack.append(', "path_follow": ')
+            stack.append(item.store.path_bottom)
+            stack.append(', "path_bottom": ')
+            stack.append(item.store.path_top)
+
+def deserialize(obj) -> Trail:
+    """
+     Explain:
+       - Build the trail described by obj, the parsed JSON of a store, without recursion, so that trails of any
+         length can be read.
+       - Each Trail is made empty first, and its store is filled in when its JSON is taken off the stack.
+
+     Complexity: O(N), where N is the number of nodes in the trail. Best case and worst case are the same.
+    """
+    trail = Trail(None)
+    stack = [(obj, trail)]
+    while stack:
+        obj, item = stack.pop()
+        store = obj["store"]
+        if store is None:
+            continue
+        if "mountain" in store:
+            following = Trail(None)
+            item.store = TrailSeries(Mountain(**store["mountain"]), following)
+            stack.append((store["following"], following))
+        else:
+            top, bottom, follow = Trail(None), Trail(None), Trail(None)
+            item.store = TrailSplit(top, bottom, follow)
+            stack.append((store["path_follow"], follow))
+            stack.append((store["path_bottom"], bottom))
+            stack.append((store["path_top"], top))
+    return trail
+
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# An object or array with no object or array inside it, which json's decoder can parse without nesting.
+_FLAT = re.compile(r'[{\[][^{}\[\]"]*(?:"(?:[^"\\]|\\.)*"[^{}\[\]"]*)*[}\]]')
+
+def parse_json(text: str) -> Any:
+    """
+     Explain:
+       - Parse a JSON document like json.loads(), but without recursion: json.loads() raises RecursionError once
+         objects nest about a thousand deep, which a store reaches with a few hundred mountains in a row.
+       - Objects and arrays are kept on a stack while they are open. Everything else (strings, numbers, true, false
+         and null), and every object or array with nothing nested in it, is parsed by json's own decoder.
+
+     Raises:
+       - json.JSONDecodeError: If text is not valid JSON.
+
+     Complexity: O(L), where L is the length of text. Best case and worst case are the same.
+    """
+    decoder = json.JSONDecoder()
+    # The open objects and arrays, innermost last, each with the key its next value goes under (None for arrays).
+    containers = []
+    pos = _WHITESPACE.match(text, 0).end()
+    while True:
+        char = text[pos:pos + 1]
+        if (char == "{" or char == "[") and not _FLAT.match(text, pos):
+            value = {} if char == "{" else []
+            pos = _WHITESPACE.match(text, pos + 1).end()
+            if text[pos:pos + 1] == ("}" if char == "{" else "]"):
+                pos += 1
+            else:
+                key, pos = _parse_key(decoder, text, pos) if char == "{" else (None, pos)
+                containers.append((value, key))
+                continue
+        else:
+            value, pos = decoder.raw_decode(text, pos)
+        # Store the value in its container, closing every container that ends after it.
+        while True:
+            pos = _WHITESPACE.match(text, pos).end()
+            if not containers:
+                if pos != len(text):
+                    raise json.JSONDecodeError("Extra data", text, pos)
+                return value
+            container, key = containers[-1]
+            if key is None:
+                container.append(value)
+            else:
+                container[key] = value
+            char = text[pos:pos + 1]
+            if char == ",":
+                pos = _WHITESPACE.match(text, pos + 1).end()
+                if key is not None:
+                    key, pos = _parse_key(decoder, text, pos)
+                    containers[-1] = (container, key)
+                break
+            if char != ("]" if key is None else "}"):
+                raise json.JSONDecodeError("Expecting ',' delimiter", text, pos)
+            containers.pop()
+            value = container
+            pos += 1
+
+def _parse_key(decoder: json.JSONDecoder, text: str, pos: int) -> tuple[str, int]:
+    # Parse '"key" :' at pos, returning the key and the position of the value after it.
+    if text[pos:pos + 1] != '"':
+        raise json.JSONDecodeError("Expecting property name enclosed in double quotes", text, pos)
+    key, pos = decoder.raw_decode(text, pos)
+    pos = _WHITESPACE.match(text, pos).end()
+    if text[pos:pos + 1] != ":":
+        raise json.JSONDecodeError("Expecting ':' delimiter", text, pos)
+    return key, _WHITESPACE.match(text, pos + 1).end()
+
+def read_store(file: TextIO) -> Trail:
+    """
+     Explain:
+       - Read a trail written by write_store() (or serialize()), of any length.
+
+     Raises:
+       - json.JSONDecodeError: If the file is not valid JSON.
+
+     Complexity: O(L), where L is the length of the file. Best case and worst case are the same.
+    """
+    return deserialize(parse_json(file.read()))
@@ -0,0 +1,74 @@
+import threading
+import time
+import unittest
+from ed_utils.decorators import number
+
+from background import BackgroundWorker
+
+
+class TestBackgroundWorker(unittest.TestCase):
+
+    def wait(self, worker):
+        for _ in range(500):
+            worker.poll()
+            if not worker.busy():
+                return
+            time.sleep(0.01)
+        self.fail("worker did not finish")
+
+    @number("13.1")
+    def test_progress_and_result(self):
+        worker = BackgroundWorker()
+        release = threading.Event()
+        results = []
+
+        def job(report):
+            report("halfway")
+            release.wait(5)
+            return threading.current_thread()
+
+        task = worker.submit("Job", job, results.append)
+        for _ in range(500):
+            worker.poll()
+            if task.progress:
+                break
+            time.sleep(0.01)
+        # The progress is seen, but the result is not handled until the job finishes.
+        self.assertEqual(worker.status(), "Job: halfway")
+        self.assertTrue(worker.busy("Job"))
+        self.assertFalse(worker.busy("Other"))
+        self.assertEqual(results, [])
+
+        release.set()
+        self.wait(worker)
+        self.assertEqual(len(results), 1)
+        self.assertIsNot(results[0], threading.current_thread())
+        self.assertEqual(worker.status(), "")
+        worker.shutdown()
+
+    @number("13.2")
+    def test_order_and_errors(self):
+        worker = BackgroundWorker()
+        results = []
+        for i in range(5):
+            worker.submit("Job", lambda report, i=i: i, results.append)
+        self.wait(worker)
+        self.assertEqual(results, list(range(5)))
+
+        worker.submit("Bad", lambda report: 1 / 0)
+        with self.assertRaises(ZeroDivisionError):
+            self.wait(worker)
+        worker.shutdown()
+
+    @number("13.3")
+    def test_on_error(self):
+        worker = BackgroundWorker()
+        results, errors = [], []
+        worker.submit("Bad", lambda report: 1 / 0, results.append, errors.append)
+        worker.submit("Good", lambda report: 1, results.append, errors.append)
+        # A job's error goes to its on_error, and the jobs after it still run.
+        self.wait(worker)
+        self.assertEqual(results, [1])
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0], ZeroDivisionError)
+        worker.shutdown()
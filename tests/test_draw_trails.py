@@ -0,0 +1,222 @@
+import importlib.util
+import json
+import subprocess
+import sys
+import unittest
+from unittest import mock
+from ed_utils.decorators import number
+
+from constants import DrawMode
+from draw_trails import Box, HeadlessTrailDraw, RetainedTrailDraw, TrailDraw
+from mountain import Mountain
+from serialize import deserialize
+from trail import Trail, TrailSeries, TrailSplit
+from utils import bezier, bezier_points
+
+
+class HeadlessRetainedTrailDraw(RetainedTrailDraw):
+    """Counts what would be recorded, and the frames drawn, without arcade."""
+
+    def begin_batch(self):
+        self.recorded = 0
+        self.builds = getattr(self, "builds", 0) + 1
+
+    def draw_batch(self):
+        self.frames = getattr(self, "frames", 0) + 1
+
+    def draw_line(self, sx, sy, ex, ey):
+        self.recorded += 1
+
+    def draw_mountain(self, x, y, scale, obj):
+        self.recorded += 1
+
+    def draw_branch(self, sx, sy, ex, ety, eby):
+        self.recorded += 1
+
+    def draw_summary(self, minx, miny, width, height):
+        self.recorded += 1
+
+
+class TestDrawTrails(unittest.TestCase):
+
+    @number("11.1")
+    def test_hit_test_matches_walk(self):
+        with open("stores/basic.json") as f:
+            draw = HeadlessTrailDraw(deserialize(json.loads(f.read())))
+        draw.draw_in_box(700, 700, 0, 0)
+        grid = draw.hit_grid
+        hits = 0
+        for mode in [DrawMode.ADD_MOUNTAIN, DrawMode.ADD_BRANCH, DrawMode.REMOVE, DrawMode.EDIT]:
+            for x in range(0, 700, 7):
+                for y in range(0, 700, 7):
+                    # Avoid landing exactly on box edges, where the two searches may break ties differently.
+                    point = (x + 0.37, y + 0.61)
+                    draw.hit_grid = grid
+                    box, action, cur = draw.box_and_action(point, mode)
+                    draw.hit_grid = None
+                    walk_box, walk_action, walk_cur = draw.box_and_action(point, mode)
+                    self.assertIs(box, walk_box)
+                    self.assertIs(cur, walk_cur)
+                    self.assertEqual(action is None, walk_action is None)
+                    hits += box is not None
+        self.assertGreater(hits, 0)
+
+    @number("11.2")
+    def test_action_clears_hits(self):
+        with open("stores/basic.json") as f:
+            draw = HeadlessTrailDraw(deserialize(json.loads(f.read())))
+        draw.draw_in_box(700, 700, 0, 0)
+        record = next(record for cell in draw.hit_grid.cells.values() for *_, record in cell if record.kind == "mountain")
+        point = (record.box.x + record.box.w / 2, record.box.y + record.box.h / 2)
+        box, action, cur = draw.box_and_action(point, DrawMode.REMOVE)
+        self.assertIs(cur, record.node)
+        action()
+        self.assertEqual(draw.box_and_action(point, DrawMode.REMOVE), (None, None, None))
+        draw.draw_in_box(700, 700, 0, 0)
+        self.assertNotIn(record.node.mountain, draw.trail.collect_all_mountains())
+
+    @number("11.3")
+    def test_branch_curves(self):
+        def de_casteljau(points, t):
+            while len(points) > 1:
+                points = [((1-t)*a[0] + t*b[0], (1-t)*a[1] + t*b[1]) for a, b in zip(points, points[1:])]
+            return points[0]
+
+        points = ((0, 0), (5, 0), (5, 40), (10, 40))
+        curve = bezier(*points)
+        tessellated = bezier_points(points, 11)
+        for i in range(11):
+            expected = de_casteljau(points, i / 10)
+            self.assertAlmostEqual(curve(i / 10)[0], expected[0])
+            self.assertAlmostEqual(curve(i / 10)[1], expected[1])
+            self.assertAlmostEqual(tessellated[i][0], expected[0])
+            self.assertAlmostEqual(tessellated[i][1], expected[1])
+
+        draw = HeadlessTrailDraw(None)
+        top, bottom = draw.branch_curves(0, 0, 10, 40, -40)
+        self.assertEqual(len(top), TrailDraw.BRANCH_SAMPLES)
+        self.assertEqual(top[-1], [10, 40])
+        self.assertEqual(bottom[-1], [10, -40])
+        # Reused while the geometry stays the same.
+        self.assertIs(draw.branch_curves(0, 0, 10, 40, -40)[0], top)
+
+    @number("11.4")
+    def test_retained_rebuilds(self):
+        with open("stores/basic.json") as f:
+            draw = HeadlessRetainedTrailDraw(deserialize(json.loads(f.read())))
+        for _ in range(3):
+            draw.render(700, 700, 0, 0)
+        self.assertEqual((draw.builds, draw.frames), (1, 3))
+        self.assertGreater(draw.recorded, 0)
+
+        # Resizing rebuilds.
+        draw.render(600, 700, 0, 0)
+        self.assertEqual(draw.builds, 2)
+
+        # So does an edit made through an action.
+        record = next(record for cell in draw.hit_grid.cells.values() for *_, record in cell if record.kind == "mountain")
+        point = (record.box.x + record.box.w / 2, record.box.y + record.box.h / 2)
+        _, action, _ = draw.box_and_action(point, DrawMode.REMOVE)
+        action()
+        draw.render(600, 700, 0, 0)
+        draw.render(600, 700, 0, 0)
+        self.assertEqual((draw.builds, draw.frames), (3, 6))
+
+    @number("11.5")
+    def test_sizes_memoised(self):
+        def size(trail):
+            # Reference: the sizes computed directly, without the cache.
+            if trail.store is None:
+                return 0, TrailDraw.EMPTY_HEIGHT
+            if isinstance(trail.store, TrailSeries):
+                fw, fh = size(trail.store.following)
+                return TrailDraw.TOTAL_MOUNTAIN_WIDTH + fw, max(TrailDraw.MOUNTAIN_HEIGHT, fh)
+            (tw, th), (bw, bh), (fw, fh) = (size(t) for t in (trail.store.path_top, trail.store.path_bottom, trail.store.path_follow))
+            return 2 * TrailDraw.BRANCH_WIDTH + max(tw, bw, TrailDraw.MIN_BRANCH_CONTENT_WIDTH) + fw, max(th + TrailDraw.BRANCH_SEPARATION + bh, fh)
+
+        with open("stores/basic.json") as f:
+            draw = HeadlessTrailDraw(deserialize(json.loads(f.read())))
+        draw.draw_in_box(700, 700, 0, 0)
+        self.assertEqual((draw.required_width(), draw.required_height()), size(draw.trail))
+        cached = len(draw.sizes)
+
+        # An in place edit forgets the sizes around it; the rest are reused.
+        record = next(record for cell in draw.hit_grid.cells.values() for *_, record in cell if record.kind == "after")
+        point = (record.box.x + record.box.w / 2, record.box.y + record.box.h / 2)
+        _, action, _ = draw.box_and_action(point, DrawMode.ADD_BRANCH)
+        action()
+        draw.draw_in_box(700, 700, 0, 0)
+        self.assertEqual((draw.required_width(), draw.required_height()), size(draw.trail))
+        self.assertEqual(len(draw.sizes), cached + 1)
+
+    @number("11.6")
+    def test_long_trail(self):
+        trail = Trail(None)
+        for i in range(5000):
+            trail = Trail(TrailSeries(Mountain(str(i), 1, 1), trail))
+        trail = Trail(TrailSplit(trail, Trail(None), Trail(None)))
+        draw = HeadlessTrailDraw(trail)
+        draw.draw_in_box(700, 700000, 0, 0)
+        self.assertEqual(draw.required_width(), 2 * TrailDraw.BRANCH_WIDTH + 5000 * TrailDraw.TOTAL_MOUNTAIN_WIDTH)
+        self.assertGreaterEqual(len(draw.hit_grid), 5000 * 3)
+
+    @number("11.7")
+    def test_culling_and_lod(self):
+        trail = Trail(None)
+        for i in range(1000):
+            trail = Trail(TrailSeries(Mountain(str(i), 1, 1), trail))
+        draw = HeadlessRetainedTrailDraw(trail)
+        width = 1000 * TrailDraw.TOTAL_MOUNTAIN_WIDTH
+        draw.render(700, width, 0, 0)
+        everything = draw.recorded
+
+        # Only the mountains near a 700 pixel viewport are drawn.
+        draw.set_viewport(Box(0, 0, 700, 700))
+        draw.render(700, width, 0, 0)
+        self.assertLess(draw.recorded, everything / 20)
+        self.assertIsNone(draw.box_and_action((width - 10, 350), DrawMode.ADD_MOUNTAIN)[0])
+
+        # Squeezed into 700 pixels, the trail is one summary glyph.
+        draw.render(700, 700, 0, 0)
+        self.assertEqual(draw.recorded, 1)
+
+    @number("11.8")
+    def test_headless_calls(self):
+        with open("stores/basic.json") as f:
+            trail = deserialize(json.loads(f.read()))
+        draw = HeadlessTrailDraw(trail)
+        for _ in range(2):
+            draw.draw_in_box(700, 700, 0, 0)
+            mountains = len(trail.collect_all_mountains())
+            self.assertEqual(draw.calls["mountain"], mountains)
+            self.assertEqual(draw.calls["summary"], 0)
+            self.assertGreater(draw.calls["branch"], 0)
+            self.assertGreaterEqual(draw.calls["line"], 2 * mountains)
+
+    @number("11.9")
+    @unittest.skipUnless(importlib.util.find_spec("arcade"), "needs arcade")
+    def test_retained_labels(self):
+        import arcade
+        import pyglet
+        draw = RetainedTrailDraw(Trail(None))
+        # Sprites and batches can be made without a window, the labels are checked against the real signature.
+        draw.sprites = arcade.SpriteList()
+        draw.labels = []
+        draw.label_batch = pyglet.graphics.Batch()
+        with mock.patch("pyglet.text.Label", autospec=True) as label:
+            draw.draw_mountain(100, 100, 1, Mountain("m", 3, 7))
+        self.assertEqual(len(draw.sprites), 1)
+        self.assertEqual(len(draw.labels), 2)
+        self.assertEqual([call.args[0] for call in label.call_args_list], ["3", "7"])
+        for call in label.call_args_list:
+            self.assertIs(call.kwargs["batch"], draw.label_batch)
+
+    @number("11.10")
+    def test_no_numpy_at_startup(self):
+        # main.py imports these before the first frame; numpy is only needed once a branch is drawn.
+        modules = "constants, mountain, mountain_manager, trail, draw_trails, trail_history, mountain_organiser, serialize, background"
+        result = subprocess.run(
+            [sys.executable, "-c", f"import sys, {modules}; print('numpy' in sys.modules)"],
+            capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "False")
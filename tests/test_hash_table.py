@@ -0,0 +1,26 @@
+import unittest
+from ed_utils.decorators import number
+
+from data_structures.hash_table import LinearProbeTable
+
+
+class TestLinearProbeTable(unittest.TestCase):
+
+    @number("14.1")
+    def test_replace(self):
+        table = LinearProbeTable()
+        for i in range(20):
+            table[f"k{i}"] = i
+        size = table.table_size
+        positions = [item[0] if item is not None else None for item in table.array]
+
+        self.assertEqual(table.replace("k7", 70), 7)
+        self.assertEqual(table["k7"], 70)
+        # Same slot, count and size: nothing is moved or inserted.
+        self.assertEqual([item[0] if item is not None else None for item in table.array], positions)
+        self.assertEqual(len(table), 20)
+        self.assertEqual(table.table_size, size)
+
+        self.assertRaises(KeyError, lambda: table.replace("missing", 1))
+        self.assertNotIn("missing", table)
+        self.assertEqual(len(table), 20)
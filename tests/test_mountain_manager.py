@@ -1,4 +1,6 @@
+import random
 import unittest
+from contextlib import ExitStack
 from ed_utils.decorators import number
 
 from mountain import Mountain
@@ -56,3 +58,353 @@ class TestInfiniteHash(unittest.TestCase):
         self.assertEqual(len(res), 4)
 
         self.assertEqual(make_set(res[3]), make_set([m10]))
+
+    @number("5.2")
+    def test_numeric_order(self):
+        m1 = Mountain("m1", 10, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 100, 6)
+        m4 = Mountain("m4", 2, 1)
+        m5 = Mountain("m5", -1, 6)
+
+        mm = MountainManager()
+        for m in [m1, m2, m3, m4, m5]:
+            mm.add_mountain(m)
+
+        res = mm.group_by_difficulty()
+        self.assertEqual([[m.difficulty_level for m in group][0] for group in res], [-1, 2, 10, 100])
+        self.assertEqual(len(res[1]), 2)
+        self.assertEqual(mm.mountains_with_difficulty(11), [])
+
+        mm.remove_mountain(m3)
+        mm.remove_mountain(m5)
+        self.assertEqual([[m.difficulty_level for m in group][0] for group in mm.group_by_difficulty()], [2, 10])
+        self.assertRaises(KeyError, lambda: mm.remove_mountain(m3))
+        self.assertRaises(KeyError, lambda: mm.remove_mountain(Mountain("m9", 2, 1)))
+
+    @number("5.3")
+    def test_group_cache(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+        m4 = Mountain("m4", 3, 1)
+        m5 = Mountain("m5", 4, 6)
+
+        mm = MountainManager()
+        for m in [m2, m1, m3, m4]:
+            mm.add_mountain(m)
+        res1 = mm.group_by_difficulty()
+        # Each group is sorted.
+        self.assertEqual(res1, [[m1, m2], [m4, m3]])
+
+        # Unchanged groups are not rebuilt.
+        mm.add_mountain(m5)
+        res2 = mm.group_by_difficulty()
+        self.assertIs(res2[0], res1[0])
+        self.assertIs(res2[1], res1[1])
+        self.assertEqual(res2[2], [m5])
+
+        mm.remove_mountain(m1)
+        res3 = mm.group_by_difficulty()
+        self.assertEqual(res3[0], [m2])
+        self.assertIs(res3[1], res1[1])
+
+        # A group that is dropped and created again is not served from a stale cache.
+        mm.remove_mountain(m5)
+        self.assertEqual(len(mm.group_by_difficulty()), 2)
+        m6 = Mountain("m6", 4, 1)
+        mm.add_mountain(m6)
+        self.assertEqual(mm.group_by_difficulty()[2], [m6])
+
+        edited = Mountain("m2", 2, 0)
+        mm.edit_mountain(m2, edited)
+        self.assertEqual(mm.group_by_difficulty()[0], [edited])
+
+    @number("5.4")
+    def test_edit(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+
+        mm = MountainManager()
+        for m in [m1, m2, m3]:
+            mm.add_mountain(m)
+        group = mm.organisers[2]
+
+        # Same key: overwritten in place, the group table is the same object with the same size.
+        longer = Mountain("m1", 2, 20)
+        mm.edit_mountain(m1, longer)
+        self.assertIs(mm.organisers[2], group)
+        self.assertEqual(len(group), 2)
+        self.assertEqual(mm.group_by_difficulty(), [[m2, longer], [m3]])
+
+        # Renamed within the same difficulty.
+        renamed = Mountain("m4", 2, 20)
+        mm.edit_mountain(longer, renamed)
+        self.assertIs(mm.organisers[2], group)
+        self.assertEqual(mm.group_by_difficulty(), [[m2, renamed], [m3]])
+
+        # Moved to another difficulty, dropping the group it came from.
+        moved = Mountain("m3", 5, 6)
+        mm.edit_mountain(m3, moved)
+        self.assertEqual(mm.group_by_difficulty(), [[m2, renamed], [moved]])
+        self.assertEqual(mm.mountains_with_difficulty(3), [])
+
+        self.assertRaises(KeyError, lambda: mm.edit_mountain(m1, longer))
+        self.assertRaises(KeyError, lambda: mm.edit_mountain(Mountain("m1", 9, 1), longer))
+
+    @number("5.5")
+    def test_secondary_indexes(self):
+        for mm in [MountainManager(), MountainManager(name_index=True, length_index=True)]:
+            m1 = Mountain("m1", 2, 2)
+            m2 = Mountain("m2", 2, 9)
+            m3 = Mountain("m3", 3, 6)
+            for m in [m1, m2, m3]:
+                mm.add_mountain(m)
+            self.assertIs(mm.mountain_with_name("m3"), m3)
+            self.assertEqual(mm.mountains_with_length(2, 6), [m1, m3])
+
+            # Edited in place by the caller first, as the GUI does.
+            old = Mountain("m1", 2, 2)
+            m1.length = 7
+            mm.edit_mountain(old, m1)
+            self.assertEqual(mm.mountains_with_length(2, 6), [m3])
+            self.assertEqual(mm.mountains_with_length(7, 9), [m1, m2])
+
+            renamed = Mountain("m4", 3, 1)
+            mm.edit_mountain(m2, renamed)
+            self.assertIs(mm.mountain_with_name("m4"), renamed)
+            self.assertRaises(KeyError, lambda: mm.mountain_with_name("m2"))
+            self.assertEqual(mm.mountains_with_length(0, 100), [renamed, m3, m1])
+
+            mm.remove_mountain(m3)
+            self.assertRaises(KeyError, lambda: mm.mountain_with_name("m3"))
+            self.assertEqual(mm.mountains_with_length(0, 100), [renamed, m1])
+
+            # Renaming onto a stored name replaces that mountain in the indexes too.
+            a, b = Mountain("a", 1, 1), Mountain("b", 1, 2)
+            mm.add_mountain(a)
+            mm.add_mountain(b)
+            renamed_b = Mountain("b", 1, 5)
+            mm.edit_mountain(a, renamed_b)
+            self.assertEqual(mm.mountains_with_difficulty(1), [renamed_b])
+            self.assertEqual(mm.mountains_with_length(0, 10), [renamed, renamed_b, m1])
+            self.assertIs(mm.mountain_with_name("b"), renamed_b)
+
+    @number("5.6")
+    def test_batch(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+
+        mm = MountainManager(name_index=True, length_index=True)
+        mm.add_mountain(m1)
+        with mm.batch():
+            mm.add_mountain(m2)
+            mm.add_mountain(m3)
+            mm.remove_mountain(m3)  # cancels the add
+            mm.remove_mountain(m1)
+            self.assertEqual(mm.mountains_with_difficulty(2), [m1])  # not applied yet
+            self.assertRaises(KeyError, lambda: mm.remove_mountain(m1))
+            self.assertRaises(KeyError, lambda: mm.remove_mountain(m3))
+        self.assertEqual(mm.group_by_difficulty(), [[m2]])
+        self.assertEqual(mm.mountains_with_length(0, 100), [m2])
+        self.assertRaises(KeyError, lambda: mm.mountain_with_name("m1"))
+
+        # Replacing a stored mountain, then removing it, removes the stored one too.
+        with mm.batch():
+            mm.add_mountain(Mountain("m2", 2, 1))
+            mm.remove_mountain(m2)
+        self.assertEqual(mm.group_by_difficulty(), [])
+        self.assertEqual(mm.mountains_with_length(0, 100), [])
+
+        # Large batches resize each group once and rebuild it after large removals.
+        mountains = [Mountain(f"m{i}", i % 3, i) for i in range(200)]
+        with mm.batch():
+            for m in mountains:
+                mm.add_mountain(m)
+        with mm.batch():
+            for m in mountains[:150]:
+                mm.edit_mountain(m, Mountain(m.name, m.difficulty_level, m.length + 1000))
+            for m in mountains[150:]:
+                mm.remove_mountain(m)
+        self.assertEqual([len(group) for group in mm.group_by_difficulty()], [50, 50, 50])
+        self.assertEqual(mm.mountain_with_name("m7").length, 1007)
+        self.assertEqual(len(mm.mountains_with_length(1000, 2000)), 150)
+
+        # An exception discards the batch.
+        with self.assertRaises(ValueError):
+            with mm.batch():
+                mm.remove_mountain(mm.mountain_with_name("m7"))
+                raise ValueError
+        self.assertEqual(mm.mountain_with_name("m7").length, 1007)
+        self.assertIsNone(mm.pending)
+
+    @number("5.7")
+    def test_snapshot(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+
+        mm = MountainManager(name_index=True, length_index=True)
+        for m in [m1, m2, m3]:
+            mm.add_mountain(m)
+        fork = mm.snapshot()
+        self.assertIs(fork.organisers[2], mm.organisers[2])
+
+        # Only the changed group is copied, in the manager that changed it.
+        fork.remove_mountain(m1)
+        self.assertIsNot(fork.organisers[2], mm.organisers[2])
+        self.assertIs(fork.organisers[3], mm.organisers[3])
+        self.assertEqual(fork.group_by_difficulty(), [[m2], [m3]])
+        self.assertEqual(mm.group_by_difficulty(), [[m1, m2], [m3]])
+        self.assertEqual(fork.mountains_with_length(0, 100), [m3, m2])
+        self.assertIs(mm.mountain_with_name("m1"), m1)
+        self.assertRaises(KeyError, lambda: fork.mountain_with_name("m1"))
+
+        # The original gave up ownership too, so changing it leaves the fork alone.
+        edited = Mountain("m3", 3, 1)
+        mm.edit_mountain(m3, edited)
+        self.assertEqual(fork.mountains_with_difficulty(3), [m3])
+        self.assertEqual(mm.mountains_with_difficulty(3), [edited])
+
+        second = fork.snapshot()
+        with second.batch():
+            second.add_mountain(Mountain("m4", 3, 4))
+            second.remove_mountain(m2)
+        self.assertEqual(len(second.mountains_with_length(0, 100)), 2)
+        self.assertEqual(fork.group_by_difficulty(), [[m2], [m3]])
+
+    @number("5.8")
+    def test_batch_moves_between_groups(self):
+        mm = MountainManager(name_index=True, length_index=True)
+        a = Mountain("n0", 3, 0)
+        mm.add_mountain(a)
+        moved = Mountain("n0", 0, 0)
+        with mm.batch():
+            mm.edit_mountain(a, moved)
+        self.assertEqual(mm.group_by_difficulty(), [[moved]])
+        self.assertEqual(len(mm.mountains_with_length(0, 10)), 1)
+        self.assertIs(mm.mountains_with_length(0, 10)[0], moved)
+
+        # Random batches agree with a manager without indexes, which always scans.
+        for seed in range(100):
+            rng = random.Random(seed)
+            indexed = MountainManager(name_index=True, length_index=True)
+            plain = MountainManager()
+            stored = {}
+            for _ in range(4):
+                with indexed.batch(), plain.batch():
+                    for _ in range(15):
+                        op = rng.random()
+                        if op < 0.5 or not stored:
+                            m = Mountain(f"n{rng.randint(0, 5)}", rng.randint(0, 3), rng.randint(0, 3))
+                            key = (m.difficulty_level, m.name)
+                            for manager in [indexed, plain]:
+                                manager.add_mountain(m)
+                            stored[key] = m
+                        else:
+                            key = rng.choice(sorted(stored))
+                            old = stored.pop(key)
+                            if op < 0.75:
+                                for manager in [indexed, plain]:
+                                    manager.remove_mountain(old)
+                            else:
+                                new = Mountain(old.name, rng.randint(0, 3), rng.randint(0, 3))
+                                for manager in [indexed, plain]:
+                                    manager.edit_mountain(old, new)
+                                stored[(new.difficulty_level, new.name)] = new
+                self.assertEqual(indexed.group_by_difficulty(), plain.group_by_difficulty())
+                found = indexed.mountains_with_length(0, 10)
+                expected = plain.mountains_with_length(0, 10)
+                # Mountains with the same (length, name) may come in either order.
+                self.assertEqual([(m.length, m.name) for m in found], [(m.length, m.name) for m in expected])
+                self.assertEqual(sorted(map(id, found)), sorted(map(id, expected)))
+
+    @number("5.9")
+    def test_far_difficulties(self):
+        # Difficulty levels far apart are kept outside the dense range, and still come out in order.
+        mountains = [Mountain(f"m{d}", d, 1) for d in [10**12, 3, -10**9, 5, 10**7, 2000]]
+        manager = MountainManager()
+        for mountain in mountains:
+            manager.add_mountain(mountain)
+        self.assertLessEqual(manager.organisers.table_size, manager.organisers.MAX_RANGE)
+        by_difficulty = sorted(mountains, key=lambda m: m.difficulty_level)
+        self.assertEqual(manager.group_by_difficulty(), [[m] for m in by_difficulty])
+        self.assertEqual(manager.mountains_with_difficulty(10**12), [mountains[0]])
+
+        snapshot = manager.snapshot()
+        manager.remove_mountain(mountains[0])
+        manager.edit_mountain(mountains[2], Mountain("m", 10**15, 1))
+        self.assertEqual(manager.group_by_difficulty(),
+                         [[m] for m in by_difficulty if m not in (mountains[0], mountains[2])] + [[Mountain("m", 10**15, 1)]])
+        self.assertEqual(snapshot.group_by_difficulty(), [[m] for m in by_difficulty])
+
+    @number("5.10")
+    def test_snapshot_shares_tables(self):
+        a, b = Mountain("a", 1, 1), Mountain("b", 2, 2)
+        manager = MountainManager()
+        manager.add_mountain(a)
+        snapshot = manager.snapshot()
+        # Nothing is copied until one side changes, and then only that side copies.
+        self.assertIs(snapshot.organisers, manager.organisers)
+        snapshot.add_mountain(b)
+        self.assertIsNot(snapshot.organisers, manager.organisers)
+        self.assertEqual(manager.group_by_difficulty(), [[a]])
+        self.assertEqual(snapshot.group_by_difficulty(), [[a], [b]])
+        # Queries write to the cache, which must not leak into the other manager either.
+        again = manager.snapshot()
+        manager.remove_mountain(a)
+        self.assertEqual(again.group_by_difficulty(), [[a]])
+        self.assertEqual(manager.group_by_difficulty(), [])
+
+    @number("5.11")
+    def test_shared_names(self):
+        a1, a2 = Mountain("a", 1, 1), Mountain("a", 2, 2)
+        for name_index in [False, True]:
+            manager = MountainManager(name_index=name_index)
+            manager.add_mountain(a1)
+            manager.add_mountain(a2)
+            manager.remove_mountain(a2)
+            self.assertIs(manager.mountain_with_name("a"), a1)
+            manager.add_mountain(a2)
+            manager.remove_mountain(a1)
+            self.assertIs(manager.mountain_with_name("a"), a2)
+            manager.remove_mountain(a2)
+            self.assertRaises(KeyError, lambda: manager.mountain_with_name("a"))
+
+        # Indexed and unindexed lookups agree, with and without batches.
+        rng = random.Random(0)
+        for seed in range(50):
+            rng.seed(seed)
+            plain, indexed = MountainManager(), MountainManager(name_index=True)
+            stored = []
+            for _ in range(60):
+                with ExitStack() as batches:
+                    if rng.random() < 0.3:
+                        for manager in [plain, indexed]:
+                            batches.enter_context(manager.batch())
+                    self._shared_name_steps(rng, stored, plain, indexed)
+                for name in "abc":
+                    try:
+                        expected = plain.mountain_with_name(name)
+                    except KeyError:
+                        self.assertRaises(KeyError, lambda: indexed.mountain_with_name(name))
+                    else:
+                        self.assertIs(indexed.mountain_with_name(name), expected)
+
+    @staticmethod
+    def _shared_name_steps(rng, stored, *managers):
+        # A few random adds and removes, reusing a few names at a few difficulty levels.
+        for _ in range(rng.randint(1, 5)):
+            if stored and rng.random() < 0.4:
+                mountain = stored.pop(rng.randrange(len(stored)))
+                for manager in managers:
+                    manager.remove_mountain(mountain)
+            else:
+                mountain = Mountain(rng.choice("abc"), rng.randint(1, 4), rng.randint(1, 9))
+                if any((m.name, m.difficulty_level) == (mountain.name, mountain.difficulty_level) for m in stored):
+                    continue
+                stored.append(mountain)
+                for manager in managers:
+                    manager.add_mountain(mountain)
@@ -1,8 +1,10 @@
+import random
 import unittest
 from ed_utils.decorators import number
+from unittest import mock
 
-from mountain import Mountain
-from mountain_organiser import MountainOrganiser
+from mountain import Mountain, mountain_key
+from mountain_organiser import MountainOrganiser, rank_evolution
 
 class TestInfiniteHash(unittest.TestCase):
 
@@ -31,3 +33,168 @@ class TestInfiniteHash(unittest.TestCase):
         self.assertEqual([mo.cur_position(m) for m in [m1, m2, m3, m4, m5, m6, m7, m8, m9]], [1, 8, 3, 0, 4, 2, 6, 7, 5])
 
         self.assertRaises(KeyError, lambda: mo.cur_position(m10))
+
+    @number("6.2")
+    def test_add_many_batches(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+        m4 = Mountain("m4", 3, 1)
+        m5 = Mountain("m5", 4, 6)
+        m6 = Mountain("m6", 7, 3)
+        m7 = Mountain("m7", 7, 7)
+
+        mo = MountainOrganiser()
+        mo.add_mountains([m2, m1])
+        mo.add_many_batches([[m4, m3], [], [m5], [m7, m6]])
+        self.assertEqual(mo.mountain_lst, [m4, m1, m6, m3, m5, m7, m2])
+        self.assertEqual([mo.cur_position(m) for m in [m1, m2, m3, m4, m5, m6, m7]], [1, 6, 3, 0, 4, 2, 5])
+
+        # Same result as adding the batches one at a time.
+        mo2 = MountainOrganiser()
+        for batch in [[m2, m1], [m4, m3], [], [m5], [m7, m6]]:
+            mo2.add_mountains(batch)
+        self.assertEqual(mo2.mountain_lst, mo.mountain_lst)
+
+    @number("6.3")
+    def test_tree_backend(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+        m4 = Mountain("m4", 3, 1)
+        m5 = Mountain("m5", 4, 6)
+        m6 = Mountain("m6", 7, 3)
+        m7 = Mountain("m7", 7, 7)
+        m8 = Mountain("m8", 7, 8)
+        m9 = Mountain("m9", 7, 6)
+        m10 = Mountain("m10", 8, 4)
+
+        mo = MountainOrganiser(MountainOrganiser.TREE_BACKEND)
+        mo.add_mountains([m1, m2])
+        self.assertEqual([mo.cur_position(m) for m in [m1, m2]], [0, 1])
+        mo.add_mountains([m4, m3])
+        self.assertEqual([mo.cur_position(m) for m in [m1, m2, m3, m4]], [1, 3, 2, 0])
+        mo.add_many_batches([[m5], [m7, m9, m6, m8]])
+        self.assertEqual([mo.cur_position(m) for m in [m1, m2, m3, m4, m5, m6, m7, m8, m9]], [1, 8, 3, 0, 4, 2, 6, 7, 5])
+        self.assertRaises(KeyError, lambda: mo.cur_position(m10))
+        self.assertEqual(len(mo), 9)
+
+        mo.remove_mountain(m3)
+        self.assertEqual([mo.cur_position(m) for m in [m1, m2, m4, m5, m6, m7, m8, m9]], [1, 7, 0, 3, 2, 5, 6, 4])
+        self.assertRaises(KeyError, lambda: mo.cur_position(m3))
+        self.assertRaises(KeyError, lambda: mo.remove_mountain(m3))
+        self.assertRaises(ValueError, lambda: MountainOrganiser("heap"))
+
+    @number("6.4")
+    def test_remove(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+
+        mo = MountainOrganiser()
+        mo.add_mountains([m1, m2, m3])
+        mo.remove_mountain(m3)
+        self.assertEqual([mo.cur_position(m) for m in [m1, m2]], [0, 1])
+        self.assertRaises(KeyError, lambda: mo.cur_position(m3))
+        self.assertEqual(len(mo), 2)
+
+    @number("6.5")
+    def test_cur_positions(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+        m4 = Mountain("m4", 3, 1)
+        m5 = Mountain("m5", 4, 6)
+
+        for backend in [MountainOrganiser.LIST_BACKEND, MountainOrganiser.TREE_BACKEND]:
+            mo = MountainOrganiser(backend)
+            mo.add_mountains([m1, m2, m3, m4])
+            self.assertEqual(mo.cur_positions([m2, m4, m1, m3]), [3, 0, 1, 2])
+            self.assertEqual(mo.cur_positions([]), [])
+            self.assertRaises(KeyError, lambda: mo.cur_positions([m1, m5]))
+
+    @number("6.6")
+    def test_ranking_queries(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+        m4 = Mountain("m4", 3, 1)
+        m5 = Mountain("m5", 4, 6)
+        m6 = Mountain("m6", 7, 3)
+        m7 = Mountain("m7", 7, 7)
+
+        for backend in [MountainOrganiser.LIST_BACKEND, MountainOrganiser.TREE_BACKEND]:
+            mo = MountainOrganiser(backend)
+            mo.add_mountains([m1, m2, m3, m4, m5, m6, m7])
+            # Order is m4, m1, m6, m3, m5, m7, m2
+            self.assertEqual(mo.rank_range(2, 5), [m6, m3, m5])
+            self.assertEqual(mo.rank_range(5, 100), [m7, m2])
+            self.assertEqual(mo.rank_range(-3, 1), [m4])
+            self.assertEqual(mo.rank_range(4, 4), [])
+            self.assertEqual(mo.length_range(2, 6), [m1, m6, m3, m5])
+            self.assertEqual(mo.length_range(6, 6), [m3, m5])
+            self.assertEqual(mo.length_range(10, 20), [])
+            self.assertEqual(mo.length_range(7, 2), [])
+            self.assertEqual(mo.top_k(3), [m4, m1, m6])
+            self.assertEqual(mo.top_k(0), [])
+            self.assertEqual(len(mo.top_k(10)), 7)
+
+    @number("6.7")
+    def test_rank_evolution(self):
+        rng = random.Random(7)
+        mountains = [Mountain(f"m{i}", rng.randint(1, 8), rng.randint(1, 30)) for i in range(300)]
+        groups = [[m for m in mountains if m.difficulty_level == d] for d in range(1, 9)]
+        groups = [group for group in groups if group]
+
+        # Replay with an organiser, as the graph used to.
+        mo = MountainOrganiser()
+        expected = {}
+        added = []
+        for step, group in enumerate(groups):
+            mo.add_mountains(group)
+            added.extend(group)
+            for mountain in group:
+                expected[mountain.name] = (step, [])
+            for mountain in added:
+                expected[mountain.name][1].append(mo.cur_position(mountain))
+
+        evolution = rank_evolution(groups)
+        self.assertEqual([mountain for mountain, _, _ in evolution], added)
+        for mountain, start, positions in evolution:
+            self.assertEqual((start, positions), expected[mountain.name])
+        self.assertEqual(rank_evolution([]), [])
+
+    @number("6.8")
+    def test_remove_stored(self):
+        for backend in [MountainOrganiser.LIST_BACKEND, MountainOrganiser.TREE_BACKEND]:
+            mo = MountainOrganiser(backend)
+            # Same key (length, name), different difficulties.
+            x, y, z = Mountain("n", 1, 5), Mountain("n", 2, 5), Mountain("m", 3, 5)
+            mo.add_mountains([x, y, z])
+            mo.remove_mountain(y)
+            self.assertEqual(mo.rank_range(0, 3), [z, x])
+            self.assertIs(mo.rank_range(1, 2)[0], x)
+
+            # Edited in place: found by its old values, removed by identity.
+            old = Mountain("m", 3, 5)
+            z.length = 9
+            mo.remove_mountain(old, z)
+            self.assertEqual(mo.rank_range(0, 3), [x])
+            self.assertRaises(KeyError, lambda: mo.remove_mountain(old, z))
+
+    @number("6.9")
+    def test_add_computes_new_keys_only(self):
+        stored = [Mountain(f"m{i}", 1, i) for i in range(1000)]
+        batches = [[Mountain(f"n{i}", 1, 2 * i + 1) for i in range(5)], [Mountain(f"o{i}", 1, 3 * i) for i in range(5)]]
+        mo = MountainOrganiser()
+        mo.add_mountains(stored)
+        with mock.patch("mountain_organiser.mountain_key", side_effect=mountain_key) as key:
+            mo.add_mountains(batches[0])
+            # Sorting and merging the new mountains, never the stored ones.
+            self.assertLessEqual(key.call_count, 2 * len(batches[0]))
+            key.reset_mock()
+            mo.add_many_batches(batches)
+            self.assertLessEqual(key.call_count, 2 * sum(map(len, batches)))
+        everything = stored + batches[0] + batches[0] + batches[1]
+        self.assertEqual(mo.mountain_lst, sorted(everything))
+        self.assertEqual(mo.key_lst, [mountain_key(m) for m in mo.mountain_lst])
@@ -0,0 +1,78 @@
+import json
+import random
+import unittest
+from ed_utils.decorators import number
+
+import numpy as np
+
+from mountain import Mountain
+from mountain_manager import MountainManager
+from mountain_registry import MountainRegistry
+from serialize import deserialize
+
+
+class TestMountainRegistry(unittest.TestCase):
+
+    def make_manager(self):
+        rng = random.Random(5)
+        mm = MountainManager()
+        for i in range(60):
+            mm.add_mountain(Mountain(f"m{i}", rng.randint(1, 6), rng.randint(1, 40)))
+        return mm
+
+    @number("15.1")
+    def test_from_manager_and_trail(self):
+        mm = self.make_manager()
+        registry = MountainRegistry.from_manager(mm)
+        groups = mm.group_by_difficulty()
+        self.assertEqual(list(registry.mountains), [m for group in groups for m in group])
+        self.assertEqual(len(registry), 60)
+        self.assertIs(registry["m7"], mm.mountain_with_name("m7"))
+        self.assertIn("m7", registry)
+        self.assertNotIn("m60", registry)
+        self.assertRaises(KeyError, lambda: registry["m60"])
+
+        with open("stores/basic.json") as f:
+            trail = deserialize(json.loads(f.read()))
+        registry = MountainRegistry.from_trail(trail)
+        self.assertEqual(list(registry.mountains), trail.collect_all_mountains())
+
+        empty = MountainRegistry([])
+        self.assertEqual(len(empty), 0)
+        self.assertEqual(empty.group_by_difficulty()[1], [])
+        self.assertEqual(len(empty.difficulty_histogram()[1]), 0)
+
+    @number("15.2")
+    def test_groups_histograms_filters(self):
+        mm = self.make_manager()
+        registry = MountainRegistry.from_manager(mm)
+        groups = mm.group_by_difficulty()
+
+        levels, rows = registry.group_by_difficulty()
+        self.assertEqual(list(levels), [group[0].difficulty_level for group in groups])
+        self.assertEqual([list(registry.mountains[r]) for r in rows], groups)
+
+        levels, counts, totals = registry.length_by_difficulty()
+        self.assertEqual(list(counts), [len(group) for group in groups])
+        self.assertEqual(list(totals), [sum(m.length for m in group) for group in groups])
+
+        levels, counts = registry.difficulty_histogram()
+        self.assertEqual(list(levels), list(range(levels[0], levels[-1] + 1)))
+        for level, count in zip(levels, counts):
+            self.assertEqual(count, len(mm.mountains_with_difficulty(level)))
+
+        counts, edges = registry.length_histogram(np.array([0, 10, 20, 41]))
+        self.assertEqual(list(counts), [
+            len(mm.mountains_with_length(0, 9)),
+            len(mm.mountains_with_length(10, 19)),
+            len(mm.mountains_with_length(20, 40)),
+        ])
+
+        found = registry.filter(min_length=5, max_length=25)
+        self.assertEqual(sorted(found, key=lambda m: (m.length, m.name)), mm.mountains_with_length(5, 25))
+        found = registry.filter(min_length=5, max_length=25, min_difficulty=2, max_difficulty=3)
+        self.assertEqual(
+            sorted(found, key=lambda m: (m.length, m.name)),
+            [m for m in mm.mountains_with_length(5, 25) if 2 <= m.difficulty_level <= 3],
+        )
+        self.assertEqual(registry.mask().sum(), 60)
@@ -0,0 +1,83 @@
+import unittest
+from ed_utils.decorators import number
+
+from algorithms.binary_search import binary_search, binary_search_many
+from algorithms.mergesort import merge, merge_keyed, merge_many, merge_many_keyed, mergesort
+from mountain import Mountain
+
+class TestSorting(unittest.TestCase):
+
+    @number("8.1")
+    def test_mergesort(self):
+        self.assertEqual(mergesort([]), [])
+        self.assertEqual(mergesort([3]), [3])
+        self.assertEqual(mergesort([5, 1, 4, 2, 3]), [1, 2, 3, 4, 5])
+        # Long runs in either direction, and several runs glued together.
+        self.assertEqual(mergesort(list(range(100, 0, -1))), list(range(1, 101)))
+        l = list(range(50)) + list(range(25)) + list(range(75, 40, -1))
+        self.assertEqual(mergesort(l), sorted(l))
+
+    @number("8.2")
+    def test_mergesort_key_stable(self):
+        m1 = Mountain("m1", 2, 2)
+        m2 = Mountain("m2", 2, 9)
+        m3 = Mountain("m3", 3, 6)
+        m4 = Mountain("m4", 3, 1)
+        m5 = Mountain("m5", 4, 6)
+
+        calls = []
+        def difficulty(m):
+            calls.append(m)
+            return m.difficulty_level
+
+        res = mergesort([m5, m3, m1, m4, m2], key=difficulty)
+        self.assertEqual([m.name for m in res], ["m1", "m2", "m3", "m4", "m5"])
+        self.assertEqual(len(calls), 5)
+        # Equal keys keep their input order.
+        res = mergesort([m3, m4, m2, m1], key=lambda m: m.difficulty_level)
+        self.assertEqual([m.name for m in res], ["m2", "m1", "m3", "m4"])
+        self.assertEqual(merge([m2, m4], [m1, m3], key=lambda m: m.difficulty_level), [m2, m1, m4, m3])
+
+    @number("8.3")
+    def test_binary_search(self):
+        l = [1, 3, 3, 3, 5, 8, 13]
+        self.assertEqual([binary_search(l, x) for x in [0, 1, 2, 3, 4, 13, 14]], [0, 0, 1, 1, 4, 6, 7])
+        self.assertEqual(binary_search([], 5), 0)
+        keys = [(1, "m4"), (2, "m1"), (6, "m3"), (6, "m5"), (9, "m2")]
+        self.assertEqual(binary_search(keys, (6, "m5")), 3)
+        self.assertEqual(binary_search(keys, (6, "m4")), 3)
+
+    @number("8.4")
+    def test_binary_search_many(self):
+        l = list(range(0, 200, 2))
+        items = [-1, 0, 0, 1, 7, 8, 100, 101, 150, 198, 199, 500]
+        self.assertEqual(binary_search_many(l, items), [binary_search(l, x) for x in items])
+        self.assertEqual(binary_search_many([], [1, 2]), [0, 0])
+        self.assertEqual(binary_search_many(l, []), [])
+
+    @number("8.5")
+    def test_mountain_key(self):
+        from copy import copy
+        from mountain import mountain_key
+        mountains = [Mountain("b", 1, 5), Mountain("a", 2, 5), Mountain("c", 3, 1), Mountain("d", 0, 9)]
+        self.assertEqual(mergesort(mountains, key=mountain_key), mergesort(mountains))
+        self.assertEqual(mountain_key(mountains[0]), (5, "b"))
+        self.assertFalse(hasattr(mountains[0], "__dict__"))
+        m = copy(mountains[0])
+        m.length = 2
+        self.assertEqual(mountain_key(m), (2, "b"))
+        self.assertEqual(mountains[0].length, 5)
+
+    @number("8.6")
+    def test_merge_keyed(self):
+        items1, items2, items3 = ["a", "c", "e"], ["b", "c2", "f"], ["d"]
+        keys1, keys2, keys3 = [1, 3, 5], [2, 3, 6], [4]
+        # Ties keep the earlier list first, and the keys come out merged next to the items.
+        self.assertEqual(merge_keyed(keys1, items1, keys2, items2), ([1, 2, 3, 3, 5, 6], ["a", "b", "c", "c2", "e", "f"]))
+        self.assertEqual(merge_keyed([], [], keys3, items3), ([4], ["d"]))
+        self.assertEqual(
+            merge_many_keyed([keys1, [], keys2, keys3], [items1, [], items2, items3]),
+            ([1, 2, 3, 3, 4, 5, 6], ["a", "b", "c", "c2", "d", "e", "f"]),
+        )
+        self.assertEqual(merge_many([[1, 4], [2, 3], [], [0]]), [0, 1, 2, 3, 4])
+        self.assertEqual(merge_many_keyed([], []), ([], []))
@@ -0,0 +1,75 @@
+import contextlib
+import io
+import json
+import unittest
+from ed_utils.decorators import number
+
+from serialize import parse_json, read_store, serialize
+from trail_generator import generate_trail, main, trail_stats, write_store
+
+
+class TestTrailGenerator(unittest.TestCase):
+
+    @number("12.1")
+    def test_generate(self):
+        trail = generate_trail(20000, seed=3, split_probability=0.2, max_nesting=3, prefixes=("peak", "hill"), prefix_weights=(3, 1))
+        stats = trail_stats(trail)
+        self.assertEqual(stats["mountains"], 20000)
+        self.assertGreater(stats["splits"], 0)
+        self.assertLessEqual(stats["nesting"], 3)
+
+        # Reproducible from the seed.
+        again = generate_trail(20000, seed=3, split_probability=0.2, max_nesting=3, prefixes=("peak", "hill"), prefix_weights=(3, 1))
+        out, out_again = io.StringIO(), io.StringIO()
+        write_store(trail, out)
+        write_store(again, out_again)
+        self.assertEqual(out.getvalue(), out_again.getvalue())
+        self.assertNotEqual(out.getvalue()[:2000], self._store(generate_trail(20000, seed=4))[:2000])
+
+        self.assertEqual(generate_trail(0).store, None)
+        with self.assertRaises(ValueError):
+            generate_trail(10, split_probability=1)
+
+    @number("12.2")
+    def test_write_store_matches_serialize(self):
+        for seed in range(5):
+            trail = generate_trail(200, seed=seed, split_probability=0.3, mean_branch_length=3)
+            self.assertEqual(self._store(trail), serialize(trail))
+
+    @number("12.3")
+    def test_read_store(self):
+        # Far more mountains in a row than json.loads() and a recursive reader can take.
+        for split_probability in [0, 0.05]:
+            trail = generate_trail(5000, seed=1, split_probability=split_probability)
+            store = self._store(trail)
+            self.assertEqual(self._store(read_store(io.StringIO(store))), store)
+
+        for text in ['{}', '[]', ' [ {"k" : "v"} , [ ] ] ', '"s"', '-1.5e3', 'null',
+                     '{"a": [1, 2.5, "x\\"y", true, false, null, {}, []], "b]": {"c": "}{"}}']:
+            self.assertEqual(parse_json(text), json.loads(text))
+        for text in ['', '{', ']', '[1,]', '[1 2]', '{"a" 1}', '{a: 1}', '{"a": 1,}', '1 2', '{"a": {"b": 1,}}']:
+            with self.assertRaises(json.JSONDecodeError):
+                parse_json(text)
+
+    @number("12.4")
+    def test_cli_errors(self):
+        for argv in [["-1"], ["10", "--split-probability", "1"], ["10", "--max-nesting", "-1"],
+                     ["10", "--mean-branch-length", "0"], ["10", "--name-pattern", "{x}"],
+                     ["10", "--prefix", "a:0"], ["10", "--prefix", "a:x"]]:
+            stderr = io.StringIO()
+            with self.assertRaises(SystemExit) as raised, contextlib.redirect_stderr(stderr):
+                main(argv)
+            # A usage error, not a traceback.
+            self.assertEqual(raised.exception.code, 2)
+            self.assertIn("error:", stderr.getvalue())
+
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout):
+            main(["10", "--prefix", "a:2", "--prefix", "b"])
+        self.assertEqual(stdout.getvalue(), "mountains: 10, splits: 0, nesting: 0\n")
+
+    @staticmethod
+    def _store(trail):
+        out = io.StringIO()
+        write_store(trail, out)
+        return out.getvalue()
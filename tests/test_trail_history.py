@@ -0,0 +1,89 @@
+import unittest
+from ed_utils.decorators import number
+
+from constants import DrawMode
+from draw_trails import HeadlessTrailDraw
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_history import TrailHistory, edit_at
+
+
+class TestTrailHistory(unittest.TestCase):
+
+    def make_trail(self):
+        a, b, c = (Mountain(letter, 5, 5) for letter in "abc")
+        split = TrailSplit(
+            Trail(TrailSeries(b, Trail(None))),
+            Trail(None),
+            Trail(TrailSeries(c, Trail(None)))
+        )
+        return Trail(TrailSeries(a, Trail(split))), (a, b, c)
+
+    @number("10.1")
+    def test_edit_at(self):
+        t, (a, b, c) = self.make_trail()
+        split = t.store.following.store
+        d = Mountain("d", 1, 1)
+
+        new = edit_at(t, ("following", "path_top"), "add_mountain_after", d)
+        # The old trail is unchanged.
+        self.assertIs(t.store.following.store, split)
+        self.assertEqual(split.path_top.store.following.store, None)
+        # The new trail has the edit, and shares everything off the edited path.
+        new_split = new.store.following.store
+        self.assertIsNot(new_split, split)
+        self.assertEqual(new_split.path_top.store.following.store.mountain, d)
+        self.assertIs(new_split.path_bottom, split.path_bottom)
+        self.assertIs(new_split.path_follow, split.path_follow)
+        self.assertIs(new.store.mountain, a)
+
+        # Editing an empty trail uses the Trail method.
+        new = edit_at(new, ("following", "path_bottom"), "add_mountain_before", d)
+        self.assertEqual(new.store.following.store.path_bottom.store.mountain, d)
+
+        # Editing at the root.
+        new = edit_at(new, (), "remove_mountain")
+        self.assertIsInstance(new.store, TrailSplit)
+        self.assertIsInstance(t.store, TrailSeries)
+
+    @number("10.2")
+    def test_undo_redo(self):
+        t, (a, b, c) = self.make_trail()
+        history = TrailHistory(t)
+        self.assertFalse(history.can_undo())
+        self.assertRaises(ValueError, history.undo)
+
+        v1 = history.apply(("following",), "remove_branch")
+        v2 = history.apply((), "add_empty_branch_after")
+        self.assertIs(history.current, v2)
+        self.assertIs(history.undo(), v1)
+        self.assertIs(history.undo(), t)
+        self.assertFalse(history.can_undo())
+        self.assertIs(history.redo(), v1)
+
+        # A new edit forgets what could be redone.
+        v3 = history.apply((), "remove_mountain")
+        self.assertFalse(history.can_redo())
+        self.assertEqual(v3.store.mountain, c)
+        self.assertIs(history.undo(), v1)
+
+    @number("10.3")
+    def test_edit_mountain(self):
+        t, (a, b, c) = self.make_trail()
+        draw = HeadlessTrailDraw(t, history=TrailHistory(t))
+        draw.draw_in_box(700, 700, 0, 0)
+        record = next(record for cell in draw.hit_grid.cells.values() for *_, record in cell
+                      if record.kind == "mountain" and record.node.mountain is b)
+        point = (record.box.x + record.box.w / 2, record.box.y + record.box.h / 2)
+        box, action, cur = draw.box_and_action(point, DrawMode.EDIT)
+        self.assertIs(cur.mountain, b)
+
+        # Editing swaps in a new mountain, in a new version, and leaves the old one alone.
+        d = Mountain("d", 1, 1)
+        action(d)
+        self.assertEqual(b, Mountain("b", 5, 5))
+        self.assertEqual(draw.trail.collect_all_mountains(), [a, d, c])
+        draw.undo()
+        self.assertIs(draw.trail, t)
+        self.assertEqual(t.collect_all_mountains(), [a, b, c])
@@ -0,0 +1,77 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_index import TrailIndex
+
+
+class TestTrailIndex(unittest.TestCase):
+
+    def make_trail(self):
+        a, b, c, d = (Mountain(letter, 5, 5) for letter in "abcd")
+        split = TrailSplit(
+            Trail(TrailSeries(b, Trail(TrailSeries(d, Trail(None))))),
+            Trail(TrailSeries(d, Trail(None))),
+            Trail(TrailSeries(c, Trail(None)))
+        )
+        return Trail(TrailSeries(a, Trail(split))), split, (a, b, c, d)
+
+    def assert_matches_rebuild(self, trail, index):
+        """The incrementally maintained index must equal one built from scratch."""
+        fresh = TrailIndex(trail)
+        self.assertEqual(
+            {key: parent for key, (_, parent) in index.parents.items()},
+            {key: parent for key, (_, parent) in fresh.parents.items()},
+        )
+        self.assertEqual(
+            {key: set(nodes) for key, (_, nodes) in index.occurrences.items()},
+            {key: set(nodes) for key, (_, nodes) in fresh.occurrences.items()},
+        )
+
+    @number("9.1")
+    def test_locate(self):
+        t, split, (a, b, c, d) = self.make_trail()
+        index = TrailIndex(t)
+        self.assertEqual(index.locate(a), [(t.store, t)])
+        self.assertEqual(len(index.locate(d)), 2)
+        self.assertEqual(index.locate(Mountain("a", 5, 5)), [])
+        for node, parent in index.locate(d):
+            self.assertIs(parent.store, node)
+            self.assertIs(node.mountain, d)
+
+    @number("9.2")
+    def test_edits(self):
+        t, split, (a, b, c, d) = self.make_trail()
+        index = TrailIndex(t)
+        e, f = Mountain("e", 1, 1), Mountain("f", 1, 1)
+
+        node, parent = index.locate(a)[0]
+        index.set_store(parent, node.add_mountain_after(e))
+        self.assert_matches_rebuild(t, index)
+        node, parent = index.locate(e)[0]
+        index.set_store(parent, node.add_mountain_before(f))
+        self.assert_matches_rebuild(t, index)
+        node, parent = index.locate(b)[0]
+        index.set_store(parent, node.add_empty_branch_before())
+        self.assert_matches_rebuild(t, index)
+        node, parent = index.locate(c)[0]
+        index.set_store(parent, node.add_empty_branch_after())
+        self.assert_matches_rebuild(t, index)
+
+        # Removing d takes out both occurrences.
+        self.assertEqual(index.remove_mountain(d), 2)
+        self.assertNotIn(d, index)
+        self.assert_matches_rebuild(t, index)
+
+        # Removing the split with b in it unindexes everything inside, and keeps what follows it.
+        index.set_store(index.parent(split), split.remove_branch())
+        self.assertNotIn(b, index)
+        self.assertIn(c, index)
+        self.assert_matches_rebuild(t, index)
+
+        holder = type("Holder", (), {})()
+        holder.trail = t
+        index.set_trail(holder, "trail", t.add_empty_branch_before())
+        self.assertNotIn(a, index)
+        self.assert_matches_rebuild(holder.trail, index)
@@ -57,3 +57,19 @@ class TestTrailMethods(unittest.TestCase):
             self.top_bot, self.top_top, self.top_mid,
             self.bot_one, self.bot_two, self.final
         ])))
+
+    @number("7.2")
+    def test_collect_long_trail(self):
+        self.load_example()
+        # Top paths first, then what follows them, then the bottom paths. The stored objects are returned.
+        res = self.trail.collect_all_mountains()
+        self.assertEqual([m.name for m in res], ["top-top", "top-mid", "final", "top-bot", "bot-one", "bot-two"])
+        self.assertIs(res[0], self.top_top)
+        self.assertIs(res[2], self.final)
+
+        # Far longer than the recursion limit, and equal mountains are only collected once.
+        trail = Trail(None)
+        for i in range(10000):
+            trail = Trail(TrailSeries(Mountain(f"m{i % 5000}", 1, 1), trail))
+        res = trail.collect_all_mountains()
+        self.assertEqual([m.name for m in res], [f"m{i}" for i in range(4999, -1, -1)])
@@ -97,6 +97,26 @@ class TrailSeries:
         """
         return self.following.store
 
+    def replace_mountain(self, mountain: Mountain) -> TrailStore:
+        """
+           Explain:
+           - Replaces the mountain at the beginning of this series, keeping the trail that follows it.
+
+           Args:
+           - mountain, which is a Mountain instance that involve three arguments (String name, Integer difficult_level, Integer length).
+
+           Raises:
+           - None
+
+           Returns:
+           - result: A TrailSeries instance with two arguments (mountain and the following Trail instance).
+
+           Complexity:
+           - Worst case: O(1), return statement
+           - Best case: O(1), return statement
+        """
+        return TrailSeries(mountain, self.following)
+
     def add_mountain_before(self, mountain: Mountain) -> TrailStore:
         """
            Explain:
@@ -309,29 +329,48 @@ class Trail:
         return None
 
     def collect_all_mountains(self) -> list[Mountain]:
-        import copy
-        all_mountains = []
-
-        def traverse(trail, current_path, current_k, follow_stack=None):
-            follow_stack_copy = copy.deepcopy(follow_stack)
-            current_path_copy = copy.deepcopy(current_path)
-            if trail is None:
-                if not follow_stack_copy.is_empty():
-                    traverse(follow_stack_copy.pop(), current_path_copy, current_k, follow_stack_copy)
-                return  # not necessary, but makes it clear that this is the end of the path
-            elif isinstance(trail, TrailSeries):
-                # this code below differs all_mountains() from length_k_paths()
-                if trail.mountain not in all_mountains:
-                    all_mountains.append(trail.mountain)
+        """
+           Explain:
+           - Return every mountain on the trail once, in the order the paths are walked: the top path of a split
+             first, then whatever follows it, and the bottom paths last (innermost split first). Mountains equal to
+             one already collected are skipped.
 
-                current_path_copy.append(trail.mountain)
-                traverse(trail.following.store, current_path_copy, current_k + 1, follow_stack_copy)
-            elif isinstance(trail, TrailSplit):
-                follow_stack_copy.push(trail.path_follow.store)
-                traverse(trail.path_top.store, current_path_copy, current_k, follow_stack_copy)
-                traverse(trail.path_bottom.store, current_path_copy, current_k, follow_stack_copy)
+           - Each (sub) trail is walked at most once. The bottom path of a split is kept on a stack with the paths
+             that follow it, and its walk stops when it reaches a trail that has already been walked, since
+             everything after that trail has been collected too.
+           - follows is a chain of (store, rest) pairs shared by the top and the bottom of a split, so pushing a
+             follow path is O(1) and never copies the stack.
 
-        traverse(self.store, [], 0, LinkedStack())
+           Complexity:
+           - Best case: O(1) when the trail is empty.
+           - Worst case: O(N), where N is the number of mountains plus splits. Every store is walked once, and the
+             equality check is a set lookup on (name, difficulty_level, length).
+        """
+        all_mountains = []
+        seen = set()
+        walked = set()
+        pending = [(self.store, None)]
+        while pending:
+            trail, follows = pending.pop()
+            while True:
+                if trail is None:
+                    if follows is None:
+                        break
+                    trail, follows = follows
+                    continue
+                if id(trail) in walked:
+                    break
+                walked.add(id(trail))
+                if isinstance(trail, TrailSeries):
+                    key = (trail.mountain.name, trail.mountain.difficulty_level, trail.mountain.length)
+                    if key not in seen:
+                        seen.add(key)
+                        all_mountains.append(trail.mountain)
+                    trail = trail.following.store
+                else:
+                    follows = (trail.path_follow.store, follows)
+                    pending.append((trail.path_bottom.store, follows))
+                    trail = trail.path_top.store
         return all_mountains
 
     def length_k_paths(self, k) -> list[list[Mountain]]:  # Input to this should not exceed k > 50, at most 5 branches.
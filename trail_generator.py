@@ -0,0 +1,187 @@
+"""
+Generate large random trails from a seed, for load testing.
+
+Run from the repository root, e.g.:
+    python -m trail_generator 100000 --seed 1 --split-probability 0.05 --prefix peak --prefix hill -o stores/large.json
+
+Stores are written with serialize.write_store(), and main.py reads them with serialize.read_store(); neither recurses,
+so the app can open the example above (python main.py large.json). Reading and indexing 100000 mountains takes
+several seconds on its worker thread, during which the trail cannot be edited.
+"""
+from __future__ import annotations
+
+import argparse
+import math
+import random
+from typing import Sequence
+
+from mountain import Mountain
+from serialize import write_store
+from trail import Trail, TrailSeries, TrailSplit
+
+# Trail.length_k_paths() supports at most 5 branches on a path.
+MAX_NESTING = 5
+
+
+def generate_trail(
+    mountains: int,
+    seed: int = 0,
+    split_probability: float = 0.1,
+    max_nesting: int = MAX_NESTING,
+    mean_branch_length: float = 10,
+    name_pattern: str = "{prefix}{i}",
+    prefixes: Sequence[str] = ("m",),
+    prefix_weights: Sequence[float] | None = None,
+    difficulties: tuple[int, int] = (1, 10),
+    lengths: tuple[int, int] = (1, 1000),
+) -> Trail:
+    """
+     Explain:
+       - Return a random trail with exactly the given number of mountains. The same arguments always give the same
+         trail.
+       - Walking along a path, each step is a split with probability split_probability, unless the path is already
+         nested in max_nesting splits, and a mountain otherwise. The top and bottom paths of a split get a random
+         number of mountains each, exponentially distributed with mean mean_branch_length.
+       - Mountain i (counting from 0, in generation order) is named name_pattern.format(prefix=..., i=i), with the
+         prefix picked from prefixes (by prefix_weights, if given). Names are therefore unique as long as the
+         pattern uses i. Difficulty and length are uniform in the given inclusive ranges.
+       - Paths are built as lists and folded into Trail objects from the end, so only the nesting of splits (at most
+         max_nesting) uses recursion, never the length of a path.
+
+     Args:
+       - mountains: number of mountains in the trail
+       - seed: random seed
+       - split_probability: chance of a split at each step, less than 1
+       - max_nesting: maximum number of splits enclosing any mountain
+       - mean_branch_length: mean number of mountains on the top and on the bottom path of each split
+       - name_pattern, prefixes, prefix_weights: how mountains are named, see above
+       - difficulties, lengths: inclusive ranges of the mountain attributes
+
+     Raises:
+       - ValueError: If mountains is negative, or split_probability is not in [0, 1).
+
+     Complexity: O(N), where N is the number of mountains plus splits. Best case and worst case are the same.
+    """
+    if mountains < 0:
+        raise ValueError("mountains must not be negative")
+    if not 0 <= split_probability < 1:
+        raise ValueError("split_probability must be in [0, 1)")
+    rng = random.Random(seed)
+    counter = [0]
+
+    def make_mountain() -> Mountain:
+        prefix = rng.choices(prefixes, prefix_weights)[0]
+        mountain = Mountain(
+            name_pattern.format(prefix=prefix, i=counter[0]),
+            rng.randint(*difficulties),
+            rng.randint(*lengths),
+        )
+        counter[0] += 1
+        return mountain
+
+    def make_path(count: int, depth: int) -> Trail:
+        items = []
+        while count > 0:
+            if depth < max_nesting and rng.random() < split_probability:
+                top = min(count, int(rng.expovariate(1 / mean_branch_length)))
+                bottom = min(count - top, int(rng.expovariate(1 / mean_branch_length)))
+                count -= top + bottom
+                items.append((make_path(top, depth + 1), make_path(bottom, depth + 1)))
+            else:
+                items.append(make_mountain())
+                count -= 1
+        trail = Trail(None)
+        for item in reversed(items):
+            if isinstance(item, Mountain):
+                trail = Trail(TrailSeries(item, trail))
+            else:
+                trail = Trail(TrailSplit(item[0], item[1], trail))
+        return trail
+
+    return make_path(mountains, 0)
+
+
+def trail_stats(trail: Trail) -> dict[str, int]:
+    """
+     Explain:
+       - Count the mountains and splits in the trail, and the deepest nesting of splits around any node.
+
+     Complexity: O(N), where N is the number of nodes in the trail. Best case and worst case are the same.
+    """
+    stats = {"mountains": 0, "splits": 0, "nesting": 0}
+    stack = [(trail, 0)]
+    while stack:
+        trail, depth = stack.pop()
+        if trail.store is None:
+            continue
+        stats["nesting"] = max(stats["nesting"], depth)
+        if isinstance(trail.store, TrailSeries):
+            stats["mountains"] += 1
+            stack.append((trail.store.following, depth))
+        else:
+            stats["splits"] += 1
+            stack.append((trail.store.path_top, depth + 1))
+            stack.append((trail.store.path_bottom, depth + 1))
+            stack.append((trail.store.path_follow, depth))
+    return stats
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    p = argparse.ArgumentParser(description="Generate a random trail and write it as a store file.")
+    p.add_argument("mountains", type=int, help="Number of mountains in the trail.")
+    p.add_argument("--seed", type=int, default=0, help="Random seed. The same arguments always give the same trail.")
+    p.add_argument("--split-probability", type=float, default=0.1, help="Chance of a split at each step of a path.")
+    p.add_argument("--max-nesting", type=int, default=MAX_NESTING, help="Maximum number of splits around a mountain.")
+    p.add_argument("--mean-branch-length", type=float, default=10, help="Mean number of mountains on a split path.")
+    p.add_argument("--name-pattern", default="{prefix}{i}", help="Format of mountain names, using {prefix} and {i}.")
+    p.add_argument(
+        "--prefix",
+        action="append",
+        help="A name prefix, optionally weighted as PREFIX:WEIGHT. May be repeated. Default: m.",
+    )
+    p.add_argument("-o", "--output", help="Store file to write. Without it, only statistics are printed.")
+    args = p.parse_args(argv)
+    # Report bad arguments as usage errors, rather than as tracebacks from generate_trail().
+    if args.mountains < 0:
+        p.error("mountains must not be negative")
+    if not 0 <= args.split_probability < 1:
+        p.error("--split-probability must be at least 0 and less than 1")
+    if args.max_nesting < 0:
+        p.error("--max-nesting must not be negative")
+    if not args.mean_branch_length > 0:
+        p.error("--mean-branch-length must be positive")
+    try:
+        args.name_pattern.format(prefix="", i=0)
+    except (KeyError, IndexError, ValueError):
+        p.error("--name-pattern may only use {prefix} and {i}")
+
+    prefixes, weights = [], []
+    for spec in args.prefix or ["m"]:
+        prefix, _, weight = spec.partition(":")
+        try:
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            p.error(f"--prefix {spec}: the weight must be a number")
+        if not 0 < weight < math.inf:
+            p.error(f"--prefix {spec}: the weight must be positive")
+        prefixes.append(prefix)
+        weights.append(weight)
+
+    trail = generate_trail(
+        args.mountains,
+        seed=args.seed,
+        split_probability=args.split_probability,
+        max_nesting=args.max_nesting,
+        mean_branch_length=args.mean_branch_length,
+        name_pattern=args.name_pattern,
+        prefixes=prefixes,
+        prefix_weights=weights,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            write_store(trail, f)
+    print(", ".join(f"{key}: {value}" for key, value in trail_stats(trail).items()))
+
+
+if __name__ == "__main__":
+    main()
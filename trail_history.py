@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import copy
+
+from data_structures.linked_stack import LinkedStack
+from trail import Trail
+
+# A location in a trail: the attributes to follow from the root Trail to reach a Trail inside it, each one of
+# "following" (from a TrailSeries) or "path_top", "path_bottom", "path_follow" (from a TrailSplit).
+TrailPath = tuple[str, ...]
+
+
+def edit_at(trail: Trail, path: TrailPath, method: str, *args) -> Trail:
+    """
+     Explain:
+       - Return a new root with an edit applied to the Trail at path, leaving trail itself unchanged.
+       - If that Trail is empty, the Trail method is called (e.g. Trail.add_mountain_before()); otherwise the method
+         of its store is (e.g. TrailSeries.remove_mountain()). Both already return new objects that reuse everything
+         below the edit.
+       - Every node from the root down to the edit is copied with its one changed child replaced (path copying), so
+         all other nodes are shared between the old and the new trail.
+
+     Args:
+       - trail: root of the trail to edit
+       - path: location of the Trail to edit, see TrailPath
+       - method: name of the edit method to call
+       - args: arguments to the edit method, e.g. the mountain to add
+
+     Complexity: O(D), where D is the length of path. Best case and worst case are the same.
+    """
+    trails = [trail]
+    for attribute in path:
+        trails.append(getattr(trails[-1].store, attribute))
+    target = trails.pop()
+    if target.store is None:
+        new_trail = getattr(target, method)(*args)
+    else:
+        new_trail = Trail(getattr(target.store, method)(*args))
+    for attribute in reversed(path):
+        node = copy.copy(trails.pop().store)
+        setattr(node, attribute, new_trail)
+        new_trail = Trail(node)
+    return new_trail
+
+
+class TrailHistory:
+    """
+    TrailHistory keeps a trail as a sequence of immutable versions, with undo and redo.
+
+    Edits never change an existing version: apply() builds a new root with edit_at(), which shares every node off the
+    edited path with the previous version. Each version in the undo and redo stacks therefore only costs O(depth)
+    extra memory, not a copy of the trail.
+
+    Mountains are shared between versions too, so changing a Mountain's attributes in place is not recorded.
+    """
+
+    def __init__(self, trail: Trail) -> None:
+        """
+         Explain:
+           - Start the history with trail as the current version, and nothing to undo or redo.
+
+         Complexity: O(1)
+        """
+        self.current = trail
+        self.undo_stack = LinkedStack()
+        self.redo_stack = LinkedStack()
+
+    def apply(self, path: TrailPath, method: str, *args) -> Trail:
+        """
+         Explain:
+           - Make a new version with an edit applied, see edit_at(). The current version can be undone to, and
+             anything that could be redone is forgotten.
+
+         Returns:
+           - the new current version
+
+         Complexity: O(D), where D is the length of path. Best case and worst case are the same.
+        """
+        new_trail = edit_at(self.current, path, method, *args)
+        self.undo_stack.push(self.current)
+        self.redo_stack.clear()
+        self.current = new_trail
+        return new_trail
+
+    def can_undo(self) -> bool:
+        return not self.undo_stack.is_empty()
+
+    def can_redo(self) -> bool:
+        return not self.redo_stack.is_empty()
+
+    def undo(self) -> Trail:
+        """
+         Explain:
+           - Go back to the version before the last edit.
+
+         Raises:
+           - ValueError: If there is nothing to undo.
+
+         Returns:
+           - the new current version
+
+         Complexity: O(1)
+        """
+        if not self.can_undo():
+            raise ValueError("Nothing to undo")
+        self.redo_stack.push(self.current)
+        self.current = self.undo_stack.pop()
+        return self.current
+
+    def redo(self) -> Trail:
+        """
+         Explain:
+           - Go forward to the version the last undo() left.
+
+         Raises:
+           - ValueError: If there is nothing to redo.
+
+         Returns:
+           - the new current version
+
+         Complexity: O(1)
+        """
+        if not self.can_redo():
+            raise ValueError("Nothing to redo")
+        self.undo_stack.push(self.current)
+        self.current = self.redo_stack.pop()
+        return self.current
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+from data_structures.linked_stack import LinkedStack
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+
+
+class TrailIndex:
+    """
+    TrailIndex is a reverse index from each mountain to the TrailSeries nodes it appears in, and from each node to
+    its parent, the Trail whose store is that node.
+
+    The trail edit methods (TrailSeries.remove_mountain(), TrailSplit.remove_branch(), ...) do not change the trail:
+    they return a new store, which the caller then puts in place of the old one. To keep the index in sync, put it in
+    place through set_store() or set_trail() instead of assigning it directly. Only the nodes around the edit are
+    visited, so an edit costs O(1) plus the number of nodes it adds or removes.
+
+    Mountains are unhashable and may be edited in place, so they are indexed by identity (id()). The same Mountain
+    object may appear in several nodes.
+    """
+
+    def __init__(self, trail: Trail) -> None:
+        """
+         Explain:
+           - Index every node reachable from the trail.
+           - self.parents maps id(node) to a (node, parent Trail) pair, for every TrailSeries and TrailSplit.
+           - self.occurrences maps id(mountain) to a (mountain, nodes) pair, where nodes maps id(node) to each
+             TrailSeries holding that mountain.
+
+         Complexity: O(N), where N is the number of nodes in the trail. Best case and worst case are the same.
+        """
+        self.parents = {}
+        self.occurrences = {}
+        self._link(trail, set())
+
+    def __contains__(self, mountain: Mountain) -> bool:
+        """
+         Explain:
+           - Checks whether the mountain (this very object) appears in the trail.
+
+         Complexity: O(1)
+        """
+        return id(mountain) in self.occurrences
+
+    def locate(self, mountain: Mountain) -> list[tuple[TrailSeries, Trail]]:
+        """
+         Explain:
+           - Return a (node, parent) pair for every place the mountain appears in the trail, where node is the
+             TrailSeries holding it and parent the Trail whose store is node. Empty if it does not appear.
+
+         Complexity: O(K), where K is the number of occurrences. Best case and worst case are the same.
+        """
+        if id(mountain) not in self.occurrences:
+            return []
+        return [(node, self.parents[id(node)][1]) for node in self.occurrences[id(mountain)][1].values()]
+
+    def parent(self, node: TrailStore) -> Trail:
+        """
+         Explain:
+           - Return the Trail whose store is node.
+
+         Raises:
+           - KeyError: If the node is not in the trail.
+
+         Complexity: O(1)
+        """
+        return self.parents[id(node)][1]
+
+    def set_store(self, trail: Trail, store: TrailStore) -> None:
+        """
+         Explain:
+           - Set trail.store to the result of an edit, e.g. set_store(parent, node.remove_mountain()), and update
+             the index around it.
+
+         Args:
+           - trail: Trail in the indexed trail
+           - store: the new store for it
+
+         Complexity: O(A + R), where A and R are the number of nodes added and removed by the edit (O(1) for every
+                     edit method of TrailSeries).
+        """
+        old_store = trail.store
+        trail.store = store
+        self._relink(trail, old_store)
+
+    def set_trail(self, parent: object, attribute: str, trail: Trail) -> None:
+        """
+         Explain:
+           - Replace a whole Trail, i.e. setattr(parent, attribute, trail), as done with the result of the Trail
+             edit methods. parent is a node in the indexed trail, or any object holding its root.
+
+         Complexity: O(A + R), see set_store().
+        """
+        old_trail = getattr(parent, attribute)
+        setattr(parent, attribute, trail)
+        self._relink(trail, old_trail.store)
+
+    def remove_mountain(self, mountain: Mountain) -> int:
+        """
+         Explain:
+           - Remove every occurrence of the mountain from the trail with TrailSeries.remove_mountain().
+
+         Returns:
+           - count: number of occurrences removed
+
+         Complexity: O(K), where K is the number of occurrences. Best case and worst case are the same.
+        """
+        found = self.locate(mountain)
+        for node, parent in found:
+            self.set_store(parent, node.remove_mountain())
+        return len(found)
+
+    def _relink(self, trail: Trail, old_store: TrailStore) -> None:
+        """
+         Explain:
+           - Index the nodes that trail.store now leads to, then unindex the nodes old_store led to that are no
+             longer in the trail.
+           - The edit methods reuse the Trail objects below the edit, so both walks stop at the first node that is
+             still registered under the same parent: nothing below it changed.
+
+         Complexity: O(A + R), where A is the number of nodes added and R the number removed.
+        """
+        kept = set()
+        self._link(trail, kept)
+        stack = LinkedStack()
+        stack.push(old_store)
+        while not stack.is_empty():
+            node = stack.pop()
+            if node is None or id(node) in kept:
+                continue
+            self._unregister(node)
+            for child in self._children(node):
+                stack.push(child.store)
+
+    def _link(self, trail: Trail, kept: set[int]) -> None:
+        """
+         Explain:
+           - Register every node below trail whose parent is new, adding the id of every node seen to kept. Stops
+             descending at nodes already registered under the same parent.
+
+         Complexity: O(A), where A is the number of nodes registered.
+        """
+        stack = LinkedStack()
+        stack.push(trail)
+        while not stack.is_empty():
+            parent = stack.pop()
+            node = parent.store
+            if node is None:
+                continue
+            kept.add(id(node))
+            registered = self.parents.get(id(node))
+            if registered is not None and registered[1] is parent:
+                continue
+            self._register(node, parent)
+            for child in self._children(node):
+                stack.push(child)
+
+    def _register(self, node: TrailStore, parent: Trail) -> None:
+        self.parents[id(node)] = (node, parent)
+        if isinstance(node, TrailSeries):
+            entry = self.occurrences.get(id(node.mountain))
+            if entry is None:
+                entry = (node.mountain, {})
+                self.occurrences[id(node.mountain)] = entry
+            entry[1][id(node)] = node
+
+    def _unregister(self, node: TrailStore) -> None:
+        del self.parents[id(node)]
+        if isinstance(node, TrailSeries):
+            nodes = self.occurrences[id(node.mountain)][1]
+            del nodes[id(node)]
+            if not nodes:
+                del self.occurrences[id(node.mountain)]
+
+    @staticmethod
+    def _children(node: TrailStore) -> list[Trail]:
+        if isinstance(node, TrailSeries):
+            return [node.following]
+        elif isinstance(node, TrailSplit):
+            return [node.path_top, node.path_bottom, node.path_follow]
+        return []
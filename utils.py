@@ -1,12 +1,45 @@
+from functools import lru_cache
+from math import comb
+
 def av(*args):
     return sum(args)/len(args)
 
 def bezier(*points):
-    if len(points) == 1:
-        return lambda t: points[0]
-    p1 = bezier(*points[:-1])
-    p2 = bezier(*points[1:])
-    return lambda t: (
-        (1-t) * p1(t)[0] + t * p2(t)[0],
-        (1-t) * p1(t)[1] + t * p2(t)[1]
-    )
+    """
+    Bezier curve through the given control points, as a function of t in [0, 1].
+    Evaluated in closed form with the Bernstein polynomials, O(len(points)) per call.
+    """
+    n = len(points) - 1
+    coefficients = [comb(n, i) for i in range(n + 1)]
+    def curve(t):
+        x = y = 0
+        for i, (px, py) in enumerate(points):
+            b = coefficients[i] * t**i * (1-t)**(n-i)
+            x += b * px
+            y += b * py
+        return (x, y)
+    return curve
+
+@lru_cache(maxsize=None)
+def bezier_basis(degree, samples):
+    """
+    Bernstein basis of the given degree at `samples` evenly spaced values of t from 0 to 1,
+    as a (samples, degree + 1) array. Computed once per (degree, samples) and then reused,
+    so it must not be modified.
+    """
+    # numpy is only imported once a curve is drawn, so that it does not slow down starting the window.
+    import numpy as np
+    t = np.linspace(0, 1, samples)[:, None]
+    i = np.arange(degree + 1)
+    coefficients = np.array([comb(degree, k) for k in i], dtype=float)
+    basis = coefficients * t**i * (1-t)**(degree - i)
+    basis.flags.writeable = False
+    return basis
+
+def bezier_points(points, samples=101):
+    """
+    Points of the Bezier curve through the given control points at `samples` evenly spaced
+    values of t from 0 to 1, as a (samples, 2) array: one matrix product with the cached basis.
+    """
+    import numpy as np
+    return bezier_basis(len(points) - 1, samples) @ np.asarray(points, dtype=float)